@@ -0,0 +1,306 @@
+# benchmarks/bench.py
+"""
+Offline benchmark of the menu pipeline against local fake services.
+
+    python -m benchmarks.bench --menus 20 --concurrency 1,4,8 --latency 0.1
+
+The real SDK clients are pointed at a FakeAzureServer and the pipeline stages
+(OCR, GPT structuring, image generation) are timed per menu. For every
+concurrency level the report shows p50/p90/p99 latency per stage and
+end-to-end, plus menus/s throughput. Caches are disabled so every menu makes
+its full set of requests.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.fake_services import FakeAzureServer, FakeServiceConfig
+
+STAGES = ("ocr", "gpt", "images", "total")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def configure_environment(
+    url: str,
+    ocr_scheduler: bool = False,
+    preprocess: bool = True,
+    layout: bool = True,
+    local_parser: bool = False,
+):
+    """
+    Point every client at the fake server and switch caches off. Unless
+    `local_parser` is set, every menu goes to GPT (the fake menu is simple
+    enough for the local parser to skip it).
+    """
+    os.environ.update(
+        {
+            "AZURE_ENDPOINT": url,
+            "AZURE_KEY": "bench-key",
+            "AZURE_OPENAI_ENDPOINT": url,
+            "AZURE_OPENAI_KEY": "bench-key",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": "gpt-4o",
+            "DALLE_3_ENDPOINT": url,
+            "DALLE_3_KEY": "bench-key",
+            "DALLE_3_DEPLOYMENT_NAME": "dall-e-3",
+            "IMAGE_CACHE_MAX_MB": "0",
+            "OCR_CACHE_TTL_SECONDS": "0",
+            "OCR_SCHEDULER": "1" if ocr_scheduler else "0",
+            "OCR_SCHEDULER_STATE": "",
+            "OCR_PREPROCESS": "1" if preprocess else "0",
+            "GPT_LAYOUT_BLOCKS": "1" if layout else "0",
+            "LOCAL_PARSER_MIN_CONFIDENCE": "0.9" if local_parser else "2",
+        }
+    )
+    from src.app import image_cache, settings
+    from src.app.clients import registry
+    from src.app.ocr import ocr_cache, scheduler
+
+    settings._settings = None
+    image_cache._image_cache = None
+    ocr_cache._ocr_cache = None
+    scheduler._scheduler = None
+    registry.close_all()
+
+
+def photo_menu(index: int, size=(4032, 3024)) -> bytes:
+    """A 12-MP phone-photo-like JPEG of a menu page on a table."""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    width, height = size
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    paper = (width // 6, height // 10, width * 5 // 6, height * 9 // 10)
+    draw.rectangle(paper, fill=(240, 236, 225))
+    for row, y in enumerate(range(paper[1] + 120, paper[3] - 120, 90)):
+        length = (row * 7919 + index * 104729) % (paper[2] - paper[0] - 400) + 200
+        draw.line(
+            (paper[0] + 150, y, paper[0] + 150 + length, y), fill=(30, 30, 30), width=28
+        )
+    noise = Image.effect_noise(size, 12).convert("RGB")
+    image = Image.blend(image, noise, 0.15).filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def run_menu(image_path: str) -> dict:
+    """
+    Run full_menu_pipeline over one menu and return its stage durations, read
+    from the pipeline.<stage> spans of the run's metrics.
+    """
+    from src.app.pipeline import full_menu_pipeline
+
+    result = full_menu_pipeline(image_path)
+    result["images"].close()
+    totals = result["metrics"]["totals"]
+    return {stage: totals[f"pipeline.{stage}"]["seconds"] for stage in STAGES}
+
+
+def run_level(menu_paths: list[str], concurrency: int) -> dict:
+    """Run every menu with `concurrency` pipelines in flight."""
+    samples = {stage: [] for stage in STAGES}
+    failures = 0
+
+    def _run(path):
+        try:
+            return run_menu(path)
+        except Exception:
+            return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for timings in pool.map(_run, menu_paths):
+            if timings is None:
+                failures += 1
+                continue
+            for stage in STAGES:
+                samples[stage].append(timings[stage])
+    elapsed = time.perf_counter() - started
+
+    completed = len(menu_paths) - failures
+    return {
+        "concurrency": concurrency,
+        "menus": len(menu_paths),
+        "failures": failures,
+        "seconds": elapsed,
+        "menus_per_second": completed / elapsed if elapsed else 0.0,
+        "stages": {
+            stage: {
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "mean": statistics.fmean(values) if values else 0.0,
+            }
+            for stage, values in samples.items()
+        },
+    }
+
+
+def run_benchmark(
+    concurrency_levels: list[int],
+    menus: int = 10,
+    config: FakeServiceConfig = None,
+    ocr_scheduler: bool = False,
+    photos: bool = False,
+    preprocess: bool = True,
+    layout: bool = True,
+    local_parser: bool = False,
+) -> dict:
+    """
+    Sweep the concurrency levels and return per-level results. With `photos`
+    the menus are 12-MP JPEGs instead of tiny placeholders, and the results
+    include the bytes uploaded to OCR. `layout` sends GPT layout blocks
+    instead of flat lines; the results include the chat tokens billed.
+    `local_parser` lets confident menus skip GPT, as in production.
+    """
+    with FakeAzureServer(config) as server, tempfile.TemporaryDirectory() as tmp:
+        configure_environment(
+            server.url, ocr_scheduler, preprocess, layout, local_parser
+        )
+        menu_paths = []
+        menu_bytes = 0
+        for index in range(menus):
+            path = Path(tmp) / f"menu_{index}.jpg"
+            if photos:
+                path.write_bytes(photo_menu(index))
+            else:
+                path.write_bytes(b"\xff\xd8\xff\xe0bench-menu-%d" % index)
+            menu_bytes += path.stat().st_size
+            menu_paths.append(str(path))
+
+        levels = []
+        for concurrency in concurrency_levels:
+            # The pipeline logs every request; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                levels.append(run_level(menu_paths, concurrency))
+        return {
+            "levels": levels,
+            "requests": dict(server.requests),
+            "menu_bytes": menu_bytes * len(concurrency_levels),
+            "ocr_upload_bytes": server.analyze_bytes,
+            "gpt_tokens": dict(server.gpt_tokens),
+            "menu_runs": menus * len(concurrency_levels),
+        }
+
+
+def format_report(results: dict) -> str:
+    rows = [
+        f"{'conc':>5} {'stage':<7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+        f"{'menus/s':>9} {'failed':>7}"
+    ]
+    for level in results["levels"]:
+        for stage in STAGES:
+            timing = level["stages"][stage]
+            throughput = failed = ""
+            if stage == "total":
+                throughput = f"{level['menus_per_second']:.2f}"
+                failed = str(level["failures"])
+            rows.append(
+                f"{level['concurrency']:>5} {stage:<7} "
+                f"{timing['p50'] * 1000:>9.1f} {timing['p90'] * 1000:>9.1f} "
+                f"{timing['p99'] * 1000:>9.1f} {throughput:>9} {failed:>7}"
+            )
+    requests = ", ".join(f"{k}={v}" for k, v in sorted(results["requests"].items()))
+    rows.append(f"Requests served: {requests}")
+    rows.append(
+        f"OCR upload: {results['ocr_upload_bytes'] / 1e6:.2f} MB "
+        f"from {results['menu_bytes'] / 1e6:.2f} MB of menu files"
+    )
+    runs = max(1, results["menu_runs"])
+    rows.append(
+        f"GPT tokens per menu: {results['gpt_tokens']['prompt'] / runs:.0f} prompt, "
+        f"{results['gpt_tokens']['completion'] / runs:.0f} completion"
+    )
+    return "\n".join(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark.")
+    parser.add_argument("--menus", type=int, default=10)
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--ocr-time",
+        type=float,
+        default=None,
+        help="Seconds each OCR job takes (default: done after two polls)",
+    )
+    parser.add_argument(
+        "--ocr-scheduler", action="store_true", help="Poll OCR through OCRScheduler"
+    )
+    parser.add_argument(
+        "--photos", action="store_true", help="Use 12-MP JPEG menus (slow to create)"
+    )
+    parser.add_argument(
+        "--upload-mbps",
+        type=float,
+        default=None,
+        help="Uplink bandwidth for OCR uploads in megabits/s (default: unlimited)",
+    )
+    parser.add_argument(
+        "--no-preprocess",
+        dest="preprocess",
+        action="store_false",
+        help="Upload menus to OCR unchanged",
+    )
+    parser.add_argument(
+        "--no-layout",
+        dest="layout",
+        action="store_false",
+        help="Send GPT flat OCR lines instead of layout blocks",
+    )
+    parser.add_argument(
+        "--local-parser",
+        action="store_true",
+        help="Let confidently parsed menus skip GPT",
+    )
+    args = parser.parse_args(argv)
+
+    config = FakeServiceConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        processing_time=args.ocr_time,
+        upload_bytes_per_second=(
+            args.upload_mbps * 1e6 / 8 if args.upload_mbps else None
+        ),
+    )
+    levels = [int(level) for level in args.concurrency.split(",")]
+    print(f"[INFO] Benchmarking {args.menus} menus at concurrency {levels}")
+    results = run_benchmark(
+        levels,
+        args.menus,
+        config,
+        ocr_scheduler=args.ocr_scheduler,
+        photos=args.photos,
+        preprocess=args.preprocess,
+        layout=args.layout,
+        local_parser=args.local_parser,
+    )
+    print(format_report(results))
+    return results
+
+
+if __name__ == "__main__":
+    main()
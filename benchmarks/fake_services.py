@@ -0,0 +1,336 @@
+# benchmarks/fake_services.py
+"""
+Local stand-ins for the Azure services the pipeline calls, so performance work
+can be measured without live endpoints. One HTTP server answers:
+
+- Document Intelligence analyze requests, as a long-running operation polled
+  through its Operation-Location URL
+- Azure OpenAI chat completions
+- Azure OpenAI image generations, plus downloads of the generated image URLs
+
+Latency, throttling (429 with Retry-After) and error rates are configurable.
+"""
+
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Smallest valid PNG (1x1 transparent pixel)
+FAKE_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+MENU_LINES = [
+    "Starters",
+    "Tomato Soup",
+    "Roasted tomatoes, basil",
+    "$6",
+    "Garlic Bread",
+    "Sourdough, herb butter",
+    "$4",
+    "Mains",
+    "Grilled Salmon",
+    "Lemon butter, greens",
+    "$18",
+    "Mushroom Risotto",
+    "Parmesan, thyme",
+    "$15",
+]
+
+MENU_ITEMS = [
+    {"name": "Tomato Soup", "description": "Roasted tomatoes, basil", "price": "$6"},
+    {"name": "Garlic Bread", "description": "Sourdough, herb butter", "price": "$4"},
+    {"name": "Grilled Salmon", "description": "Lemon butter, greens", "price": "$18"},
+    {"name": "Mushroom Risotto", "description": "Parmesan, thyme", "price": "$15"},
+]
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients dropping idle keep-alive connections is expected
+
+
+@dataclass
+class FakeServiceConfig:
+    """Behaviour of the fake endpoints. Latencies are in seconds."""
+
+    latency: float = 0.05
+    jitter: float = 0.0
+    poll_latency: float = 0.005
+    polls_until_done: int = 2
+    # When set, analyze jobs finish after this many seconds instead of after
+    # `polls_until_done` polls, like the real service
+    processing_time: float | None = None
+    # When set, analyze requests also take len(body) / this many seconds,
+    # standing in for the upload over a limited uplink
+    upload_bytes_per_second: float | None = None
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    retry_after_ms: int = 10
+    seed: int | None = None
+
+
+class FakeAzureServer:
+    """
+    Threaded HTTP server with fake Document Intelligence and Azure OpenAI
+    routes. Use as a context manager; `url` is the endpoint to configure.
+    """
+
+    def __init__(self, config: FakeServiceConfig = None, host: str = "127.0.0.1"):
+        self.config = config or FakeServiceConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._operations = {}  # operation id -> polls remaining or ready time
+        self.requests = {}  # route -> count
+        self.analyze_bytes = 0  # document bytes received by analyze requests
+        # Tokens billed by chat requests, about 4 characters a token
+        self.gpt_tokens = {"prompt": 0, "completion": 0}
+        self._server = _QuietServer((host, 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, route: str):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def _draw(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def _delay(self, base: float):
+        jitter = self.config.jitter * self._draw() if self.config.jitter else 0.0
+        if base + jitter > 0:
+            time.sleep(base + jitter)
+
+    def _failure(self) -> int | None:
+        """Status code to fail this request with, if any."""
+        roll = self._draw()
+        if roll < self.config.throttle_rate:
+            return 429
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            return 500
+        return None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without this, keep-alive
+            # connections stall on delayed ACKs for ~40ms per response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(
+                self, status, body=b"", content_type="application/json", headers=None
+            ):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _fail(self, status):
+                headers = {}
+                if status == 429:
+                    headers = {
+                        "Retry-After": "1",
+                        "retry-after-ms": str(server.config.retry_after_ms),
+                    }
+                error = {"error": {"code": str(status), "message": "Injected failure"}}
+                self._send(status, error, headers=headers)
+
+            def _read_body(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def do_POST(self):
+                body = self._read_body()
+                path = self.path.split("?")[0]
+                if path.endswith(":analyze"):
+                    route = "analyze"
+                elif path.endswith("/chat/completions"):
+                    route = "chat"
+                elif path.endswith("/images/generations"):
+                    route = "images"
+                else:
+                    return self._send(404, {"error": {"message": "Not found"}})
+                server._count(route)
+                server._delay(server.config.latency)
+                if route == "analyze":
+                    with server._lock:
+                        server.analyze_bytes += len(body)
+                    if server.config.upload_bytes_per_second:
+                        time.sleep(len(body) / server.config.upload_bytes_per_second)
+                status = server._failure()
+                if status:
+                    return self._fail(status)
+                getattr(self, f"_{route}")(path, body)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if "/analyzeResults/" in path:
+                    server._count("poll")
+                    server._delay(server.config.poll_latency)
+                    return self._poll(path.rsplit("/", 1)[-1])
+                if path.startswith("/generated/"):
+                    server._count("download")
+                    server._delay(server.config.latency)
+                    return self._send(200, FAKE_PNG, content_type="image/png")
+                self._send(404, {"error": {"message": "Not found"}})
+
+            def _analyze(self, path, body):
+                operation_id = uuid.uuid4().hex
+                with server._lock:
+                    if server.config.processing_time is None:
+                        state = server.config.polls_until_done
+                    else:
+                        state = time.monotonic() + server.config.processing_time
+                    server._operations[operation_id] = state
+                model = re.search(r"documentModels/([^/:]+)", path).group(1)
+                location = (
+                    f"{server.url}/documentintelligence/documentModels/{model}"
+                    f"/analyzeResults/{operation_id}?api-version=2024-11-30"
+                )
+                self._send(
+                    202,
+                    headers={
+                        "Operation-Location": location,
+                        "retry-after-ms": str(server.config.retry_after_ms),
+                    },
+                )
+
+            def _poll(self, operation_id):
+                with server._lock:
+                    remaining = server._operations.get(operation_id)
+                    if server.config.processing_time is not None:
+                        if remaining is not None:
+                            remaining = max(0.0, remaining - time.monotonic())
+                    elif remaining:
+                        server._operations[operation_id] = remaining - 1
+                if remaining is None:
+                    return self._send(404, {"error": {"message": "Unknown operation"}})
+                headers = {"retry-after-ms": str(server.config.retry_after_ms)}
+                if remaining > 0:
+                    return self._send(200, {"status": "running"}, headers=headers)
+                self._send(
+                    200, {"status": "succeeded", "analyzeResult": _analyze_result()}
+                )
+
+            def _chat(self, path, body):
+                messages = json.loads(body or b"{}").get("messages", [])
+                prompt = "\n".join(m.get("content", "") for m in messages)
+                content = json.dumps({"items": _chat_items(prompt)})
+                usage = {
+                    "prompt_tokens": max(1, len(prompt) // 4),
+                    "completion_tokens": max(1, len(content) // 4),
+                }
+                usage["total_tokens"] = sum(usage.values())
+                with server._lock:
+                    for kind in ("prompt", "completion"):
+                        server.gpt_tokens[kind] += usage[f"{kind}_tokens"]
+                self._send(
+                    200,
+                    {
+                        "id": f"chatcmpl-{uuid.uuid4().hex}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": "gpt-4o",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "finish_reason": "stop",
+                                "message": {"role": "assistant", "content": content},
+                            }
+                        ],
+                        "usage": usage,
+                    },
+                )
+
+            def _images(self, path, body):
+                if json.loads(body or b"{}").get("response_format") == "url":
+                    data = {"url": f"{server.url}/generated/{uuid.uuid4().hex}.png"}
+                else:
+                    data = {"b64_json": base64.b64encode(FAKE_PNG).decode()}
+                self._send(200, {"created": int(time.time()), "data": [data]})
+
+        return Handler
+
+
+def _chat_items(prompt: str) -> list[dict]:
+    """
+    MENU_ITEMS in the form the prompt asks for: compact {"b", "n", "p"}
+    entries for a layout-block prompt, full items otherwise.
+    """
+    blocks = dict(re.findall(r"^(\d+): (.*)$", prompt, re.MULTILINE))
+    if '"b": block' not in prompt:
+        return MENU_ITEMS
+    items = []
+    for item in MENU_ITEMS:
+        number = next((n for n, text in blocks.items() if item["name"] in text), "1")
+        items.append({"b": int(number), "n": item["name"], "p": item["price"]})
+    return items
+
+
+def _analyze_result() -> dict:
+    height = 11.0
+    lines = []
+    top = 0.1
+    for content in MENU_LINES:
+        # Dishes are set apart by a wider gap after their price
+        top += 0.4 + (0.3 if lines and lines[-1]["content"].startswith("$") else 0)
+        lines.append(
+            {
+                "content": content,
+                "polygon": [1.0, top, 4.0, top, 4.0, top + 0.3, 1.0, top + 0.3],
+            }
+        )
+    return {
+        "apiVersion": "2024-11-30",
+        "modelId": "prebuilt-read",
+        "content": "\n".join(MENU_LINES),
+        "pages": [
+            {
+                "pageNumber": 1,
+                "width": 8.5,
+                "height": height,
+                "unit": "inch",
+                "lines": lines,
+                "words": [],
+                "spans": [],
+            }
+        ],
+    }
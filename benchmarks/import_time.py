@@ -0,0 +1,82 @@
+# benchmarks/import_time.py
+"""
+Cold-start cost of importing the pipeline.
+
+    python -m benchmarks.import_time --runs 5 src.app.pipeline src.app.batch
+
+Every run imports the module in a fresh interpreter, as an autoscaled worker
+or a CLI job does on start. The report shows the median and fastest import
+time and which service SDKs the import pulled in; those should only be loaded
+when the first client is built (see src.app.clients).
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# SDKs that should not be loaded by importing the pipeline
+HEAVY_MODULES = ("openai", "azure", "requests", "httpx", "dotenv")
+DEFAULT_MODULES = ("src.app.pipeline", "src.app.batch")
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+_PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - started
+heavy = json.loads(sys.argv[2])
+loaded = [m for m in heavy if m in sys.modules]
+print(json.dumps({"seconds": seconds, "loaded": loaded}))
+"""
+
+
+def measure_import(module: str, runs: int = 5) -> dict:
+    """Import `module` in `runs` fresh interpreters and summarise the timings."""
+    seconds = []
+    loaded = set()
+    for _ in range(max(1, runs)):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE, module, json.dumps(HEAVY_MODULES)],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        seconds.append(sample["seconds"])
+        loaded.update(sample["loaded"])
+    return {
+        "module": module,
+        "runs": len(seconds),
+        "median": statistics.median(seconds),
+        "min": min(seconds),
+        "loaded": sorted(loaded),
+    }
+
+
+def format_report(results: list[dict]) -> str:
+    rows = [f"{'module':<24} {'median ms':>10} {'min ms':>8}  heavy imports"]
+    for result in results:
+        rows.append(
+            f"{result['module']:<24} {result['median'] * 1000:>10.1f} "
+            f"{result['min'] * 1000:>8.1f}  {', '.join(result['loaded']) or '-'}"
+        )
+    return "\n".join(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time benchmark.")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = [measure_import(module, args.runs) for module in args.modules]
+    print(format_report(results))
+    return results
+
+
+if __name__ == "__main__":
+    main()
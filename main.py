@@ -1,7 +1,14 @@
 from pathlib import Path
-from tempfile import NamedTemporaryFile
 import streamlit as st
-from src.app.pipeline import full_menu_pipeline
+from src.app.events import (
+    ImageReady,
+    ItemFailed,
+    MenuStructured,
+    OCRCompleted,
+    PageRead,
+)
+from src.app.image_gen import DALLE_QUALITIES, DALLE_SIZES, get_generation_settings
+from src.app.result_cache import iter_cached_pipeline
 
 
 # ────────────────────────────────  Page config
@@ -9,26 +16,27 @@ st.set_page_config(page_title="Menu-Visualiser", layout="wide")
 st.title("📋 → 🍽️  Menu-Visualiser")
 
 
+# ────────────────────────────────  Image options
+default_size, default_quality = get_generation_settings()
+with st.sidebar:
+    st.subheader("Image options")
+    image_size = st.selectbox(
+        "Size", DALLE_SIZES, index=DALLE_SIZES.index(default_size)
+    )
+    image_quality = st.selectbox(
+        "Quality", DALLE_QUALITIES, index=DALLE_QUALITIES.index(default_quality)
+    )
+
+
 # ────────────────────────────────  File uploader
 uploaded = st.file_uploader(
     "Upload a menu image or PDF",
     type=["png", "jpg", "jpeg", "pdf"],
-    help="Max ~20 MB. PNG/JPEG works best; PDFs will process the first page."
+    help="Max ~20 MB. PNG/JPEG works best; multi-page PDFs are read page by page."
 )
 
 if uploaded:
-    # Persist the upload to a temp file because the pipeline expects a file path
     suffix = Path(uploaded.name).suffix
-    with NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(uploaded.getbuffer())
-        tmp_path = Path(tmp.name)
-
-    # Run the full pipeline (OCR ➜ grouping ➜ image generation)
-    with st.spinner("Extracting menu & generating previews…"):
-        result = full_menu_pipeline(tmp_path)
-
-    menu_items = result["menu"]      # list[dict] (name, price, desc…)
-    generated = result["images"]     # list[str] (URLs or local paths)
 
     # ────────────────────────────────  Layout
     col_raw, col_gen = st.columns([1, 2])
@@ -37,35 +45,77 @@ if uploaded:
     with col_raw:
         st.subheader("Original menu")
         if suffix == ".pdf":
-            st.write("PDF uploaded – open to view:")
-            st.page_link(tmp_path.as_uri(), label="Open PDF in new tab")
+            st.write("PDF uploaded – download to view:")
+            st.download_button(
+                "Download PDF",
+                uploaded.getvalue(),
+                file_name=uploaded.name,
+                mime="application/pdf",
+                on_click="ignore",
+            )
         else:
             st.image(uploaded, use_container_width=True)
 
-    # Right: generated dishes
+    # Right: generated dishes, filled in cell by cell as images arrive
     with col_gen:
         st.subheader("AI-generated dish photos")
-        if not generated:
-            st.info("No images returned.")
-        else:
-            # Display in a neat 3-column grid
-            n_cols = 3
-            rows = (len(generated) + n_cols - 1) // n_cols
-            for r in range(rows):
-                cols = st.columns(n_cols)
-                for c in range(n_cols):
-                    idx = r * n_cols + c
-                    if idx >= len(generated):
-                        break
-                    item = menu_items[idx] if idx < len(menu_items) else {}
-                    with cols[c]:
-                        st.image(generated[idx], use_container_width=True)
-                        st.markdown(f"**{item.get('name','Unnamed')}**")
-                        if desc := item.get("description") or item.get("desc"):
-                            st.caption(desc)
+        status = st.status("Reading menu…")
+        grid = st.container()
+
+    menu_items = []  # list[dict] (name, price, desc…)
+    cells = []       # one placeholder per dish, in menu order
+    n_cols = 3
+
+    # Run the streaming pipeline (OCR ➜ grouping ➜ image generation); reruns
+    # for the same upload and options replay the cached results instead
+    for event in iter_cached_pipeline(
+        uploaded.getvalue(), suffix, size=image_size, quality=image_quality
+    ):
+        if isinstance(event, PageRead):
+            status.update(label=f"Read page {event.page_number}…")
+
+        elif isinstance(event, OCRCompleted):
+            status.update(label=f"Read {len(event.lines)} lines – structuring menu…")
+
+        elif isinstance(event, MenuStructured):
+            menu_items = event.menu
+            status.update(label=f"Generating {len(menu_items)} dish photos…")
+            with grid:
+                # Lay out the whole 3-column grid up front with placeholders
+                for start in range(0, len(menu_items), n_cols):
+                    cols = st.columns(n_cols)
+                    for c, item in enumerate(menu_items[start : start + n_cols]):
+                        with cols[c]:
+                            cells.append(st.empty())
+                            cells[-1].caption("⏳ Generating…")
+                            st.markdown(f"**{item.get('name','Unnamed')}**")
+                            if desc := item.get("description") or item.get("desc"):
+                                st.caption(desc)
+
+        elif isinstance(event, ImageReady):
+            # Show the light thumbnail; the full image is only sent on request
+            with cells[event.index].container():
+                st.image(event.thumbnail or event.image, use_container_width=True)
+                st.download_button(
+                    "Full size",
+                    event.image,
+                    file_name=f"{event.item.get('name', 'dish')}.png",
+                    mime="image/png",
+                    key=f"full-{event.index}",
+                    on_click="ignore",
+                )
+
+        elif isinstance(event, ItemFailed):
+            if event.skipped:
+                cells[event.index].info("Skipped by the content policy.")
+            else:
+                cells[event.index].warning(f"Image failed: {event.error}")
+
+    if menu_items:
+        status.update(label="Done", state="complete")
+    else:
+        status.update(label="No menu items found.", state="error")
 
     # Optional: expandable JSON blob
     with st.expander("🗂️  Structured menu JSON"):
         st.json(menu_items)
-
-    # Clean-up temp file on server restart; on Streamlit Cloud it’s auto-purged
@@ -60,8 +60,34 @@ def run_specific_test(test_file):
         sys.exit(1)
 
 
+def run_benchmarks(args):
+    """Run the offline benchmark against local fake services."""
+    print("Running offline benchmarks...")
+
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(project_root)
+
+    try:
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench", *args],
+            capture_output=False,
+            text=True,
+        )
+
+        if result.returncode != 0:
+            print(f"\n❌ Benchmark failed with return code: {result.returncode}")
+            sys.exit(result.returncode)
+
+    except Exception as e:
+        print(f"Error running benchmark: {e}")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        # Remaining arguments go to benchmarks.bench (e.g. --concurrency 1,4,8)
+        run_benchmarks(sys.argv[2:])
+    elif len(sys.argv) > 1:
         # Run specific test file
         test_file = sys.argv[1]
         run_specific_test(test_file)
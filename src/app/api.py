@@ -0,0 +1,91 @@
+# src/app/api.py
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from src.app.image_gen import get_generation_settings
+from src.app.jobs import JobQueue, QueueFullError
+from src.app.metrics import render_prometheus
+from src.app.ocr.ocr import warm_up_ocr_backend
+
+ALLOWED_SUFFIXES = {".png", ".jpg", ".jpeg", ".pdf"}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Local OCR models load at start-up rather than on the first request
+    await asyncio.to_thread(warm_up_ocr_backend)
+    yield
+
+
+app = FastAPI(title="Menu-Visualiser", lifespan=lifespan)
+jobs = JobQueue()
+
+
+def _get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+
+@app.post("/menus", status_code=202)
+async def upload_menu(file: UploadFile, size: str = None, quality: str = None):
+    """
+    Queue a menu image or PDF for processing and return its job id.
+    `size` and `quality` optionally override the image generation defaults.
+    """
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in ALLOWED_SUFFIXES:
+        raise HTTPException(
+            status_code=415, detail=f"Unsupported file type {suffix or '(none)'}"
+        )
+    try:
+        get_generation_settings(size, quality)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    data = await file.read()
+    try:
+        job, coalesced = jobs.submit(data, suffix, {"size": size, "quality": quality})
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Job status, the structured menu once available and image progress."""
+    return _get_job(job_id).summary()
+
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str):
+    """Stream the job's pipeline events as newline-delimited JSON."""
+    job = _get_job(job_id)
+    lines = (json.dumps(event) + "\n" for event in job.iter_events(timeout=300))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    """Final menu, base64 images and thumbnails; 409 until the job has finished."""
+    job = _get_job(job_id)
+    if job.status == "failed":
+        return JSONResponse(
+            status_code=500, content={"job_id": job.id, "error": job.error}
+        )
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job.result()
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Process-wide pipeline counters and stage timings for Prometheus to scrape."""
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
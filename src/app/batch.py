@@ -0,0 +1,292 @@
+# src/app/batch.py
+"""
+Bulk-process directories of menu scans.
+
+    python -m src.app.batch menus/ --manifest results.jsonl --output-dir out --workers 8
+
+Results are appended to a JSONL manifest as each menu finishes. Re-running the
+same command skips inputs whose path and content hash already have an "ok"
+record, so an interrupted run resumes where it stopped.
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from src.app.ocr.ocr import (
+    enable_scheduled_ocr,
+    prefetch_menu_pages,
+    warm_up_ocr_backend,
+)
+from src.app.pipeline import full_menu_pipeline
+
+MENU_SUFFIXES = {".png", ".jpg", ".jpeg", ".pdf"}
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def find_inputs(source: Path) -> list[Path]:
+    """
+    Menu files under a directory (recursively), or listed in a manifest file:
+    one path per line, or JSON lines with a "path" field. Relative paths in a
+    manifest are resolved against the manifest's directory.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return sorted(
+            path
+            for path in source.rglob("*")
+            if path.is_file() and path.suffix.lower() in MENU_SUFFIXES
+        )
+
+    inputs = []
+    for line in source.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        entry = json.loads(line)["path"] if line.startswith("{") else line
+        path = Path(entry)
+        inputs.append(path if path.is_absolute() else source.parent / path)
+    return inputs
+
+
+def load_completed(manifest: Path) -> set[tuple[str, str]]:
+    """(path, sha256) pairs that already have a successful record."""
+    completed = set()
+    if not manifest.exists():
+        return completed
+    for line in manifest.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # partial line from an interrupted run
+        if record.get("status") == "ok":
+            completed.add((record["path"], record["sha256"]))
+    return completed
+
+
+def process_menu(path: str, digest: str, output_dir: str) -> dict:
+    """
+    Run the full pipeline on one menu and save its outputs under
+    `output_dir/<sha256>/`. Returns the manifest record; failures are recorded
+    rather than raised so one bad scan does not stop the batch.
+    """
+    started = time.perf_counter()
+    record = {"path": path, "sha256": digest}
+    try:
+        result = full_menu_pipeline(path)
+        menu_dir = Path(output_dir) / digest
+        menu_dir.mkdir(parents=True, exist_ok=True)
+        (menu_dir / "menu.json").write_text(
+            json.dumps(result["menu"], indent=2), encoding="utf-8"
+        )
+        image_paths = {}  # menu index -> file; items without an image are absent
+        with result["images"] as images:
+            for position, index in enumerate(images.indices):
+                image_path = images.save(position, menu_dir / f"image_{index:03d}.png")
+                image_paths[index] = str(image_path)
+        record.update(
+            status="ok",
+            items=len(result["menu"]),
+            images=len(image_paths),
+            image_paths=image_paths,
+            # Counters and per-stage totals; individual spans are left out
+            metrics={key: result["metrics"][key] for key in ("counters", "totals")},
+        )
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+class MenuProgress:
+    """The menus workers have started, which the OCR prefetcher paces itself by."""
+
+    def __init__(self):
+        self._started = set()
+        self._condition = threading.Condition()
+
+    def start(self, path: str):
+        with self._condition:
+            self._started.add(path)
+            self._condition.notify_all()
+
+    def started(self, path: str) -> bool:
+        with self._condition:
+            return path in self._started
+
+    def wait_for(self, count: int):
+        """Block until at least `count` menus have been started."""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._started) >= count)
+
+
+def _process_started_menu(progress: MenuProgress, path: str, *args) -> dict:
+    progress.start(path)
+    return process_menu(path, *args)
+
+
+def prefetch_ocr(paths: list[str], progress: MenuProgress = None, ahead: int = None):
+    """
+    Submit the OCR jobs of pending menus ahead of the workers. With `progress`,
+    at most `ahead` menus beyond those already started are prefetched, so held
+    results stay bounded; menus a worker has already reached are skipped.
+    """
+    for position, path in enumerate(paths):
+        if progress is not None:
+            progress.wait_for(position - ahead + 1)
+            if progress.started(path):
+                continue
+        try:
+            prefetch_menu_pages(path)
+        except Exception as e:
+            # The pipeline submits it again when it reaches this menu
+            print(f"[WARNING] OCR prefetch failed for {path}: {e}")
+
+
+def run_batch(
+    source,
+    manifest,
+    output_dir,
+    workers: int = 4,
+    executor: str = "thread",
+    prefetch: bool = False,
+    prefetch_ahead: int = None,
+) -> dict:
+    """
+    Process every pending input and return the throughput summary.
+    With `prefetch` (thread executor only), OCR goes through the OCR scheduler
+    and a background thread submits the OCR jobs of up to `prefetch_ahead`
+    (default 4 per worker) menus beyond those the workers have started, so
+    Document Intelligence works ahead of the pipeline workers.
+    """
+    manifest = Path(manifest)
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    completed = load_completed(manifest)
+
+    pending = []
+    skipped = 0
+    for path in find_inputs(source):
+        digest = file_digest(path)
+        if (str(path), digest) in completed:
+            skipped += 1
+        else:
+            pending.append((str(path), digest))
+    print(f"[INFO] {len(pending)} menus to process, {skipped} already done")
+
+    prefetcher = progress = None
+    if prefetch and executor == "thread" and pending:
+        enable_scheduled_ocr()
+        progress = MenuProgress()
+        prefetcher = threading.Thread(
+            target=prefetch_ocr,
+            args=(
+                [path for path, _ in pending],
+                progress,
+                max(1, prefetch_ahead or 4 * workers),
+            ),
+            name="ocr-prefetch",
+            daemon=True,
+        )
+        prefetcher.start()
+
+    if executor == "thread" and pending:
+        # Worker threads share this process's OCR backend; load local models now
+        warm_up_ocr_backend()
+
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    started = time.perf_counter()
+    menus = images = failures = 0
+    with (
+        pool_class(max_workers=workers) as pool,
+        open(manifest, "a", encoding="utf-8") as out,
+    ):
+        run_menu = (
+            process_menu
+            if progress is None
+            else functools.partial(_process_started_menu, progress)
+        )
+        futures = [
+            pool.submit(run_menu, path, digest, str(output_dir))
+            for path, digest in pending
+        ]
+        for future in as_completed(futures):
+            record = future.result()
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            if record["status"] == "ok":
+                menus += 1
+                images += record["images"]
+            else:
+                failures += 1
+                print(f"[WARNING] {record['path']}: {record['error']}")
+    if prefetcher is not None:
+        prefetcher.join()
+
+    elapsed = time.perf_counter() - started
+    minutes = elapsed / 60 if elapsed else 0
+    return {
+        "processed": menus,
+        "skipped": skipped,
+        "failures": failures,
+        "images": images,
+        "seconds": round(elapsed, 2),
+        "menus_per_min": round(menus / minutes, 2) if minutes else 0.0,
+        "images_per_min": round(images / minutes, 2) if minutes else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-process menu scans.")
+    parser.add_argument("source", help="Directory of menus or a manifest of paths")
+    parser.add_argument(
+        "--manifest", default="batch_results.jsonl", help="JSONL results manifest"
+    )
+    parser.add_argument(
+        "--output-dir", default="batch_output", help="Where menus and images go"
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument(
+        "--no-prefetch-ocr",
+        dest="prefetch",
+        action="store_false",
+        help="Do not submit OCR jobs up front through the OCR scheduler",
+    )
+    parser.add_argument(
+        "--prefetch-ahead",
+        type=int,
+        default=None,
+        help="Menus to prefetch OCR for beyond those started (default 4 per worker)",
+    )
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        args.source,
+        args.manifest,
+        args.output_dir,
+        args.workers,
+        args.executor,
+        prefetch=args.prefetch,
+        prefetch_ahead=args.prefetch_ahead,
+    )
+    print(
+        f"[SUCCESS] {summary['processed']} menus, {summary['images']} images, "
+        f"{summary['failures']} failures, {summary['skipped']} skipped "
+        f"in {summary['seconds']}s "
+        f"({summary['menus_per_min']} menus/min, "
+        f"{summary['images_per_min']} images/min)"
+    )
+    return 1 if summary["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
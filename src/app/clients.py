@@ -0,0 +1,343 @@
+# src/app/clients.py
+"""
+Shared, connection-pooled service clients.
+
+The SDKs (openai, azure-ai-documentintelligence, requests, httpx) take most
+of a second to import, so they are imported when the first client is built
+rather than when this module is, keeping cold starts of workers and CLI jobs
+that never reach a service cheap.
+"""
+
+import asyncio
+import contextlib
+import inspect
+import threading
+import weakref
+from typing import TYPE_CHECKING
+
+from src.app import metrics
+from src.app.settings import get_settings
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+    from openai import AsyncAzureOpenAI, AzureOpenAI
+
+
+class ClientRegistry:
+    """
+    Process-wide, thread-safe store of long-lived service clients.
+    Each client is built once per configuration key and then shared, so its
+    keep-alive connection pool is reused across calls and concurrent pipelines.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._loops = {}  # loop id -> weakref to the loop its clients belong to
+        self._loop_scopes = {}  # loop id -> open loop_scope() count
+
+    def get_or_create(self, key, factory):
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = factory()
+                    self._clients[key] = client
+        return client
+
+    def close_all(self):
+        """Close every synchronous client and forget all clients."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            close = getattr(client, "close", None)
+            if close and not inspect.iscoroutinefunction(close):
+                close()
+
+    def _pop_loop_clients(self, loop_id: int) -> list:
+        keys = [
+            key
+            for key in self._clients
+            if isinstance(key, tuple) and key[:2] == ("async", loop_id)
+        ]
+        self._loops.pop(loop_id, None)
+        return [self._clients.pop(key) for key in keys]
+
+    def loop_key(self, *parts) -> tuple:
+        """Registry key for a client bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        loop_id = id(loop)
+        with self._lock:
+            ref = self._loops.get(loop_id)
+            if ref is None or ref() is not loop:
+                # A new loop reusing the id of a finished one: the old loop's
+                # clients cannot be used (or closed) from here, so drop them
+                self._pop_loop_clients(loop_id)
+                self._loops[loop_id] = weakref.ref(loop)
+        return ("async", loop_id, *parts)
+
+    async def aclose_loop_clients(self):
+        """Close and forget the async clients bound to the running event loop."""
+        loop_id = id(asyncio.get_running_loop())
+        with self._lock:
+            clients = self._pop_loop_clients(loop_id)
+        for client in clients:
+            close = getattr(client, "aclose", None) or getattr(client, "close")
+            await close()
+
+    @contextlib.asynccontextmanager
+    async def loop_scope(self):
+        """
+        Keep the running loop's async clients for the duration of the block.
+        Scopes nest and may run concurrently; the last one to exit on a loop
+        closes its clients, so short-lived loops (asyncio.run) do not leak
+        connection pools.
+        """
+        loop_id = id(asyncio.get_running_loop())
+        with self._lock:
+            self._loop_scopes[loop_id] = self._loop_scopes.get(loop_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._loop_scopes[loop_id] -= 1
+                last = not self._loop_scopes[loop_id]
+                if last:
+                    del self._loop_scopes[loop_id]
+            if last:
+                await self.aclose_loop_clients()
+
+
+registry = ClientRegistry()
+
+
+def get_pool_size() -> int:
+    """Connections kept alive per service (CLIENT_POOL_SIZE, default 20)."""
+    return get_settings().client_pool_size
+
+
+def _record_status(service: str, status: int):
+    """
+    Count responses per service. Throttled and 5xx responses are counted as
+    retryable: the SDKs' own retries are off and src.app.resilience retries them.
+    """
+    metrics.incr("http.responses", service=service, status=status)
+    if status == 429 or status >= 500:
+        metrics.incr("http.retryable_responses", service=service)
+
+
+def _openai_response_hook(response: "httpx.Response"):
+    _record_status("openai", response.status_code)
+
+
+async def _openai_response_hook_async(response: "httpx.Response"):
+    _record_status("openai", response.status_code)
+
+
+def _document_intelligence_response_hook(response):
+    _record_status("document_intelligence", response.http_response.status_code)
+
+
+def _pooled_session(pool_size: int) -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_http_session() -> "requests.Session":
+    """Shared requests session for plain downloads (e.g. generated images)."""
+    pool_size = get_pool_size()
+    return registry.get_or_create(
+        ("http", pool_size), lambda: _pooled_session(pool_size)
+    )
+
+
+def get_azure_openai_client(
+    api_key: str, azure_endpoint: str, api_version: str
+) -> "AzureOpenAI":
+    """Shared Azure OpenAI client with a keep-alive httpx connection pool."""
+    pool_size = get_pool_size()
+
+    def factory():
+        import httpx
+        from openai import AzureOpenAI, DefaultHttpxClient
+
+        http_client = DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            event_hooks={"response": [_openai_response_hook]},
+        )
+        return AzureOpenAI(
+            api_key=api_key,
+            azure_endpoint=azure_endpoint,
+            api_version=api_version,
+            http_client=http_client,
+            max_retries=0,  # retried by src.app.resilience
+        )
+
+    return registry.get_or_create(
+        ("azure_openai", azure_endpoint, api_key, api_version, pool_size), factory
+    )
+
+
+def get_document_intelligence_client(
+    endpoint: str, key: str
+) -> "DocumentIntelligenceClient":
+    """Shared Document Intelligence client on a pooled requests transport."""
+    pool_size = get_pool_size()
+
+    def factory():
+        from azure.ai.documentintelligence import DocumentIntelligenceClient
+        from azure.core.credentials import AzureKeyCredential
+        from azure.core.pipeline.transport import RequestsTransport
+
+        transport = RequestsTransport(
+            session=_pooled_session(pool_size), session_owner=False
+        )
+        return DocumentIntelligenceClient(
+            endpoint=endpoint,
+            credential=AzureKeyCredential(key),
+            transport=transport,
+            raw_response_hook=_document_intelligence_response_hook,
+            retry_total=0,  # retried by src.app.resilience
+        )
+
+    return registry.get_or_create(
+        ("document_intelligence", endpoint, key, pool_size), factory
+    )
+
+
+# ---- Async clients ----
+# Async clients hold connections bound to one event loop, so they are registered
+# per running loop and shared by every coroutine on that loop; see
+# ClientRegistry.loop_scope for closing them.
+def _async_key(*parts):
+    return registry.loop_key(*parts)
+
+
+def get_async_http_client() -> "httpx.AsyncClient":
+    """Shared httpx.AsyncClient for downloads on the running event loop."""
+    import httpx
+
+    pool_size = get_pool_size()
+    return registry.get_or_create(
+        _async_key("http", pool_size),
+        lambda: httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            timeout=60,
+        ),
+    )
+
+
+def get_async_azure_openai_client(
+    api_key: str, azure_endpoint: str, api_version: str
+) -> "AsyncAzureOpenAI":
+    """Shared AsyncAzureOpenAI client for the running event loop."""
+    pool_size = get_pool_size()
+
+    def factory():
+        import httpx
+        from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            event_hooks={"response": [_openai_response_hook_async]},
+        )
+        return AsyncAzureOpenAI(
+            api_key=api_key,
+            azure_endpoint=azure_endpoint,
+            api_version=api_version,
+            http_client=http_client,
+            max_retries=0,  # retried by src.app.resilience
+        )
+
+    return registry.get_or_create(
+        _async_key("azure_openai", azure_endpoint, api_key, api_version, pool_size),
+        factory,
+    )
+
+
+def _httpx_transport(client: "httpx.AsyncClient"):
+    """
+    azure-core async transport that sends over a shared httpx.AsyncClient, so
+    the async Document Intelligence client needs no `aiohttp` and reuses the
+    loop's pooled connections. The client is owned (and closed) by the registry.
+    """
+    from azure.core.pipeline.transport import AsyncHttpTransport
+    from azure.core.rest._http_response_impl_async import AsyncHttpResponseImpl
+
+    class HttpxResponse(AsyncHttpResponseImpl):
+        def __init__(self, request, response: "httpx.Response"):
+            super().__init__(
+                request=request,
+                internal_response=response,
+                status_code=response.status_code,
+                reason=response.reason_phrase,
+                headers=response.headers,
+                content_type=response.headers.get("Content-Type"),
+                stream_download_generator=None,
+            )
+            self._content = response.content
+
+        async def close(self):
+            if not self.is_closed:
+                self._is_closed = True
+                await self._internal_response.aclose()
+
+    class HttpxTransport(AsyncHttpTransport):
+        async def send(self, request, **kwargs):
+            response = await client.request(
+                request.method,
+                request.url,
+                headers=dict(request.headers),
+                content=request.content,
+            )
+            return HttpxResponse(request, response)
+
+        async def open(self):
+            pass
+
+        async def close(self):
+            pass
+
+        async def __aexit__(self, *exc):
+            pass
+
+    return HttpxTransport()
+
+
+def get_async_document_intelligence_client(endpoint: str, key: str):
+    """
+    Shared async Document Intelligence client for the running event loop, on
+    the loop's pooled httpx client.
+    """
+    from azure.ai.documentintelligence.aio import (
+        DocumentIntelligenceClient as AsyncDocumentIntelligenceClient,
+    )
+    from azure.core.credentials import AzureKeyCredential
+
+    http_client = get_async_http_client()
+    return registry.get_or_create(
+        _async_key("document_intelligence", endpoint, key),
+        lambda: AsyncDocumentIntelligenceClient(
+            endpoint=endpoint,
+            credential=AzureKeyCredential(key),
+            transport=_httpx_transport(http_client),
+            raw_response_hook=_document_intelligence_response_hook,
+            retry_total=0,  # retried by src.app.resilience
+        ),
+    )
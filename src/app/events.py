@@ -0,0 +1,72 @@
+# src/app/events.py
+import base64
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class PageRead:
+    """OCR finished for one page; `lines` are that page's cleaned lines."""
+
+    page_number: int
+    lines: list[str]
+
+
+@dataclass
+class OCRCompleted:
+    """
+    OCR finished; `lines` are the cleaned text lines of the menu. `degraded`
+    is True when pages were read by the fallback OCR backend.
+    """
+
+    lines: list[str]
+    degraded: bool = False
+
+
+@dataclass
+class MenuStructured:
+    """GPT structuring finished; `menu` is the list of item dicts."""
+
+    menu: list[dict]
+
+
+@dataclass
+class ImageReady:
+    """
+    The image for the menu item at `index` is available, with a display-sized
+    `thumbnail` when thumbnails are enabled.
+    """
+
+    index: int
+    item: dict
+    image: bytes
+    thumbnail: bytes | None = None
+
+
+@dataclass
+class ItemFailed:
+    """No image could be produced for the menu item at `index`."""
+
+    index: int
+    item: dict
+    error: str
+    skipped: bool = False  # True for content-policy rejections
+
+
+EVENT_TYPES = {
+    PageRead: "page_read",
+    OCRCompleted: "ocr_completed",
+    MenuStructured: "menu_structured",
+    ImageReady: "image_ready",
+    ItemFailed: "item_failed",
+}
+
+
+def event_to_dict(event) -> dict:
+    """JSON-serialisable form of a pipeline event; image bytes are base64 encoded."""
+    data = asdict(event)
+    if isinstance(event, ImageReady):
+        if event.image is not None:
+            data["image"] = base64.b64encode(event.image).decode("ascii")
+        if event.thumbnail is not None:
+            data["thumbnail"] = base64.b64encode(event.thumbnail).decode("ascii")
+    return {"type": EVENT_TYPES[type(event)], **data}
@@ -0,0 +1,122 @@
+# src/app/image_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from src.app.settings import env
+
+
+class ImageCache:
+    """
+    Content-addressed disk cache for generated images.
+    Entries are keyed on everything that determines the generated image (prompt,
+    deployment, size, quality) and evicted least-recently-used once the directory
+    grows past `max_bytes`. Recency is persisted through file mtimes, so the LRU
+    order survives restarts.
+    """
+
+    suffix = ".img"
+
+    def __init__(self, directory, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total_bytes = 0
+        self._load_index()
+
+    @staticmethod
+    def make_key(prompt: str, deployment_name: str, size: str, quality: str) -> str:
+        """Hash the generation parameters into a cache key."""
+        payload = json.dumps([prompt, deployment_name, size, quality])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def _load_index(self):
+        files = sorted(
+            (path.stat().st_mtime, path.stem, path.stat().st_size)
+            for path in self.directory.glob(f"*{self.suffix}")
+        )
+        for _, key, size in files:
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached image bytes, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except FileNotFoundError:
+                # Removed behind our back; treat as a miss
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes):
+        """Store image bytes and evict old entries beyond the size cap."""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._path(key).unlink(missing_ok=True)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current cache footprint."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache | None:
+    """
+    Get the process-wide image cache configured by IMAGE_CACHE_DIR and
+    IMAGE_CACHE_MAX_MB. Returns None when the cache is disabled (max size 0).
+    """
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            max_mb = float(env("IMAGE_CACHE_MAX_MB", "512"))
+            if max_mb <= 0:
+                return None
+            directory = env("IMAGE_CACHE_DIR", ".cache/images")
+            _image_cache = ImageCache(directory, int(max_mb * 1024 * 1024))
+        return _image_cache
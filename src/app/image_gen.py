@@ -1,13 +1,31 @@
-from openai import AzureOpenAI
-import os
-import requests
 from pathlib import Path
-from dotenv import load_dotenv
-import openai
+import asyncio
+import base64
 import re
-import tempfile
-
-load_dotenv()
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator
+from src.app import metrics
+from src.app.clients import (
+    get_async_azure_openai_client,
+    get_async_http_client,
+    get_azure_openai_client,
+    get_http_session,
+)
+from src.app.image_cache import ImageCache, get_image_cache
+from src.app.image_results import ImageSet
+from src.app.rate_limit import RateLimiter, get_rate_limiter
+from src.app.resilience import (
+    CircuitOpenError,
+    call_with_retry,
+    call_with_retry_async,
+    is_retryable,
+)
+from src.app.settings import env, get_settings
+from src.app.thumbnails import get_thumbnail_settings, thumbnail_for_display
+from src.app.variants import VariantGroup, group_variants, variant_grouping_enabled
 
 
 def sanitize_filename(name):
@@ -26,19 +44,23 @@ def sanitize_filename(name):
 
 
 # ---- Configuration ----
+def get_dalle_settings():
+    """The DALL-E key, endpoint and deployment (see src.app.settings)"""
+    return get_settings().dalle()
+
+
 def get_openai_client():
-    """Get Azure OpenAI client"""
-    api_key = os.getenv("DALLE_3_KEY")
-    azure_endpoint = os.getenv("DALLE_3_ENDPOINT")
-    deployment_name = os.getenv("DALLE_3_DEPLOYMENT_NAME")
-
-    if not api_key or not azure_endpoint or not deployment_name:
-        raise ValueError(
-            "DALLE_3_KEY, DALLE_3_ENDPOINT, and DALLE_3_DEPLOYMENT_NAME environment variables must be set"
-        )
+    """Get the shared, connection-pooled Azure OpenAI client for DALL-E"""
+    api_key, azure_endpoint, deployment_name = get_dalle_settings()
+    client = get_azure_openai_client(api_key, azure_endpoint, "2024-03-01-preview")
+    return client, deployment_name
 
-    client = AzureOpenAI(
-        api_key=api_key, azure_endpoint=azure_endpoint, api_version="2024-03-01-preview"
+
+def get_async_openai_client():
+    """Get the shared async Azure OpenAI client for DALL-E on the running loop"""
+    api_key, azure_endpoint, deployment_name = get_dalle_settings()
+    client = get_async_azure_openai_client(
+        api_key, azure_endpoint, "2024-03-01-preview"
     )
     return client, deployment_name
 
@@ -54,57 +76,515 @@ def build_prompt(name: str, description: str = None) -> str:
 
 
 # ---- Image Generation ----
+def get_response_format() -> str:
+    """How DALL-E returns images: "b64_json" (inline, default) or "url" (download)"""
+    return env("DALLE_3_RESPONSE_FORMAT", "b64_json")
+
+
+def _record_cache(cache: ImageCache, img_data: bytes | None):
+    if cache is not None:
+        result = "hits" if img_data is not None else "misses"
+        metrics.incr(f"cache.{result}", cache="image")
+
+
+def _open_download(url: str):
+    download = get_http_session().get(url, stream=True, timeout=60)
+    download.raise_for_status()
+    return download
+
+
+def _counted_download(chunks) -> Iterator[bytes]:
+    """Pass download chunks through, timing the transfer and counting its bytes."""
+    with metrics.span("image.download") as span:
+        span["bytes"] = 0
+        for chunk in chunks:
+            span["bytes"] += len(chunk)
+            yield chunk
+    metrics.incr("image.bytes", span["bytes"])
+
+
+def _write_chunks(chunks, dest) -> bytes | None:
+    """Send image chunks to `dest` if given, otherwise join them into bytes."""
+    if dest is None:
+        return b"".join(chunks)
+    for chunk in chunks:
+        dest.write(chunk)
+    return None
+
+
 def generate_image(
-    client, deployment_name: str, prompt: str, name: str, save_path: Path
-) -> None:
-    print(f"[INFO] Generating image for: {name}")
-    response = client.images.generate(
-        prompt=prompt,
-        model=deployment_name,  # now using the correct deployment name!
-        n=1,
-        size="1024x1024",
-        quality="standard",
-        response_format="url",
+    client,
+    deployment_name: str,
+    prompt: str,
+    name: str,
+    save_path: Path = None,
+    size: str = "1024x1024",
+    quality: str = "standard",
+    cache: ImageCache = None,
+    limiter: RateLimiter = None,
+    response_format: str = None,
+    dest=None,
+) -> bytes | None:
+    """
+    Generate one image and return its bytes without touching the filesystem.
+    With "b64_json" the image is decoded straight from the API response; with
+    "url" it is streamed from the download into memory. If `dest` (a writable
+    binary file-like object) is given, the image is streamed into it instead and
+    None is returned. `save_path` additionally writes the image to disk.
+    """
+    response_format = response_format or get_response_format()
+    cache_key = ImageCache.make_key(prompt, deployment_name, size, quality)
+    img_data = cache.get(cache_key) if cache is not None else None
+    _record_cache(cache, img_data)
+    if img_data is not None:
+        print(f"[INFO] Using cached image for: {name}")
+        chunks = [img_data]
+    else:
+        if limiter is not None:
+            with metrics.span("image.rate_limit_wait"):
+                limiter.acquire()
+        print(f"[INFO] Generating image for: {name}")
+        with metrics.span("image.generate", size=size, quality=quality):
+            response = call_with_retry(
+                f"images:{deployment_name}",
+                client.images.generate,
+                prompt=prompt,
+                model=deployment_name,  # now using the correct deployment name!
+                n=1,
+                size=size,
+                quality=quality,
+                response_format=response_format,
+            )
+        metrics.incr("image.generated")
+        if response_format == "b64_json":
+            chunks = [base64.b64decode(response.data[0].b64_json)]
+            metrics.incr("image.bytes", len(chunks[0]))
+        else:
+            # Stream the download over the shared keep-alive session
+            download = call_with_retry(
+                "image_download", _open_download, response.data[0].url
+            )
+            chunks = _counted_download(download.iter_content(chunk_size=64 * 1024))
+
+        if cache is not None:
+            # The cache needs the whole image, so materialise streamed chunks once
+            chunks = [b"".join(chunks)]
+            cache.put(cache_key, chunks[0])
+
+    if save_path is not None:
+        chunks = list(chunks)
+        with open(save_path, "wb") as f:
+            f.writelines(chunks)
+        print(f"[SUCCESS] Image saved to {save_path}")
+    return _write_chunks(chunks, dest)
+
+
+DALLE_SIZES = ("1024x1024", "1792x1024", "1024x1792")
+DALLE_QUALITIES = ("standard", "hd")
+
+
+def get_generation_settings(size: str = None, quality: str = None) -> tuple:
+    """
+    Image size and quality for a request, falling back to DALLE_3_SIZE
+    (default 1024x1024) and DALLE_3_QUALITY (default standard)
+    """
+    size = size or env("DALLE_3_SIZE", "1024x1024")
+    quality = quality or env("DALLE_3_QUALITY", "standard")
+    if size not in DALLE_SIZES:
+        raise ValueError(f"Image size must be one of {', '.join(DALLE_SIZES)}")
+    if quality not in DALLE_QUALITIES:
+        raise ValueError(f"Image quality must be one of {', '.join(DALLE_QUALITIES)}")
+    return size, quality
+
+
+def get_concurrency_settings():
+    """Get worker count and requests-per-minute budget for the DALL-E deployment"""
+    max_workers = int(env("DALLE_3_MAX_WORKERS", "4"))
+    rpm = env("DALLE_3_REQUESTS_PER_MINUTE")
+    return max_workers, float(rpm) if rpm else None
+
+
+@dataclass
+class ImageResult:
+    """Outcome of generating the image for one menu item."""
+
+    index: int
+    name: str
+    data: bytes | None = None  # None on failure or when streamed to a destination
+    error: Exception | None = None
+    thumbnail: bytes | None = None  # display-sized copy (see src.app.thumbnails)
+
+
+def is_content_policy_violation(error: Exception) -> bool:
+    """True when DALL-E refused the prompt on content-policy grounds."""
+    if "content_policy_violation" not in str(error):
+        return False
+    import openai  # loaded already if the error came from the SDK
+
+    return isinstance(error, openai.BadRequestError)
+
+
+def is_item_failure(error: Exception) -> bool:
+    """
+    True when the error costs one item its image rather than failing the menu:
+    a content-policy rejection, or throttling and outages that outlasted the
+    retries or were shed by the circuit breaker.
+    """
+    return (
+        is_content_policy_violation(error)
+        or isinstance(error, CircuitOpenError)
+        or is_retryable(error)
     )
-    image_url = response.data[0].url
-    # print(f"[INFO] Image URL: {image_url}")
 
-    # Download image
-    img_data = requests.get(image_url).content
-    with open(save_path, "wb") as f:
-        f.write(img_data)
-    print(f"[SUCCESS] Image saved to {save_path}")
+
+def _skip_failed_item(result: ImageResult) -> bool:
+    """Log an item lost to `is_item_failure`; False if the menu should fail."""
+    if not is_item_failure(result.error):
+        return False
+    if not is_content_policy_violation(result.error):
+        print(f"[WARNING] No image for {result.name}: {result.error}")
+        metrics.incr("image.failed")
+    return True
+
+
+def plan_variants(menu_items: list[dict], collapse: bool = None) -> list:
+    """
+    The generations to run for a menu as VariantGroups: one per cluster of
+    variants when `collapse` (default IMAGE_VARIANT_GROUPING) is on, else one
+    per item.
+    """
+    if collapse is None:
+        collapse = variant_grouping_enabled()
+    if not collapse:
+        return [VariantGroup(index, [index]) for index in range(len(menu_items))]
+    groups = group_variants(menu_items)
+    collapsed = len(menu_items) - len(groups)
+    if collapsed:
+        print(f"[INFO] {collapsed} menu variants share an image with another item")
+        metrics.incr("image.variants_collapsed", collapsed)
+    return groups
+
+
+def _thumbnail_settings(thumbnails: bool = None) -> dict | None:
+    return get_thumbnail_settings() if thumbnails is not False else None
 
 
-def generate_images(menu_items: list[dict]):
+def _share(
+    group: VariantGroup, menu_items, data, error, dest_for, thumbnail=None
+) -> list:
+    """One ImageResult per member of `group` from its representative's outcome."""
+    results = []
+    for index in group.members:
+        name = menu_items[index]["name"]
+        if error is not None:
+            results.append(ImageResult(index, name, error=error))
+        elif dest_for is not None:
+            # The representative's image was kept in memory to fan it out
+            _write_chunks([data], dest_for(index, menu_items[index]))
+            results.append(ImageResult(index, name, thumbnail=thumbnail))
+        else:
+            results.append(ImageResult(index, name, data=data, thumbnail=thumbnail))
+    return results
+
+
+def iter_images(
+    menu_items: list[dict],
+    max_workers: int = None,
+    requests_per_minute: float = None,
+    dest_for=None,
+    collapse_variants: bool = None,
+    size: str = None,
+    quality: str = None,
+    thumbnails: bool = None,
+) -> Iterator[ImageResult]:
     """
-    Accepts a list of menu item dicts and returns a list of image paths or image data.
-    Images are stored in a temporary directory that is deleted after the session.
-    Returns a list of image data.
+    Generates images for the menu items concurrently and yields an ImageResult
+    per item as soon as it finishes (completion order, not menu order).
+    Variants of one dish (see src.app.variants) share a single generation
+    unless `collapse_variants` is False; every member still gets its own result.
+    Images are kept in memory unless `dest_for(index, item)` is given, in which
+    case each image is streamed into the file-like object it returns.
+    `size` and `quality` override the DALLE_3_SIZE / DALLE_3_QUALITY defaults.
+    Images held in memory also get a display thumbnail unless `thumbnails` is
+    False or IMAGE_THUMBNAIL_SIZE is 0.
+    Failures are yielded as results carrying the error instead of being raised,
+    so one bad item does not stop the rest of the menu.
     """
+    size, quality = get_generation_settings(size, quality)
+    thumbnail_settings = _thumbnail_settings(thumbnails)
     client, deployment_name = get_openai_client()
-    list_of_images = []
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        output_dir = Path(tmpdirname)
-        for item in menu_items:
-            prompt = build_prompt(item["name"], item["description"])
-            clean_name = sanitize_filename(item["name"])
-            image_path = output_dir / f"{clean_name}.jpg"
+    default_workers, default_rpm = get_concurrency_settings()
+    max_workers = max(1, max_workers or default_workers)
+    requests_per_minute = requests_per_minute or default_rpm
+    limiter = (
+        get_rate_limiter(deployment_name, requests_per_minute)
+        if requests_per_minute
+        else None
+    )
+    cache = get_image_cache()
+
+    def _generate(group):
+        item = menu_items[group.representative]
+        prompt = build_prompt(item["name"], item["description"])
+        shared = len(group.members) > 1
+        data = error = None
+        try:
+            data = generate_image(
+                client,
+                deployment_name,
+                prompt,
+                item["name"],
+                size=size,
+                quality=quality,
+                cache=cache,
+                limiter=limiter,
+                dest=(
+                    dest_for(group.representative, item)
+                    if dest_for and not shared
+                    else None
+                ),
+            )
+        except Exception as e:
+            if is_content_policy_violation(e):
+                print(f"[WARNING] Skipping {item['name']} due to content policy")
+            error = e
+        thumbnail = None
+        if data is not None and thumbnail_settings is not None:
+            thumbnail = thumbnail_for_display(data, thumbnail_settings)
+        dest_for_members = dest_for if shared else None
+        return _share(group, menu_items, data, error, dest_for_members, thumbnail)
+
+    groups = iter(plan_variants(menu_items, collapse_variants))
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending = set()
+    try:
+        while True:
+            # Submitting a window of 2x the workers keeps them busy without
+            # finished images piling up in memory ahead of the consumer
+            for group in itertools.islice(groups, 2 * max_workers - len(pending)):
+                pending.add(pool.submit(metrics.bind(_generate), group))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        # Stop queued work if the consumer goes away early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def generate_images(
+    menu_items: list[dict],
+    max_workers: int = None,
+    requests_per_minute: float = None,
+    collapse_variants: bool = None,
+    size: str = None,
+    quality: str = None,
+) -> ImageSet:
+    """
+    Accepts a list of menu item dicts and returns their image data.
+    Images are generated concurrently by up to `max_workers` threads, throttled to
+    `requests_per_minute` calls (both default to the DALLE_3_* environment settings).
+    Variants of one dish share a generation; `size` and `quality` are passed
+    through (see iter_images).
+    Returns an ImageSet: a sequence of image data in menu order that keeps up to
+    IMAGE_RESULTS_MAX_MEMORY_MB in memory and spools the rest to disk. Items
+    rejected by the content policy, or still throttled or unavailable after
+    retrying, are skipped (see is_item_failure); other errors are raised.
+    """
+    images = ImageSet()
+    for result in iter_images(
+        menu_items,
+        max_workers,
+        requests_per_minute,
+        collapse_variants=collapse_variants,
+        size=size,
+        quality=quality,
+        thumbnails=False,
+    ):
+        if result.error is not None and not _skip_failed_item(result):
+            images.close()
+            raise result.error
+        if result.error is None:
+            images.add(result.index, result.data)
+    return images
+
+
+# ---- Async API ----
+async def _download_async(url: str) -> list[bytes]:
+    chunks = []
+    async with get_async_http_client().stream("GET", url) as download:
+        download.raise_for_status()
+        async for chunk in download.aiter_bytes(64 * 1024):
+            chunks.append(chunk)
+    return chunks
+
+
+async def generate_image_async(
+    client,
+    deployment_name: str,
+    prompt: str,
+    name: str,
+    size: str = "1024x1024",
+    quality: str = "standard",
+    cache: ImageCache = None,
+    limiter: RateLimiter = None,
+    response_format: str = None,
+    dest=None,
+) -> bytes | None:
+    """Async counterpart of generate_image built on AsyncAzureOpenAI and httpx."""
+    response_format = response_format or get_response_format()
+    cache_key = ImageCache.make_key(prompt, deployment_name, size, quality)
+    img_data = cache.get(cache_key) if cache is not None else None
+    _record_cache(cache, img_data)
+    if img_data is not None:
+        print(f"[INFO] Using cached image for: {name}")
+        return _write_chunks([img_data], dest)
+
+    if limiter is not None:
+        with metrics.span("image.rate_limit_wait"):
+            await limiter.acquire_async()
+    print(f"[INFO] Generating image for: {name}")
+    with metrics.span("image.generate", size=size, quality=quality):
+        response = await call_with_retry_async(
+            f"images:{deployment_name}",
+            client.images.generate,
+            prompt=prompt,
+            model=deployment_name,
+            n=1,
+            size=size,
+            quality=quality,
+            response_format=response_format,
+        )
+    metrics.incr("image.generated")
+    if response_format == "b64_json":
+        chunks = [base64.b64decode(response.data[0].b64_json)]
+    else:
+        with metrics.span("image.download"):
+            chunks = await call_with_retry_async(
+                "image_download", _download_async, response.data[0].url
+            )
+    metrics.incr("image.bytes", sum(len(chunk) for chunk in chunks))
+
+    if cache is not None:
+        chunks = [b"".join(chunks)]
+        cache.put(cache_key, chunks[0])
+    return _write_chunks(chunks, dest)
+
+
+async def iter_images_async(
+    menu_items: list[dict],
+    max_concurrency: int = None,
+    requests_per_minute: float = None,
+    dest_for=None,
+    collapse_variants: bool = None,
+    size: str = None,
+    quality: str = None,
+    thumbnails: bool = None,
+) -> AsyncIterator[ImageResult]:
+    """
+    Async counterpart of iter_images: at most `max_concurrency` generations are
+    in flight and results are yielded in completion order. Closing or cancelling
+    the iterator cancels the generations still pending.
+    """
+    size, quality = get_generation_settings(size, quality)
+    thumbnail_settings = _thumbnail_settings(thumbnails)
+    client, deployment_name = get_async_openai_client()
+    default_workers, default_rpm = get_concurrency_settings()
+    max_concurrency = max(1, max_concurrency or default_workers)
+    limit = asyncio.Semaphore(max_concurrency)
+    requests_per_minute = requests_per_minute or default_rpm
+    limiter = (
+        get_rate_limiter(deployment_name, requests_per_minute)
+        if requests_per_minute
+        else None
+    )
+    cache = get_image_cache()
+
+    async def _generate(group):
+        item = menu_items[group.representative]
+        prompt = build_prompt(item["name"], item["description"])
+        shared = len(group.members) > 1
+        data = error = None
+        async with limit:
             try:
-                generate_image(client, deployment_name, prompt, item["name"], image_path)
-                list_of_images.append(image_path)
-            except openai.BadRequestError as e:
-                if "content_policy_violation" in str(e):
+                data = await generate_image_async(
+                    client,
+                    deployment_name,
+                    prompt,
+                    item["name"],
+                    size=size,
+                    quality=quality,
+                    cache=cache,
+                    limiter=limiter,
+                    dest=(
+                        dest_for(group.representative, item)
+                        if dest_for and not shared
+                        else None
+                    ),
+                )
+            except Exception as e:
+                if is_content_policy_violation(e):
                     print(f"[WARNING] Skipping {item['name']} due to content policy")
-                    continue
-                else:
-                    raise
-        # At this point, list_of_images contains Path objects to the temp files
-        # The files will be deleted when the with-block exits
-        # If you need to return the image data, read them here before the block ends
-        images_data = []
-        for image_path in list_of_images:
-            with open(image_path, "rb") as f:
-                images_data.append(f.read())
-        return images_data
-        
+                error = e
+        thumbnail = None
+        if data is not None and thumbnail_settings is not None:
+            # Encoding the thumbnail is CPU work; keep it off the event loop
+            thumbnail = await asyncio.to_thread(
+                metrics.bind(thumbnail_for_display), data, thumbnail_settings
+            )
+        dest_for_members = dest_for if shared else None
+        return _share(group, menu_items, data, error, dest_for_members, thumbnail)
+
+    groups = iter(plan_variants(menu_items, collapse_variants))
+    pending = set()
+    try:
+        while True:
+            # Bounded like iter_images, so finished images do not pile up
+            for group in itertools.islice(groups, 2 * max_concurrency - len(pending)):
+                pending.add(asyncio.ensure_future(_generate(group)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                for result in task.result():
+                    yield result
+    finally:
+        for task in pending:
+            task.cancel()
+        # Wait for the cancellations, so no request outlives the iterator
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def generate_images_async(
+    menu_items: list[dict],
+    max_concurrency: int = None,
+    requests_per_minute: float = None,
+    collapse_variants: bool = None,
+    size: str = None,
+    quality: str = None,
+) -> ImageSet:
+    """Async counterpart of generate_images with the same result contract."""
+    images = ImageSet()
+    # aclosing() cancels the remaining generations if one of them fails
+    async with aclosing(
+        iter_images_async(
+            menu_items,
+            max_concurrency,
+            requests_per_minute,
+            collapse_variants=collapse_variants,
+            size=size,
+            quality=quality,
+            thumbnails=False,
+        )
+    ) as image_results:
+        async for result in image_results:
+            if result.error is not None and not _skip_failed_item(result):
+                images.close()
+                raise result.error
+            if result.error is None:
+                # Spooling writes to disk; keep it off the event loop
+                await asyncio.to_thread(images.add, result.index, result.data)
+    return images
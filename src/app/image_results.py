@@ -0,0 +1,127 @@
+# src/app/image_results.py
+"""
+Memory-bounded container for the generated images of one menu.
+
+DALL-E images are 1-3 MB each, so holding a whole menu's images in a list
+costs ~100 MB for a 60-dish menu, per request. ImageSet keeps images in memory
+up to a budget and spools the rest to a temporary directory, reading them
+back one at a time when they are accessed. The spool is deleted by close() or
+when the ImageSet is garbage collected.
+"""
+
+import shutil
+import tempfile
+import weakref
+from collections.abc import Sequence
+from pathlib import Path
+
+from src.app import metrics
+from src.app.settings import env
+
+
+def get_max_memory_bytes() -> int:
+    """
+    Image bytes a menu's results keep in memory before spooling to disk
+    (IMAGE_RESULTS_MAX_MEMORY_MB, default 32; 0 spools every image).
+    """
+    max_mb = float(env("IMAGE_RESULTS_MAX_MEMORY_MB", "32"))
+    if max_mb < 0:
+        raise ValueError("IMAGE_RESULTS_MAX_MEMORY_MB must not be negative")
+    return int(max_mb * 1024 * 1024)
+
+
+class ImageSet(Sequence):
+    """
+    Read-only sequence of image bytes in menu order. Images are added as they
+    finish (in any order) with their menu index; `indices` maps each position
+    back to its menu item.
+    """
+
+    def __init__(self, max_memory_bytes: int = None):
+        if max_memory_bytes is None:
+            max_memory_bytes = get_max_memory_bytes()
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_bytes = 0
+        self.spooled_bytes = 0
+        self._entries = {}  # menu index -> bytes, or the Path of a spooled image
+        self._indices = None
+        self._spool_dir = None
+        self._cleanup = None
+
+    def add(self, index: int, data: bytes):
+        """Store the image of menu item `index`, spooling it if over budget."""
+        if self.memory_bytes + len(data) <= self.max_memory_bytes:
+            self._entries[index] = data
+            self.memory_bytes += len(data)
+        else:
+            path = self._spool_path(index)
+            path.write_bytes(data)
+            self._entries[index] = path
+            self.spooled_bytes += len(data)
+            metrics.incr("image.spooled_bytes", len(data))
+        self._indices = None
+
+    def _spool_path(self, index: int) -> Path:
+        if self._spool_dir is None:
+            self._spool_dir = Path(tempfile.mkdtemp(prefix="menu-images-"))
+            self._cleanup = weakref.finalize(
+                self, shutil.rmtree, self._spool_dir, ignore_errors=True
+            )
+        return self._spool_dir / f"{index:05d}.img"
+
+    @property
+    def indices(self) -> list[int]:
+        """Menu index of the image at each position."""
+        if self._indices is None:
+            self._indices = sorted(self._entries)
+        return self._indices
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        return self.image(self.indices[position])
+
+    def image(self, index: int) -> bytes:
+        """Image bytes of menu item `index`."""
+        entry = self._entries[index]
+        return entry.read_bytes() if isinstance(entry, Path) else entry
+
+    def save(self, position: int, path) -> Path:
+        """Write the image at `position` to `path` without loading a spooled one."""
+        entry = self._entries[self.indices[position]]
+        if isinstance(entry, Path):
+            shutil.copyfile(entry, path)
+        else:
+            Path(path).write_bytes(entry)
+        return Path(path)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (
+            f"ImageSet({len(self)} images, {self.memory_bytes} bytes in memory,"
+            f" {self.spooled_bytes} spooled)"
+        )
+
+    def close(self):
+        """Delete the spooled images; the set is empty afterwards."""
+        if self._cleanup is not None:
+            self._cleanup()
+        self._spool_dir = self._cleanup = None
+        self._entries.clear()
+        self._indices = None
+        self.memory_bytes = self.spooled_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,214 @@
+# src/app/jobs.py
+import base64
+import dataclasses
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from src.app import metrics
+from src.app.events import ImageReady, event_to_dict
+from src.app.image_results import ImageSet
+from src.app.pipeline import iter_menu_pipeline
+from src.app.result_cache import iter_cached_pipeline, result_key
+from src.app.settings import env
+from src.app.ttl_cache import TTLCache
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more pending menus."""
+
+
+class Job:
+    """
+    One pipeline run over an uploaded menu. Events are appended as the pipeline
+    produces them, and readers can follow them while the job is still running.
+    Image bytes are spooled to disk and only read back (and base64 encoded)
+    for the reader that asks for them, so retained jobs stay small in memory.
+    """
+
+    def __init__(self, digest: str, suffix: str, options: dict = None):
+        self.id = uuid.uuid4().hex
+        self.digest = digest
+        self.suffix = suffix
+        self.options = options or {}  # keyword arguments for the pipeline
+        self.status = "queued"  # queued -> running -> done | failed
+        self.error = None
+        self.created_at = time.time()
+        self.events = []  # image_ready events carry no image; see _with_image
+        self.images = ImageSet(max_memory_bytes=0)
+        self.metrics = None  # snapshot of the run's metrics once finished
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def _publish(self, event: dict = None, status: str = None, error: str = None):
+        with self._changed:
+            if event is not None:
+                self.events.append(event)
+            if status is not None:
+                self.status = status
+            if error is not None:
+                self.error = error
+            self._changed.notify_all()
+
+    def _record(self, event):
+        """Publish a pipeline event, keeping any image on disk."""
+        if isinstance(event, ImageReady):
+            self.images.add(event.index, event.image)
+            event = dataclasses.replace(event, image=None)
+        self._publish(event=event_to_dict(event))
+
+    def _with_image(self, event: dict) -> dict:
+        if event["type"] != "image_ready":
+            return event
+        image = self.images.image(event["index"])
+        return {**event, "image": base64.b64encode(image).decode("ascii")}
+
+    def iter_events(self, timeout: float = None) -> Iterator[dict]:
+        """
+        Yield the job's events from the start, blocking for new ones until the
+        job finishes (or no event arrives within `timeout` seconds).
+        """
+        position = 0
+        while True:
+            with self._changed:
+                if position >= len(self.events) and not self.finished:
+                    if not self._changed.wait(timeout):
+                        return
+                pending = self.events[position:]
+                finished = self.finished
+            yield from map(self._with_image, pending)
+            position += len(pending)
+            if finished and position >= len(self.events):
+                return
+
+    def summary(self) -> dict:
+        """Status plus the structured menu and per-item outcomes so far."""
+        with self._changed:
+            events = list(self.events)
+        menu = next((e["menu"] for e in events if e["type"] == "menu_structured"), None)
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "menu": menu,
+            "images_ready": sum(e["type"] == "image_ready" for e in events),
+            "items_failed": sum(e["type"] == "item_failed" for e in events),
+            "metrics": self.metrics,
+        }
+
+    def result(self) -> dict:
+        """
+        Final menu, base64 images and thumbnails in menu order (None for failed
+        items, and for thumbnails when they are disabled).
+        """
+        with self._changed:
+            events = list(self.events)
+        menu = next((e["menu"] for e in events if e["type"] == "menu_structured"), [])
+        images = [None] * len(menu)
+        thumbnails = [None] * len(menu)
+        for event in events:
+            if event["type"] == "image_ready":
+                images[event["index"]] = self._with_image(event)["image"]
+                thumbnails[event["index"]] = event.get("thumbnail")
+        return {
+            "job_id": self.id,
+            "menu": menu,
+            "images": images,
+            "thumbnails": thumbnails,
+        }
+
+
+class JobQueue:
+    """
+    Runs menu pipelines on a bounded worker pool.
+    Uploads are identified by the SHA-256 of their bytes and pipeline options:
+    a second upload of a menu that is queued, running or recently finished
+    with the same options joins the existing job instead of running the
+    pipeline again.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        max_pending: int = None,
+        retention_seconds: float = None,
+        runner=None,
+        max_finished: int = None,
+    ):
+        self.max_workers = max_workers or int(env("API_MAX_WORKERS", "4"))
+        self.max_pending = max_pending or int(env("API_MAX_PENDING", "100"))
+        retention_seconds = retention_seconds or float(
+            env("API_JOB_RETENTION_SECONDS", "3600")
+        )
+        self._runner = runner or iter_menu_pipeline
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._active = {}  # digest -> Job, queued or running
+        self._active_ids = {}  # job id -> Job, queued or running; never evicted
+        # Finished jobs that repeat uploads join; their images are on disk
+        max_finished = max_finished or int(env("API_MAX_FINISHED_JOBS", "100"))
+        self._finished = TTLCache(max_finished, ttl_seconds=retention_seconds)
+        # Finished jobs by id, for status and results until they expire
+        self._jobs = TTLCache(max_entries=10000, ttl_seconds=retention_seconds)
+
+    def submit(
+        self, data: bytes, suffix: str = "", options: dict = None
+    ) -> tuple[Job, bool]:
+        """
+        Queue a pipeline run for the uploaded bytes, passing `options` (e.g.
+        image size and quality) to the pipeline as keyword arguments.
+        Returns (job, coalesced), where `coalesced` is True when an existing job
+        for the same content was reused. Raises QueueFullError when too many
+        jobs are pending.
+        """
+        options = {k: v for k, v in (options or {}).items() if v is not None}
+        digest = result_key(data, options)
+        with self._lock:
+            job = self._active.get(digest) or self._finished.get(digest)
+            if job is not None:
+                return job, True
+            if len(self._active) >= self.max_pending:
+                raise QueueFullError(f"{len(self._active)} menus already pending")
+            job = Job(digest, suffix, options)
+            self._active[digest] = job
+            self._active_ids[job.id] = job
+        self._pool.submit(self._run, job, data)
+        return job, False
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self._active_ids.get(job_id)
+        return job or self._jobs.get(job_id)
+
+    def _run(self, job: Job, data: bytes):
+        job._publish(status="running")
+        try:
+            with metrics.collect() as run_metrics:
+                try:
+                    with metrics.span("pipeline.total"):
+                        # Menus processed before are replayed from the store
+                        for event in iter_cached_pipeline(
+                            data, job.suffix, self._runner, **job.options
+                        ):
+                            job._record(event)
+                finally:
+                    job.metrics = run_metrics.snapshot()
+            job._publish(status="done")
+        except Exception as e:
+            print(f"[ERROR] Job {job.id} failed: {e}")
+            job._publish(status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._jobs.set(job.id, job)
+                self._active_ids.pop(job.id, None)
+                self._active.pop(job.digest, None)
+                if job.status == "done":
+                    self._finished.set(job.digest, job)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,260 @@
+# src/app/menu_store.py
+"""
+Persistent store of processed menus.
+
+Each finished run is indexed in SQLite by the upload's result key (see
+src.app.result_cache.result_key) with its OCR lines, structured items, stage
+timings and one row per item pointing at its image and thumbnail. Image bytes
+live in a content-addressed blob directory (blobs/ab/<sha256>), so an image
+shared by several items or menus is stored once. Once the blobs outgrow
+`max_bytes`, the least recently used menus are evicted and blobs no longer
+referenced are deleted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from src.app.settings import env
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS menus (
+    key TEXT PRIMARY KEY,
+    lines TEXT NOT NULL,
+    menu TEXT NOT NULL,
+    timings TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    menu_key TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    image TEXT,
+    thumbnail TEXT,
+    error TEXT,
+    PRIMARY KEY (menu_key, idx)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS menus_by_use ON menus (used_at);
+"""
+
+
+class StoredImage(NamedTuple):
+    """Outcome for one menu item: its image and thumbnail, or the error."""
+
+    index: int
+    image: bytes | Path | None
+    thumbnail: bytes | None = None
+    error: str | None = None
+
+
+class StoredMenu(NamedTuple):
+    lines: list[str]
+    menu: list[dict]
+    images: list[StoredImage]
+    timings: dict  # stage -> seconds, as measured when the menu was processed
+
+
+class MenuStore:
+    """SQLite index plus content-addressed blob files under `directory`."""
+
+    def __init__(self, directory, max_bytes: int):
+        self.directory = Path(directory)
+        self.blob_dir = self.directory / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.directory / "menus.sqlite", timeout=30, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def _write_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        self._db.execute(
+            "INSERT OR IGNORE INTO blobs (digest, size) VALUES (?, ?)",
+            (digest, len(data)),
+        )
+        return digest
+
+    def _read_blob(self, digest: str | None) -> bytes | None:
+        return self._blob_path(digest).read_bytes() if digest else None
+
+    def _find_blob(self, digest: str | None) -> Path | None:
+        if digest is None:
+            return None
+        path = self._blob_path(digest)
+        if not path.exists():
+            raise FileNotFoundError(path)
+        return path
+
+    def get(self, key: str, load_images: bool = True) -> StoredMenu | None:
+        """
+        Return the stored menu for `key`, or None on a miss. With `load_images`
+        False each image is its blob's Path, to be read when it is needed.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT lines, menu, timings FROM menus WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            rows = self._db.execute(
+                "SELECT idx, image, thumbnail, error FROM images"
+                " WHERE menu_key = ? ORDER BY idx",
+                (key,),
+            ).fetchall()
+            read_image = self._read_blob if load_images else self._find_blob
+            try:
+                images = [
+                    StoredImage(index, read_image(image), self._read_blob(thumb), error)
+                    for index, image, thumb, error in rows
+                ]
+            except FileNotFoundError:
+                # A blob was removed behind our back; forget the whole menu
+                with self._db:
+                    self._delete_menu(key)
+                self.misses += 1
+                return None
+            with self._db:
+                self._db.execute(
+                    "UPDATE menus SET used_at = ? WHERE key = ?", (time.time(), key)
+                )
+            self.hits += 1
+        lines, menu, timings = (json.loads(value) for value in row)
+        return StoredMenu(lines, menu, images, timings)
+
+    def put(
+        self,
+        key: str,
+        lines: list[str],
+        menu: list[dict],
+        images: list[StoredImage],
+        timings: dict = None,
+    ) -> list[StoredImage]:
+        """
+        Store a processed menu, replacing any earlier entry for `key`. `images`
+        may be any iterable, so they can be read one at a time. Returns them
+        with each image's blob Path in place of its bytes.
+        """
+        now = time.time()
+        stored = []
+        with self._lock, self._db:
+            self._delete_menu(key)
+            self._db.execute(
+                "INSERT INTO menus VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    json.dumps(lines),
+                    json.dumps(menu),
+                    json.dumps(timings or {}),
+                    now,
+                    now,
+                ),
+            )
+            for result in images:
+                image, thumbnail = (
+                    self._write_blob(data) if data else None
+                    for data in (result.image, result.thumbnail)
+                )
+                self._db.execute(
+                    "INSERT INTO images VALUES (?, ?, ?, ?, ?)",
+                    (key, result.index, image, thumbnail, result.error),
+                )
+                stored.append(result._replace(image=image and self._blob_path(image)))
+            self._evict(keep=key)
+        return stored
+
+    def _delete_menu(self, key: str):
+        self._db.execute("DELETE FROM images WHERE menu_key = ?", (key,))
+        self._db.execute("DELETE FROM menus WHERE key = ?", (key,))
+
+    def _total_bytes(self) -> int:
+        query = "SELECT COALESCE(SUM(size), 0) FROM blobs"
+        return self._db.execute(query).fetchone()[0]
+
+    def _evict(self, keep: str):
+        """Drop least recently used menus (never `keep`) until blobs fit."""
+        while self._total_bytes() > self.max_bytes:
+            row = self._db.execute(
+                "SELECT key FROM menus WHERE key != ? ORDER BY used_at LIMIT 1",
+                (keep,),
+            ).fetchone()
+            if row is None:
+                break
+            self._delete_menu(row[0])
+            self._collect_garbage()
+            self.evictions += 1
+        self._collect_garbage()
+
+    def _collect_garbage(self):
+        """Delete blobs that no stored menu refers to any more."""
+        unused = self._db.execute(
+            "SELECT digest FROM blobs WHERE digest NOT IN"
+            " (SELECT image FROM images WHERE image IS NOT NULL"
+            " UNION SELECT thumbnail FROM images WHERE thumbnail IS NOT NULL)"
+        ).fetchall()
+        for (digest,) in unused:
+            self._blob_path(digest).unlink(missing_ok=True)
+        self._db.executemany(
+            "DELETE FROM blobs WHERE digest = ?", [(digest,) for (digest,) in unused]
+        )
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current store footprint."""
+        with self._lock:
+            menus = self._db.execute("SELECT COUNT(*) FROM menus").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "menus": menus,
+                "bytes": self._total_bytes(),
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_menu_store = None
+_menu_store_lock = threading.Lock()
+
+
+def get_menu_store() -> MenuStore | None:
+    """
+    Get the process-wide menu store configured by MENU_STORE_DIR (default
+    .cache/menus) and MENU_STORE_MAX_MB (default 1024). Returns None when the
+    store is disabled (max size 0).
+    """
+    global _menu_store
+    with _menu_store_lock:
+        if _menu_store is None:
+            max_mb = float(env("MENU_STORE_MAX_MB", "1024"))
+            if max_mb <= 0:
+                return None
+            directory = env("MENU_STORE_DIR", ".cache/menus")
+            _menu_store = MenuStore(directory, int(max_mb * 1024 * 1024))
+        return _menu_store
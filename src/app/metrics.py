@@ -0,0 +1,225 @@
+# src/app/metrics.py
+"""
+Spans and counters for every pipeline stage.
+
+Each measurement is recorded twice: in the process-wide `registry` (cumulative,
+exported as Prometheus text) and in the collector of the run in progress, if
+any (see `collect()`), which is what `full_menu_pipeline` returns. Every
+measurement is also passed to the configured sinks, e.g. a JSON-lines log.
+"""
+
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from src.app.settings import env
+
+
+class Metrics:
+    """
+    Thread-safe collection of counters and span timings. Span totals are kept
+    incrementally; individual spans only when `keep_spans` is set, so the
+    long-lived process registry stays bounded.
+    """
+
+    def __init__(self, keep_spans: bool = True):
+        self._lock = threading.Lock()
+        self.keep_spans = keep_spans
+        self.counters = {}  # (name, labels) -> value
+        self.totals = {}  # span name -> {"count", "seconds", "max_seconds"}
+        self.spans = []
+
+    def incr(self, name: str, value: float = 1, labels: tuple = ()):
+        with self._lock:
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_span(self, span: dict):
+        with self._lock:
+            total = self.totals.setdefault(
+                span["name"], {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+            )
+            total["count"] += 1
+            total["seconds"] += span["seconds"]
+            total["max_seconds"] = max(total["max_seconds"], span["seconds"])
+            if self.keep_spans:
+                self.spans.append(span)
+
+    def snapshot(self) -> dict:
+        """JSON-friendly copy: counters keyed "name{label=value}", spans and totals."""
+        with self._lock:
+            return {
+                "counters": {
+                    _format_key(name, labels): value
+                    for (name, labels), value in self.counters.items()
+                },
+                "spans": [dict(span) for span in self.spans],
+                "totals": {name: dict(total) for name, total in self.totals.items()},
+            }
+
+
+def _format_key(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+# ---- Sinks ----
+class JSONLogSink:
+    """Writes one JSON line per span or counter increment to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+registry = Metrics(keep_spans=False)
+_current = contextvars.ContextVar("metrics", default=None)
+_sinks = []
+_env_sink_checked = False
+
+
+def add_sink(sink):
+    """Register an object with an `emit(record: dict)` method."""
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def _get_sinks() -> list:
+    """Configured sinks, plus a JSONLogSink for METRICS_LOG_PATH if set."""
+    global _env_sink_checked
+    if not _env_sink_checked:
+        _env_sink_checked = True
+        path = env("METRICS_LOG_PATH")
+        if path:
+            add_sink(JSONLogSink(path))
+    return list(_sinks)
+
+
+def _emit(record: dict):
+    for sink in _get_sinks():
+        try:
+            sink.emit(record)
+        except Exception as e:
+            print(f"[WARNING] Metrics sink failed: {e}")
+
+
+def _targets() -> list[Metrics]:
+    current = _current.get()
+    return [registry] if current is None else [registry, current]
+
+
+def incr(name: str, value: float = 1, **labels):
+    """Add `value` to a counter, e.g. incr("gpt.prompt_tokens", 250)."""
+    key = tuple(sorted(labels.items()))
+    for metrics in _targets():
+        metrics.incr(name, value, key)
+    _emit({"type": "counter", "name": name, "value": value, "labels": labels})
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[dict]:
+    """
+    Time a block. The yielded dict holds the span's attributes and can be
+    filled in inside the block (e.g. attrs["bytes"] = len(data)). Failed blocks
+    are recorded with an "error" attribute.
+    """
+    start = time.time()
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        record = {
+            "name": name,
+            "start": start,
+            "seconds": time.perf_counter() - started,
+            **attrs,
+        }
+        for metrics in _targets():
+            metrics.add_span(record)
+        _emit({"type": "span", **record})
+
+
+@contextmanager
+def collect() -> Iterator[Metrics]:
+    """Collect the metrics recorded in this context (and threads bound to it)."""
+    metrics = Metrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def bind(fn):
+    """
+    Wrap `fn` to run in a copy of the caller's context, so work handed to a
+    thread pool is recorded in the caller's collector.
+    """
+    context = contextvars.copy_context()
+
+    def _run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return _run
+
+
+def record_usage(stage: str, response):
+    """Count prompt/completion tokens from an OpenAI response's `usage`."""
+    usage = getattr(response, "usage", None)
+    for field in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, field, None)
+        if isinstance(value, int):
+            incr(f"{stage}.{field}", value)
+
+
+# ---- Prometheus ----
+def _metric_name(name: str) -> str:
+    return "menu_visualiser_" + name.replace(".", "_").replace("-", "_")
+
+
+def _prometheus_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_prometheus(metrics: Metrics = None) -> str:
+    """Render counters and span totals in the Prometheus text exposition format."""
+    metrics = metrics or registry
+    with metrics._lock:
+        counters = sorted(metrics.counters.items())
+        totals = {name: dict(total) for name, total in metrics.totals.items()}
+    lines = []
+    declared = set()
+    for (name, labels), value in counters:
+        metric = _metric_name(name) + "_total"
+        if metric not in declared:
+            declared.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_prometheus_labels(labels)} {value}")
+    for name, total in sorted(totals.items()):
+        metric = _metric_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        lines.append(f"{metric}_count {total['count']}")
+        lines.append(f"{metric}_sum {total['seconds']:.6f}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,226 @@
+# src/app/ocr/backends.py
+"""
+OCR backends: the interface the OCR stage reads pages through, the local
+EasyOCR engine, and the fallback that moves throttled traffic to it.
+
+Every backend returns page geometry in the same shape as the Azure results:
+[{"page_number", "width", "height", "unit", "lines": [{"content", "polygon"}]}].
+Pages read by a fallback also carry "fallback" (the backend's name), so the
+degraded result is not cached as the primary's. The Azure backend lives in
+src/app/ocr/ocr.py next to its client.
+"""
+
+import abc
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from src.app import metrics
+from src.app.resilience import CircuitOpenError, get_breaker, get_status_code
+from src.app.settings import env
+
+_reader = None  # EasyOCR model of this worker process
+
+
+class OCRBackend(abc.ABC):
+    """Reads the pages of one document (optionally a page range like "3")."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def analyze(self, data: bytes, pages: str = None) -> list[dict]:
+        """Page geometry of `data`, one dict per page read."""
+
+    def warm_up(self):
+        """Load anything slow to start (e.g. a local model) before the first call."""
+
+    async def analyze_async(self, data: bytes, pages: str = None) -> list[dict]:
+        return await asyncio.to_thread(metrics.bind(self.analyze), data, pages)
+
+
+# ---- Local EasyOCR engine ----
+def _init_worker(languages: list[str], gpu: bool):
+    """Load the EasyOCR model once, when the worker process starts."""
+    global _reader
+    import easyocr
+
+    _reader = easyocr.Reader(languages, gpu=gpu, verbose=False)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _read_image(data: bytes) -> dict:
+    """Run the worker's EasyOCR model over one image; returns page geometry."""
+    from PIL import Image
+
+    width, height = Image.open(io.BytesIO(data)).size  # header only
+    # EasyOCR decodes encoded image bytes itself
+    detections = _reader.readtext(data, detail=1, paragraph=False)
+    lines = []
+    for box, text, _confidence in detections:
+        content = text.strip()
+        if content:
+            polygon = [float(value) for point in box for value in point]
+            lines.append({"content": content, "polygon": polygon})
+    return {
+        "page_number": 1,
+        "width": float(width),
+        "height": float(height),
+        "unit": "pixel",
+        "lines": lines,
+    }
+
+
+class EasyOCRBackend(OCRBackend):
+    """
+    Local EasyOCR engine served from a process pool. Each worker process loads
+    the model once at start-up and then handles any number of images, so only
+    the first request per worker pays for the load. Images only: PDFs need a
+    backend that can render them.
+    """
+
+    name = "easyocr"
+
+    def __init__(
+        self, languages: list[str] = None, max_workers: int = 1, gpu: bool = False
+    ):
+        self.languages = languages or ["en"]
+        self.max_workers = max_workers
+        self.gpu = gpu
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded server (or torch) is not safe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.languages, self.gpu),
+                )
+            return self._pool
+
+    def warm_up(self):
+        """Start every worker now, so their model loads are off the request path."""
+        pool = self._get_pool()
+        for future in [pool.submit(_ping) for _ in range(self.max_workers)]:
+            future.result()
+
+    def _check(self, data: bytes, pages: str):
+        if data.startswith(b"%PDF"):
+            raise ValueError("The EasyOCR backend reads images only, not PDFs")
+        if pages not in (None, "1"):
+            raise ValueError(f"An image has no page {pages}")
+
+    def analyze(self, data: bytes, pages: str = None) -> list[dict]:
+        self._check(data, pages)
+        with metrics.span("ocr.local", bytes=len(data)):
+            geometry = self._get_pool().submit(_read_image, data).result()
+        metrics.incr("ocr.pages")
+        return [geometry]
+
+    async def analyze_async(self, data: bytes, pages: str = None) -> list[dict]:
+        self._check(data, pages)
+        with metrics.span("ocr.local", bytes=len(data)):
+            future = self._get_pool().submit(_read_image, data)
+            geometry = await asyncio.wrap_future(future)
+        metrics.incr("ocr.pages")
+        return [geometry]
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+
+# ---- Fallback ----
+def is_throttled(error: Exception) -> bool:
+    """True when the service shed or throttled the call (429 or open circuit)."""
+    return isinstance(error, CircuitOpenError) or get_status_code(error) == 429
+
+
+class FallbackBackend(OCRBackend):
+    """
+    Sends documents to `primary` and moves them to `fallback` while the
+    primary is throttled: immediately while its circuit breaker is open, and
+    after a call that was shed or still failed with 429 once retries ran out.
+    Once the breaker's reset time has passed, the primary gets the trial call
+    that can close it again. Documents the fallback cannot read (e.g. PDFs)
+    stay on the primary.
+    """
+
+    def __init__(self, primary: OCRBackend, fallback: OCRBackend, service: str):
+        self.primary = primary
+        self.fallback = fallback
+        self.service = service
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def _overflow(self, data: bytes) -> bool:
+        return not data.startswith(b"%PDF")
+
+    def _record(self, reason: str):
+        print(f"[WARNING] OCR {reason}; using the {self.fallback.name} backend")
+        metrics.incr("ocr.fallbacks", backend=self.fallback.name)
+
+    def _mark(self, pages: list[dict]) -> list[dict]:
+        return [{**page, "fallback": self.fallback.name} for page in pages]
+
+    def warm_up(self):
+        self.primary.warm_up()
+        self.fallback.warm_up()
+
+    def analyze(self, data: bytes, pages: str = None) -> list[dict]:
+        if self._overflow(data) and get_breaker(self.service).state == "open":
+            self._record(f"circuit for {self.service} is open")
+            return self._mark(self.fallback.analyze(data, pages))
+        try:
+            return self.primary.analyze(data, pages)
+        except Exception as e:
+            if not (self._overflow(data) and is_throttled(e)):
+                raise
+            self._record(f"throttled by {self.service}")
+            return self._mark(self.fallback.analyze(data, pages))
+
+    async def analyze_async(self, data: bytes, pages: str = None) -> list[dict]:
+        if self._overflow(data) and get_breaker(self.service).state == "open":
+            self._record(f"circuit for {self.service} is open")
+            return self._mark(await self.fallback.analyze_async(data, pages))
+        try:
+            return await self.primary.analyze_async(data, pages)
+        except Exception as e:
+            if not (self._overflow(data) and is_throttled(e)):
+                raise
+            self._record(f"throttled by {self.service}")
+            return self._mark(await self.fallback.analyze_async(data, pages))
+
+
+_easyocr_backend = None
+_easyocr_lock = threading.Lock()
+
+
+def get_easyocr_backend() -> EasyOCRBackend:
+    """
+    The process-wide EasyOCR engine, configured from EASYOCR_LANGUAGES
+    (comma-separated, default "en"), EASYOCR_WORKERS (default 1) and
+    EASYOCR_GPU (default 0).
+    """
+    global _easyocr_backend
+    with _easyocr_lock:
+        if _easyocr_backend is None:
+            languages = env("EASYOCR_LANGUAGES", "en")
+            _easyocr_backend = EasyOCRBackend(
+                languages=[
+                    lang.strip() for lang in languages.split(",") if lang.strip()
+                ],
+                max_workers=max(1, int(env("EASYOCR_WORKERS", "1"))),
+                gpu=env("EASYOCR_GPU", "0") == "1",
+            )
+        return _easyocr_backend
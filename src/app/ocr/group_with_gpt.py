@@ -1,42 +1,53 @@
 # src/app/group_with_gpt.py
-import os
-from openai import AzureOpenAI
-from dotenv import load_dotenv
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from src.app import metrics
+from src.app.clients import get_async_azure_openai_client, get_azure_openai_client
+from src.app.resilience import call_with_retry, call_with_retry_async
+from src.app.settings import env, get_settings
 
-load_dotenv()
+
+def get_openai_settings():
+    """The Azure OpenAI key, endpoint and deployment (see src.app.settings)"""
+    return get_settings().gpt()
 
 
 def get_openai_client():
-    """Get Azure OpenAI client"""
-    api_key = os.getenv("AZURE_OPENAI_KEY")
-    azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-
-    if not api_key or not azure_endpoint or not deployment_name:
-        raise ValueError(
-            "AZURE_OPENAI_KEY, AZURE_OPENAI_ENDPOINT, and AZURE_OPENAI_DEPLOYMENT_NAME environment variables must be set"
-        )
+    """Get the shared, connection-pooled Azure OpenAI client"""
+    api_key, azure_endpoint, deployment_name = get_openai_settings()
+    return (
+        get_azure_openai_client(api_key, azure_endpoint, "2024-03-01-preview"),
+        deployment_name,
+    )
 
-    return AzureOpenAI(
-        api_key=api_key, azure_endpoint=azure_endpoint, api_version="2024-03-01-preview"
-    ), deployment_name
 
+def get_async_openai_client():
+    """Get the shared async Azure OpenAI client for the running event loop"""
+    api_key, azure_endpoint, deployment_name = get_openai_settings()
+    return (
+        get_async_azure_openai_client(api_key, azure_endpoint, "2024-03-01-preview"),
+        deployment_name,
+    )
 
-def group_lines_with_gpt(ocr_lines: list[str]) -> list[dict]:
-    """Group the lines of a menu into items."""
 
-    # Initialize client
-    client, deployment_name = get_openai_client()
+SYSTEM_PROMPT = "You extract structured menu data from OCR text."
+
 
-    prompt = f"""
-You are a helpful assistant. The following lines were extracted from a restaurant menu using OCR.
+def build_menu_prompt(ocr_lines: list[str]) -> str:
+    """Prompt for structuring a whole menu in one request."""
+    return f"""
+You are a helpful assistant. The following lines were extracted from a \
+restaurant menu using OCR.
 
 Please extract and group the items. Each item should have:
 - name
 - description
 - price
 
-Handle varying menu formats. Output must be a JSON list of objects with fields 'name', 'price', 'description'.
+Handle varying menu formats. Output must be a JSON list of objects with fields \
+'name', 'price', 'description'.
 
 Text:
 {chr(10).join(ocr_lines)}
@@ -44,16 +55,548 @@ Text:
 Return JSON only.
 """
 
-    response = client.chat.completions.create(
-        model=deployment_name,
-        messages=[
+
+def build_section_prompt(section_lines: list[str]) -> str:
+    """Prompt for structuring one section in JSON mode."""
+    return f"""
+The following lines are one section of a restaurant menu, extracted using OCR.
+
+Extract the menu items in this section. Each item should have:
+- name
+- description
+- price
+
+Output a JSON object of the form \
+{{"items": [{{"name": ..., "price": ..., "description": ...}}]}}.
+
+Text:
+{chr(10).join(section_lines)}
+"""
+
+
+def build_block_prompt(blocks: list[list[str]]) -> str:
+    """
+    Compact prompt for lines pre-grouped into layout blocks (one numbered
+    block per line, its OCR lines joined by " | "). Items come back with
+    short keys and their block number; descriptions are recovered from the
+    block text by expand_block_items rather than echoed by the model.
+    """
+    text = "\n".join(
+        f"{number}: {' | '.join(block)}" for number, block in enumerate(blocks, 1)
+    )
+    return f"""Restaurant menu OCR lines, grouped by position into numbered blocks \
+(usually one dish each).
+Return JSON {{"items": [{{"b": block, "n": name, "p": price}}]}}, \
+one entry per dish in menu order. Skip headings.
+
+{text}
+"""
+
+
+def build_messages(prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+HEADING_MAX_WORDS = 5
+PRICE_PATTERN = re.compile(r"(?:[$€£¥]\s?\d|\d+[.,]\d{2}\b|\d\s?[$€£¥])")
+
+
+def get_section_max_lines() -> int:
+    """Largest number of OCR lines sent in one request (GPT_SECTION_MAX_LINES)."""
+    return int(env("GPT_SECTION_MAX_LINES", "60"))
+
+
+def is_heading(line: str) -> bool:
+    """Heuristic for section headings such as "STARTERS" or "Desserts:"."""
+    text = line.strip()
+    if not text or PRICE_PATTERN.search(text):
+        return False
+    if len(text.split()) > HEADING_MAX_WORDS:
+        return False
+    letters = [c for c in text if c.isalpha()]
+    return text.endswith(":") or (len(letters) > 2 and text.upper() == text)
+
+
+def _item_boundaries(lines: list[str]) -> set[int]:
+    """
+    Positions a section can be cut at without splitting a dish: after each
+    price line, or before each line carrying a price when prices are inline.
+    """
+    if any(_is_price(line) for line in lines):
+        return {i + 1 for i, line in enumerate(lines) if _is_price(line)}
+    return {i for i, line in enumerate(lines) if PRICE_PATTERN.search(line)}
+
+
+def _split_at_items(section: list[str], max_lines: int) -> list[list[str]]:
+    """
+    Cut a long section into chunks of at most `max_lines`, each ending at the
+    last item boundary in the second half of its window; a chunk is only cut
+    mid-item when there is no boundary there.
+    """
+    boundaries = _item_boundaries(section)
+    chunks, start = [], 0
+    while len(section) - start > max_lines:
+        end = start + max_lines
+        cut = next(
+            (
+                cut
+                for cut in range(end, end - max_lines // 2 - 1, -1)
+                if cut in boundaries and cut > start
+            ),
+            end,
+        )
+        chunks.append(section[start:cut])
+        start = cut
+    chunks.append(section[start:])
+    return chunks
+
+
+def split_into_sections(
+    ocr_lines: list[str], pages: list[list[str]] = None, max_lines: int = 60
+) -> list[list[str]]:
+    """
+    Split menu lines into sections at page breaks and detected headings.
+    Adjacent small sections are packed together up to `max_lines` so that a menu
+    with many short headings does not become one request per heading; sections
+    longer than `max_lines` are cut between items (see _split_at_items).
+    """
+    sections = []
+    for page_lines in pages if pages is not None else [ocr_lines]:
+        current = []
+        for line in page_lines:
+            if is_heading(line) and current:
+                sections.append(current)
+                current = []
+            current.append(line)
+        if current:
+            sections.append(current)
+
+    packed = []
+    for section in sections:
+        for chunk in _split_at_items(section, max_lines):
+            if packed and len(packed[-1]) + len(chunk) <= max_lines:
+                packed[-1] = packed[-1] + chunk
+            else:
+                packed.append(chunk)
+    return packed
+
+
+def parse_menu_json(content: str) -> list[dict]:
+    """
+    Parse a model response into menu items. Accepts a bare JSON list, an object
+    wrapping the list under "items" and responses wrapped in markdown fences.
+    Raises ValueError if no item list can be found.
+    """
+    text = content.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("items", data.get("menu"))
+    if not isinstance(data, list):
+        raise ValueError("Response does not contain a list of menu items")
+    return [item for item in data if isinstance(item, dict)]
+
+
+def merge_items(sections: list[list[dict]]) -> list[dict]:
+    """Concatenate section results in order, dropping repeated name/price pairs."""
+    seen = set()
+    merged = []
+    for items in sections:
+        for item in items:
+            key = (
+                str(item.get("name", "")).strip().casefold(),
+                str(item.get("price", "")).strip(),
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(item)
+    return merged
+
+
+def _is_price(text: str) -> bool:
+    return bool(PRICE_PATTERN.search(text)) and not any(c.isalpha() for c in text)
+
+
+def _descriptions(parts: list[str], names: list[str]) -> list[str]:
+    """Per name: the block's non-price parts between it and the next name."""
+    starts, cursor = [], 0
+    for name in names:
+        key = str(name).strip().casefold()
+        found = next(
+            (
+                i
+                for i in range(cursor, len(parts))
+                if key and key in parts[i].casefold()
+            ),
+            None,
+        )
+        starts.append(found)
+        cursor = found + 1 if found is not None else cursor
+    descriptions = []
+    for number, start in enumerate(starts):
+        if start is None:
+            descriptions.append("")
+            continue
+        end = next((s for s in starts[number + 1 :] if s is not None), len(parts))
+        text = [part for part in parts[start + 1 : end] if not _is_price(part)]
+        descriptions.append(" ".join(text))
+    return descriptions
+
+
+def expand_block_items(items: list[dict], blocks: list[list[str]]) -> list[dict]:
+    """
+    Turn block-prompt answers ({"b", "n", "p"}) into name/price/description
+    items, taking each description from its block. Items already in the full
+    form are kept as they are.
+    """
+    by_block = {}
+    for item in items:
+        if "name" not in item:
+            by_block.setdefault(item.get("b"), []).append(item)
+    descriptions = {}
+    for number, block_items in by_block.items():
+        if isinstance(number, int) and 1 <= number <= len(blocks):
+            names = [item.get("n", "") for item in block_items]
+            for item, text in zip(
+                block_items, _descriptions(blocks[number - 1], names)
+            ):
+                descriptions[id(item)] = text
+
+    expanded = []
+    for item in items:
+        if "name" in item:
+            expanded.append(item)
+            continue
+        expanded.append(
             {
-                "role": "system",
-                "content": "You extract structured menu data from OCR text.",
-            },
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.2,
+                "name": str(item.get("n", "")).strip(),
+                "description": item.get("d") or descriptions.get(id(item), ""),
+                "price": str(item.get("p") or "").strip(),
+            }
+        )
+    return expanded
+
+
+def split_blocks(blocks: list[list[str]], max_lines: int = 60) -> list[list[list[str]]]:
+    """
+    Pack consecutive blocks into requests of at most `max_lines` lines. A
+    block longer than that is cut between items (see _split_at_items) and its
+    parts sent as blocks of their own, so none of its lines are dropped.
+    """
+    chunks = []
+    size = 0
+    for block in blocks:
+        parts = [block]
+        if len(block) > max_lines:
+            parts = _split_at_items(block, max_lines)
+            print(
+                f"[INFO] Splitting a {len(block)}-line layout block"
+                f" into {len(parts)} parts"
+            )
+        for part in parts:
+            if chunks and size + len(part) <= max_lines:
+                chunks[-1].append(part)
+                size += len(part)
+            else:
+                chunks.append([part])
+                size = len(part)
+    return chunks
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of English prompt text (about 4 characters a token)."""
+    return max(1, round(len(text) / 4))
+
+
+def report_prompt_tokens(chunks: list[list[list[str]]], usages: list) -> dict:
+    """
+    Compare the prompt tokens of the block requests of `chunks` with sending
+    the same lines as flat text (group_lines_with_gpt). Both sides are
+    estimated the same way and recorded as gpt.prompt_tokens_estimate; the
+    tokens billed for the block requests (the `usages` of their first
+    attempts) are logged next to them when every response reported usage.
+    """
+    lines = [line for chunk in chunks for block in chunk for line in block]
+    max_lines = get_section_max_lines()
+    if len(lines) > max_lines:
+        flat = [
+            build_section_prompt(s) for s in split_into_sections(lines, None, max_lines)
+        ]
+    else:
+        flat = [build_menu_prompt(lines)]
+    blocks = [build_block_prompt(chunk) for chunk in chunks]
+    tokens = {
+        name: sum(estimate_tokens(SYSTEM_PROMPT + prompt) for prompt in prompts)
+        for name, prompts in (("blocks", blocks), ("lines", flat))
+    }
+    for name, count in tokens.items():
+        metrics.incr("gpt.prompt_tokens_estimate", count, prompt=name)
+    billed = [getattr(usage, "prompt_tokens", None) for usage in usages]
+    if billed and all(isinstance(value, int) for value in billed):
+        tokens["billed"] = sum(billed)
+        billed_note = f", {tokens['billed']} billed"
+    else:
+        billed_note = ""
+    print(
+        f"[INFO] GPT prompt ~{tokens['blocks']} tokens with layout blocks"
+        f"{billed_note} (~{tokens['lines']} as flat lines)"
     )
+    return tokens
+
+
+def structure_section(
+    client,
+    deployment_name: str,
+    section_lines: list[str],
+    max_attempts: int = 2,
+    prompt: str = None,
+    usage: list = None,
+) -> list[dict]:
+    """
+    Structure one menu section with a JSON-mode request. A response that fails to
+    parse is retried for this section only, instead of re-running the menu.
+    `prompt` replaces the default section prompt for `section_lines`; the
+    `usage` of the first response is appended to `usage` when it is given, so
+    parse retries are not counted against the prompt.
+    """
+    messages = build_messages(prompt or build_section_prompt(section_lines))
+    for attempt in range(1, max_attempts + 1):
+        with metrics.span("gpt.request", lines=len(section_lines), attempt=attempt):
+            response = call_with_retry(
+                f"chat:{deployment_name}",
+                client.chat.completions.create,
+                model=deployment_name,
+                messages=messages,
+                temperature=0.2,
+                response_format={"type": "json_object"},
+            )
+        metrics.record_usage("gpt", response)
+        if usage is not None and attempt == 1:
+            usage.append(getattr(response, "usage", None))
+        try:
+            return parse_menu_json(response.choices[0].message.content)
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            print(f"[WARNING] Section parse failed (attempt {attempt}): {e}")
+            metrics.incr("gpt.parse_retries")
+    print(f"[WARNING] Dropping section starting {section_lines[0]!r}")
+    return []
+
+
+def _structure_each(
+    client, deployment_name: str, sections: list[list[str]], max_workers: int = None
+) -> list[list[dict]]:
+    max_workers = max_workers or int(env("GPT_MAX_WORKERS", "4"))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return list(
+            pool.map(
+                metrics.bind(
+                    lambda lines: structure_section(client, deployment_name, lines)
+                ),
+                sections,
+            )
+        )
+
+
+def structure_sections(
+    client, deployment_name: str, sections: list[list[str]], max_workers: int = None
+) -> list[dict]:
+    """Structure sections in parallel and merge the items in menu order."""
+    return merge_items(_structure_each(client, deployment_name, sections, max_workers))
+
+
+def group_regions_with_gpt(
+    regions: list[list[str]], max_workers: int = None
+) -> list[list[dict]]:
+    """
+    Structure only the given regions of a menu (e.g. those the local parser was
+    unsure of), one JSON-mode request each. Returns their items per region.
+    """
+    client, deployment_name = get_openai_client()
+    return _structure_each(client, deployment_name, regions, max_workers)
+
+
+def group_lines_with_gpt(
+    ocr_lines: list[str], pages: list[list[str]] = None, max_workers: int = None
+) -> list[dict]:
+    """
+    Group the lines of a menu into items.
+    Short menus are structured with a single request. Long or multi-page menus
+    (`pages` holds the lines of each page) are split into sections that are
+    structured in parallel and merged back in order as a JSON list.
+    """
+
+    # Initialize client
+    client, deployment_name = get_openai_client()
+
+    max_lines = get_section_max_lines()
+    if (pages is not None and len(pages) > 1) or len(ocr_lines) > max_lines:
+        sections = split_into_sections(ocr_lines, pages=pages, max_lines=max_lines)
+        if len(sections) > 1:
+            items = structure_sections(client, deployment_name, sections, max_workers)
+            return json.dumps(items)
+
+    with metrics.span("gpt.request", lines=len(ocr_lines), attempt=1):
+        response = call_with_retry(
+            f"chat:{deployment_name}",
+            client.chat.completions.create,
+            model=deployment_name,
+            messages=build_messages(build_menu_prompt(ocr_lines)),
+            temperature=0.2,
+        )
+    metrics.record_usage("gpt", response)
 
     return response.choices[0].message.content.strip()
+
+
+def _structure_blocks(
+    client, deployment_name: str, chunk: list[list[str]], usage: list
+):
+    lines = [line for block in chunk for line in block]
+    items = structure_section(
+        client, deployment_name, lines, prompt=build_block_prompt(chunk), usage=usage
+    )
+    return expand_block_items(items, chunk)
+
+
+def group_blocks_with_gpt(blocks: list[list[str]], max_workers: int = None) -> str:
+    """
+    Group a menu already split into layout blocks (see src.app.ocr.layout)
+    into items using the compact block prompt. Menus longer than
+    GPT_SECTION_MAX_LINES are sent as several requests in parallel, split
+    between blocks. Returns the items as a JSON list.
+    """
+    client, deployment_name = get_openai_client()
+    chunks = split_blocks(blocks, get_section_max_lines())
+    usage = []
+    max_workers = max_workers or int(env("GPT_MAX_WORKERS", "4"))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = list(
+            pool.map(
+                metrics.bind(
+                    lambda chunk: _structure_blocks(
+                        client, deployment_name, chunk, usage
+                    )
+                ),
+                chunks,
+            )
+        )
+    report_prompt_tokens(chunks, usage)
+    return json.dumps(merge_items(results))
+
+
+# ---- Async API ----
+async def structure_section_async(
+    client,
+    deployment_name: str,
+    section_lines: list[str],
+    max_attempts: int = 2,
+    prompt: str = None,
+    usage: list = None,
+) -> list[dict]:
+    """Async counterpart of structure_section."""
+    messages = build_messages(prompt or build_section_prompt(section_lines))
+    for attempt in range(1, max_attempts + 1):
+        with metrics.span("gpt.request", lines=len(section_lines), attempt=attempt):
+            response = await call_with_retry_async(
+                f"chat:{deployment_name}",
+                client.chat.completions.create,
+                model=deployment_name,
+                messages=messages,
+                temperature=0.2,
+                response_format={"type": "json_object"},
+            )
+        metrics.record_usage("gpt", response)
+        if usage is not None and attempt == 1:
+            usage.append(getattr(response, "usage", None))
+        try:
+            return parse_menu_json(response.choices[0].message.content)
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            print(f"[WARNING] Section parse failed (attempt {attempt}): {e}")
+            metrics.incr("gpt.parse_retries")
+    print(f"[WARNING] Dropping section starting {section_lines[0]!r}")
+    return []
+
+
+async def group_regions_with_gpt_async(
+    regions: list[list[str]], max_concurrency: int = None
+) -> list[list[dict]]:
+    """Async counterpart of group_regions_with_gpt."""
+    client, deployment_name = get_async_openai_client()
+    limit = asyncio.Semaphore(max_concurrency or int(env("GPT_MAX_WORKERS", "4")))
+
+    async def _structure(region_lines):
+        async with limit:
+            return await structure_section_async(client, deployment_name, region_lines)
+
+    return list(await asyncio.gather(*(_structure(lines) for lines in regions)))
+
+
+async def group_lines_with_gpt_async(
+    ocr_lines: list[str], pages: list[list[str]] = None, max_concurrency: int = None
+) -> str:
+    """
+    Async counterpart of group_lines_with_gpt built on AsyncAzureOpenAI.
+    Sections of long menus are requested concurrently (at most
+    `max_concurrency` in flight) and merged back in order.
+    """
+    client, deployment_name = get_async_openai_client()
+
+    max_lines = get_section_max_lines()
+    if (pages is not None and len(pages) > 1) or len(ocr_lines) > max_lines:
+        sections = split_into_sections(ocr_lines, pages=pages, max_lines=max_lines)
+        if len(sections) > 1:
+            limit = asyncio.Semaphore(
+                max_concurrency or int(env("GPT_MAX_WORKERS", "4"))
+            )
+
+            async def _structure(section_lines):
+                async with limit:
+                    return await structure_section_async(
+                        client, deployment_name, section_lines
+                    )
+
+            results = await asyncio.gather(*(_structure(lines) for lines in sections))
+            return json.dumps(merge_items(results))
+
+    with metrics.span("gpt.request", lines=len(ocr_lines), attempt=1):
+        response = await call_with_retry_async(
+            f"chat:{deployment_name}",
+            client.chat.completions.create,
+            model=deployment_name,
+            messages=build_messages(build_menu_prompt(ocr_lines)),
+            temperature=0.2,
+        )
+    metrics.record_usage("gpt", response)
+    return response.choices[0].message.content.strip()
+
+
+async def group_blocks_with_gpt_async(
+    blocks: list[list[str]], max_concurrency: int = None
+) -> str:
+    """Async counterpart of group_blocks_with_gpt."""
+    client, deployment_name = get_async_openai_client()
+    chunks = split_blocks(blocks, get_section_max_lines())
+    usage = []
+    limit = asyncio.Semaphore(max_concurrency or int(env("GPT_MAX_WORKERS", "4")))
+
+    async def _structure(chunk):
+        lines = [line for block in chunk for line in block]
+        async with limit:
+            items = await structure_section_async(
+                client,
+                deployment_name,
+                lines,
+                prompt=build_block_prompt(chunk),
+                usage=usage,
+            )
+        return expand_block_items(items, chunk)
+
+    results = await asyncio.gather(*(_structure(chunk) for chunk in chunks))
+    report_prompt_tokens(chunks, usage)
+    return json.dumps(merge_items(results))
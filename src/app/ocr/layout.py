@@ -0,0 +1,202 @@
+# src/app/ocr/layout.py
+"""
+Layout-aware pre-grouping of OCR lines into candidate item blocks.
+
+Document Intelligence (and the local OCR backend) return a polygon per line.
+From those, each page is read column by column: prices that sit on their own
+to the right of a dish name are pulled onto the name's row, columns are found
+from the horizontal gutters between the remaining lines, lines that span most
+of the page (titles) cut the page into bands, and each column is split into
+blocks at vertical gaps larger than a typical line spacing and at headings.
+A block is usually one dish (name, description, price), which lets GPT work
+from a compact block-indexed prompt.
+"""
+
+import statistics
+from typing import NamedTuple
+
+from src.app.ocr.local_parser import PRICE_LINE, classify_line
+from src.app.settings import env
+
+# Lines wider than this share of the page are left out of column detection
+WIDE_LINE_SHARE = 0.5
+
+
+class _Box(NamedTuple):
+    index: int
+    text: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    @property
+    def cx(self) -> float:
+        return (self.x0 + self.x1) / 2
+
+    @property
+    def cy(self) -> float:
+        return (self.y0 + self.y1) / 2
+
+
+def layout_grouping_enabled() -> bool:
+    """Whether GPT gets layout blocks instead of flat lines (GPT_LAYOUT_BLOCKS)."""
+    return env("GPT_LAYOUT_BLOCKS", "1") == "1"
+
+
+def get_gap_factor() -> float:
+    """
+    Vertical gap, in median line heights, that separates two blocks
+    (LAYOUT_GAP_FACTOR, default 0.75).
+    """
+    return float(env("LAYOUT_GAP_FACTOR", "0.75"))
+
+
+def _boxes(lines: list[str], geometry: dict) -> list[_Box] | None:
+    boxes = []
+    for index, (text, line) in enumerate(zip(lines, geometry["lines"])):
+        polygon = line.get("polygon")
+        if not polygon or len(polygon) < 4 or None in polygon:
+            return None
+        xs, ys = polygon[0::2], polygon[1::2]
+        if text.strip():
+            boxes.append(_Box(index, text.strip(), min(xs), min(ys), max(xs), max(ys)))
+    return boxes
+
+
+def find_columns(boxes: list, tolerance: float) -> list[tuple[float, float]]:
+    """Horizontal extents of the text columns: merged x-ranges of the lines."""
+    columns = []
+    for box in sorted(boxes, key=lambda box: box.x0):
+        if columns and box.x0 <= columns[-1][1] + tolerance:
+            columns[-1] = (columns[-1][0], max(columns[-1][1], box.x1))
+        else:
+            columns.append((box.x0, box.x1))
+    return columns
+
+
+def _columns_spanned(box: _Box, columns: list[tuple[float, float]]) -> int:
+    return sum(box.x0 < end and box.x1 > start for start, end in columns)
+
+
+def _column_of(x: float, columns: list[tuple[float, float]]) -> int:
+    """The column containing `x`, else the nearest one to its left."""
+    for number, (start, end) in enumerate(columns):
+        if start <= x <= end:
+            return number
+    left = [number for number, (start, _end) in enumerate(columns) if start <= x]
+    return left[-1] if left else 0
+
+
+def _row_mate(price: _Box, boxes: list, height: float) -> _Box | None:
+    """The text line on the same row as `price` and closest to its left."""
+    same_row = [
+        box
+        for box in boxes
+        if abs(box.cy - price.cy) <= height / 2 and box.x1 <= price.x0 + height
+    ]
+    return max(same_row, key=lambda box: box.x1, default=None)
+
+
+def page_blocks(lines: list[str], geometry: dict, gap_factor: float = None) -> list:
+    """
+    Group one page's cleaned `lines` (aligned with `geometry["lines"]`) into
+    blocks of lines in reading order. Returns None when the page has no
+    usable polygons.
+    """
+    boxes = _boxes(lines, geometry)
+    if not boxes:
+        return None
+    gap_factor = gap_factor or get_gap_factor()
+    height = statistics.median(box.y1 - box.y0 for box in boxes) or 1.0
+    page_width = geometry.get("width") or max(box.x1 for box in boxes)
+
+    prices = [box for box in boxes if PRICE_LINE.match(box.text)]
+    text = [box for box in boxes if not PRICE_LINE.match(box.text)]
+    candidates = [b for b in text if b.x1 - b.x0 <= WIDE_LINE_SHARE * page_width]
+    columns = find_columns(candidates, tolerance=height / 2) or [(0.0, page_width)]
+    # Lines crossing a gutter (titles, banners) cut the page into bands
+    wide = [box for box in text if _columns_spanned(box, columns) > 1]
+    narrow = [box for box in text if box not in wide]
+
+    # Prices go right after the name on their row, else into their column
+    followers = {}
+    placed = []
+    for price in prices:
+        mate = _row_mate(price, text, height)
+        if mate is not None:
+            followers.setdefault(mate.index, []).append(price)
+        else:
+            placed.append(price)
+
+    bands = sorted(wide, key=lambda box: box.y0)
+    band_tops = [box.y0 for box in bands]
+
+    def band_of(box):
+        return sum(top <= box.cy for top in band_tops)
+
+    cells = {}  # (band, column) -> boxes
+    for box in narrow + placed:
+        cells.setdefault((band_of(box), _column_of(box.cx, columns)), []).append(box)
+
+    blocks = []
+    for band in range(len(bands) + 1):
+        if band:
+            blocks.append(_with_followers([bands[band - 1]], followers))
+        for column in range(len(columns)):
+            column_boxes = sorted(cells.get((band, column), []), key=lambda b: b.y0)
+            blocks.extend(
+                _with_followers(block, followers)
+                for block in _split_at_gaps(
+                    column_boxes, gap_factor * height, followers
+                )
+            )
+    return blocks
+
+
+def _split_at_gaps(boxes: list, max_gap: float, followers: dict) -> list[list]:
+    def heading(box):
+        # A line with a price on its row is a dish, even if named like "Pasta"
+        return box.index not in followers and classify_line(box.text) == "heading"
+
+    blocks = []
+    for box in boxes:
+        if (
+            blocks
+            and box.y0 - blocks[-1][-1].y1 <= max_gap
+            and not heading(box)
+            and not heading(blocks[-1][-1])
+        ):
+            blocks[-1].append(box)
+        else:
+            blocks.append([box])
+    return blocks
+
+
+def _with_followers(block: list, followers: dict) -> list[str]:
+    texts = []
+    for box in block:
+        texts.append(box.text)
+        texts.extend(price.text for price in followers.get(box.index, []))
+    return texts
+
+
+def layout_blocks(lines: list[str], pages: list[dict]) -> list[list[str]] | None:
+    """
+    Blocks of a whole menu: `lines` are the cleaned lines of all `pages`
+    (page geometries) in order. Returns None if the geometry does not line
+    up with the lines or lacks polygons, so callers fall back to flat lines.
+    """
+    if not pages or sum(len(page.get("lines", [])) for page in pages) != len(lines):
+        return None
+    blocks, start = [], 0
+    for page in pages:
+        page_lines = lines[start : start + len(page["lines"])]
+        start += len(page["lines"])
+        page_result = page_blocks(page_lines, page)
+        if page_result is None:
+            if any(line.strip() for line in page_lines):
+                return None
+            continue
+        blocks.extend(page_result)
+    return blocks or None
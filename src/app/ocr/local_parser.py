@@ -0,0 +1,207 @@
+# src/app/ocr/local_parser.py
+"""
+Deterministic menu structuring for the common name / price / description
+layouts, so simple menus do not need a GPT round trip.
+
+Lines are classified as headings, prices, "name  $price" items or text, split
+into regions at headings, and grouped into items around the prices. Each
+region gets a confidence in [0, 1] from how many of its lines the grouping
+explains and how much its names and descriptions look the part; the caller
+decides which regions still go to GPT.
+"""
+
+import re
+from typing import NamedTuple
+
+from src.app.ocr.group_with_gpt import is_heading
+
+_PRICE = r"[$€£¥]\s?\d+(?:[.,]\d{1,2})?|\d+[.,]\d{2}(?:\s?[$€£¥])?|\d+\s?[$€£¥]"
+# One price, or sizes such as "$8 / $12" or "8.50/12"
+_PRICES = rf"(?:{_PRICE})(?:\s*[/|]\s*(?:{_PRICE}|\d+(?:[.,]\d{{1,2}})?))*"
+PRICE_LINE = re.compile(rf"^\s*{_PRICES}\s*$")
+TRAILING_PRICE = re.compile(rf"\s*(?:\.{{2,}}|…+|[-–—|])?\s*(?P<price>{_PRICES})\s*$")
+SECTION_WORDS = {
+    "appetizers", "starters", "small plates", "sharing", "soups", "salads",
+    "mains", "main courses", "entrees", "entrées", "pasta", "pizza", "pizzas",
+    "burgers", "sandwiches", "sides", "desserts", "sweets", "drinks",
+    "beverages", "hot drinks", "cocktails", "wine", "wines", "beer", "beers",
+    "breakfast", "brunch", "lunch", "dinner", "specials", "kids", "kids menu",
+}  # fmt: skip
+NAME_MAX_WORDS = 6
+# Two layouts explaining a region about equally well make it ambiguous
+AMBIGUITY_MARGIN = 0.15
+
+
+class Region(NamedTuple):
+    """A run of menu lines (from a heading to the next) and its local parse."""
+
+    lines: list[str]
+    items: list[dict]
+    confidence: float
+
+
+class ParsedMenu(NamedTuple):
+    regions: list[Region]
+
+    @property
+    def items(self) -> list[dict]:
+        return [item for region in self.regions for item in region.items]
+
+    @property
+    def confidence(self) -> float:
+        """Line-weighted confidence over all regions (0 for an empty menu)."""
+        total = sum(len(region.lines) for region in self.regions)
+        if not total:
+            return 0.0
+        weighted = sum(len(r.lines) * r.confidence for r in self.regions)
+        return weighted / total
+
+
+def split_item(line: str) -> tuple[str, str] | None:
+    """(name, price) of a "Name ..... $9.50" line, or None."""
+    match = TRAILING_PRICE.search(line)
+    if match is None:
+        return None
+    name = line[: match.start()].strip(" .:")
+    if not any(c.isalpha() for c in name):
+        return None
+    return name, match.group("price").strip()
+
+
+def classify_line(line: str) -> str:
+    """One of "price", "item" (name with a price), "heading" or "text"."""
+    text = line.strip()
+    if PRICE_LINE.match(text):
+        return "price"
+    if split_item(text):
+        return "item"
+    if text.rstrip(":").casefold() in SECTION_WORDS or is_heading(text):
+        return "heading"
+    return "text"
+
+
+def _roles(lines: list[str]) -> list[str]:
+    roles = [classify_line(line) for line in lines]
+    # ALL-CAPS dish names look like headings; a price right after says otherwise
+    for index, role in enumerate(roles[:-1]):
+        if role == "heading" and roles[index + 1] == "price":
+            roles[index] = "text"
+    return roles
+
+
+def name_score(name: str) -> float:
+    """How much a line looks like a dish name: short, capitalised, not a sentence."""
+    words = name.split()
+    if not words:
+        return 0.0
+    if len(words) > NAME_MAX_WORDS or name.endswith(".") or name[0].islower():
+        return 0.3
+    return 0.7 if "," in name else 1.0
+
+
+def description_score(line: str) -> float:
+    """How much a line looks like a description rather than another dish name."""
+    words = line.split()
+    if (
+        "," in line
+        or line[:1].islower()
+        or len(words) >= 4
+        or any(len(word) > 3 and word[0].islower() for word in words)
+    ):
+        return 1.0
+    return 0.3
+
+
+def _group(lines: list[str], roles: list[str], name_first: bool) -> tuple:
+    """
+    Group a region into items anchored on its prices. With `name_first` the
+    text before a price is "name, description..." (name / description / price);
+    otherwise the last text line before a price is its name and earlier ones
+    describe the previous item (name / price / description).
+    Returns (items, explained line count, feature scores).
+    """
+    items, scores, pending = [], [], []
+    explained = 0
+
+    def describe(item, text_lines):
+        nonlocal explained
+        if item is None:
+            return
+        for text in text_lines:
+            item["description"] = f"{item['description']} {text}".strip()
+            scores.append(description_score(text))
+            explained += 1
+
+    for line, role in zip(lines, roles):
+        text = line.strip()
+        if role == "heading":
+            explained += 1
+        elif role == "text":
+            pending.append(text)
+        elif role == "item":
+            describe(items[-1] if items else None, pending)
+            name, price = split_item(text)
+            items.append({"name": name, "price": price, "description": ""})
+            scores.append(name_score(items[-1]["name"]))
+            explained += 1
+            pending = []
+        else:  # a price on its own line
+            if name_first:
+                name, description = (pending[0], pending[1:]) if pending else ("", [])
+            else:
+                previous = items[-1] if items else None
+                describe(previous, pending[:-1])
+                name, description = (pending[-1] if pending else ""), []
+            items.append({"name": name, "price": text, "description": ""})
+            scores.append(name_score(name))
+            explained += 1 + bool(name)
+            describe(items[-1], description)
+            pending = []
+    if not name_first:
+        describe(items[-1] if items else None, pending)
+    return items, explained, scores
+
+
+def parse_region(lines: list[str], roles: list[str] = None) -> Region:
+    """Parse one region, choosing the layout that explains it best."""
+    roles = roles or _roles(lines)
+    if "price" not in roles and "item" not in roles:
+        # A lone title line holds no items; anything longer needs a closer look
+        return Region(lines, [], 1.0 if len(lines) <= 1 else 0.0)
+
+    candidates = []
+    for name_first in (False, True):
+        items, explained, scores = _group(lines, roles, name_first)
+        coverage = explained / len(lines)
+        quality = sum(scores) / len(scores) if scores else 0.0
+        candidates.append((coverage * quality, items))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    (best, items), (runner_up, other_items) = candidates
+    if other_items != items and best - runner_up < AMBIGUITY_MARGIN:
+        best *= 0.5
+    return Region(lines, items, best)
+
+
+def split_regions(lines: list[str]) -> list[tuple[list[str], list[str]]]:
+    """Split menu lines into (lines, roles) regions, each starting at a heading."""
+    regions, current, current_roles = [], [], []
+    for line, role in zip(lines, _roles(lines)):
+        if role == "heading" and current:
+            regions.append((current, current_roles))
+            current, current_roles = [], []
+        current.append(line)
+        current_roles.append(role)
+    if current:
+        regions.append((current, current_roles))
+    return regions
+
+
+def parse_menu_lines(lines: list[str]) -> ParsedMenu:
+    """
+    Structure OCR lines into {"name", "price", "description"} items without a
+    model call. Check the result's confidence before trusting it.
+    """
+    lines = [line for line in lines if line.strip()]
+    return ParsedMenu(
+        [parse_region(region, roles) for region, roles in split_regions(lines)]
+    )
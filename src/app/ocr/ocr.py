@@ -1,26 +1,309 @@
-import os
-from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
+import asyncio
 import re
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, NamedTuple
+from src.app import metrics
+from src.app.clients import (
+    get_async_document_intelligence_client,
+    get_document_intelligence_client,
+)
+from src.app.ocr.backends import FallbackBackend, OCRBackend, get_easyocr_backend
+from src.app.ocr.ocr_cache import OCRCache, get_ocr_cache
+from src.app.ocr.preprocess import preprocess_for_ocr
+from src.app.ocr.scheduler import enable_ocr_scheduler, get_ocr_scheduler
+from src.app.resilience import call_with_retry, call_with_retry_async
+from src.app.settings import env, get_settings
 
-# Load Azure credentials from .env
-load_dotenv()
+
+def get_azure_settings():
+    """The Document Intelligence endpoint and key (see src.app.settings)."""
+    return get_settings().document_intelligence()
 
 
 def get_azure_client():
-    """Get Azure Document Intelligence client."""
-    endpoint = os.getenv("AZURE_ENDPOINT")
-    key = os.getenv("AZURE_KEY")
+    """Get the shared, connection-pooled Azure Document Intelligence client."""
+    return get_document_intelligence_client(*get_azure_settings())
+
+
+def get_async_azure_client():
+    """Get the shared async Document Intelligence client for the running loop."""
+    return get_async_document_intelligence_client(*get_azure_settings())
+
 
-    if not endpoint or not key:
-        raise ValueError(
-            "AZURE_ENDPOINT and AZURE_KEY environment variables must be set"
+def _number(value):
+    """Return numeric values as floats; anything else (e.g. missing fields) as None."""
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _page_geometry(index: int, page) -> dict:
+    """Keep the page size and per-line polygons from an Azure result page."""
+    polygon_lines = []
+    for line in page.lines or []:
+        content = line.content.strip()
+        if not content:
+            continue
+        polygon = getattr(line, "polygon", None)
+        polygon_lines.append(
+            {
+                "content": content,
+                "polygon": (
+                    [_number(v) for v in polygon]
+                    if isinstance(polygon, (list, tuple))
+                    else None
+                ),
+            }
         )
+    page_number = getattr(page, "page_number", None)
+    unit = getattr(page, "unit", None)
+    return {
+        "page_number": page_number if isinstance(page_number, int) else index + 1,
+        "width": _number(getattr(page, "width", None)),
+        "height": _number(getattr(page, "height", None)),
+        "unit": unit if isinstance(unit, str) else None,
+        "lines": polygon_lines,
+    }
 
-    return DocumentIntelligenceClient(
-        endpoint=endpoint, credential=AzureKeyCredential(key)
-    )
+
+def clean_lines(raw_lines: list[str]) -> list[str]:
+    """Strip bullets, numbering and stray symbols from OCR lines."""
+    cleaned_lines = []
+    for line in raw_lines:
+        line = re.sub(r"^[•\-–\d\.\s]*", "", line)  # remove bullets/numbers
+        cleaned_lines.append(line.strip())
+    return cleaned_lines
+
+
+class MenuPage(NamedTuple):
+    """One analysed page: its number, cleaned lines and raw geometry."""
+
+    page_number: int
+    lines: list[str]
+    geometry: dict
+
+
+def _menu_page(geometry: dict) -> MenuPage:
+    raw_lines = [line["content"] for line in geometry["lines"]]
+    return MenuPage(geometry["page_number"], clean_lines(raw_lines), geometry)
+
+
+def count_pdf_pages(data: bytes) -> int:
+    """
+    Estimate the page count of a PDF by counting its page objects.
+    Returns 0 for non-PDF data, or when the page objects are hidden inside
+    compressed object streams.
+    """
+    if not data.startswith(b"%PDF"):
+        return 0
+    return len(re.findall(rb"/Type\s*/Page(?![a-zA-Z])", data))
+
+
+def _run_analysis(client, data: bytes, pages: str = None):
+    options = {"pages": pages} if pages else {}
+    with metrics.span("ocr.submit", bytes=len(data), pages=pages):
+        poller = client.begin_analyze_document(
+            model_id="prebuilt-read",
+            body=data,
+            content_type="application/octet-stream",
+            **options,
+        )
+    with metrics.span("ocr.poll", pages=pages):
+        return poller.result()
+
+
+def _analyze_document(data: bytes, pages: str = None) -> list[dict]:
+    """
+    Run one prebuilt-read job over `data` (optionally a page range like "3").
+    Throttled or failed jobs are resubmitted by the resilience layer. When the
+    OCR scheduler is enabled the job is submitted and polled through it.
+    """
+    scheduler = get_ocr_scheduler(get_azure_client)
+    if scheduler is not None:
+        # Polled from the scheduler's loop instead of a poller per document
+        with metrics.span("ocr.poll", pages=pages):
+            result = scheduler.analyze(data, pages)
+    else:
+        # Initialize client inside function to avoid import-time errors
+        client = get_azure_client()
+        result = call_with_retry(
+            "document_intelligence", _run_analysis, client, data, pages
+        )
+    metrics.incr("ocr.bytes", len(data))
+    metrics.incr("ocr.pages", len(result.pages))
+    first_page = int(pages) if pages else 1
+    return [
+        _page_geometry(first_page - 1 + index, page)
+        for index, page in enumerate(result.pages)
+    ]
+
+
+class AzureBackend(OCRBackend):
+    """Azure Document Intelligence prebuilt-read, through get_azure_client."""
+
+    name = "azure"
+
+    def analyze(self, data: bytes, pages: str = None) -> list[dict]:
+        return _analyze_document(data, pages)
+
+    async def analyze_async(self, data: bytes, pages: str = None) -> list[dict]:
+        return await _analyze_document_async(data, pages)
+
+
+OCR_BACKENDS = {"azure": AzureBackend, "easyocr": get_easyocr_backend}
+
+
+def get_ocr_backend() -> OCRBackend:
+    """
+    The backend selected by OCR_BACKEND ("azure" or "easyocr", default azure).
+    With OCR_FALLBACK_BACKEND=easyocr, images are read locally while Azure is
+    throttled.
+    """
+    name = env("OCR_BACKEND", "azure")
+    fallback = env("OCR_FALLBACK_BACKEND", "")
+    for value in (name, fallback):
+        if value and value not in OCR_BACKENDS:
+            raise ValueError(
+                f"Unknown OCR backend {value!r}; choose from {', '.join(OCR_BACKENDS)}"
+            )
+    backend = OCR_BACKENDS[name]()
+    if fallback and fallback != name:
+        backend = FallbackBackend(
+            backend, OCR_BACKENDS[fallback](), service="document_intelligence"
+        )
+    return backend
+
+
+def warm_up_ocr_backend():
+    """Start the configured OCR backend (e.g. load EasyOCR models) ahead of use."""
+    get_ocr_backend().warm_up()
+
+
+def _cache_key(data: bytes, backend: OCRBackend) -> str:
+    """
+    OCR cache key of an upload: its content hash, tagged with the backend that
+    reads it unless that is Azure, so switching backends does not serve the
+    other backend's results.
+    """
+    key = OCRCache.make_key(data)
+    name = getattr(backend, "primary", backend).name
+    return key if name == "azure" else f"{key}-{name}"
+
+
+def _cacheable(pages: list[dict]) -> bool:
+    """Pages read by a fallback backend are not cached (see FallbackBackend)."""
+    return not any(page.get("fallback") for page in pages)
+
+
+def _iter_analyzed_pages(
+    data: bytes, backend: OCRBackend, max_workers: int = None
+) -> Iterator[dict]:
+    """
+    Yield page geometry in page order. Multi-page PDFs are analysed as one job
+    per page with at most `max_workers` (OCR_MAX_WORKERS) jobs in flight, so the
+    first pages can be yielded while later ones are still being read.
+    """
+    page_count = count_pdf_pages(data)
+    if page_count <= 1:
+        yield from backend.analyze(data)
+        return
+
+    max_workers = max_workers or int(env("OCR_MAX_WORKERS", "4"))
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = [
+            pool.submit(metrics.bind(backend.analyze), data, str(page_number))
+            for page_number in range(1, page_count + 1)
+        ]
+        for future in futures:
+            yield from future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_menu_pages(image_path: str, max_workers: int = None) -> Iterator[MenuPage]:
+    """
+    Stream the pages of a menu as MenuPage tuples, in page order, as soon as each
+    page has been read. The combined result is cached under the SHA-256 of the
+    file contents, so re-uploads of the same menu skip the Azure round trip;
+    results that needed the fallback backend are not cached.
+    Images are shrunk by preprocess_for_ocr before upload; the cache key stays
+    on the original bytes.
+    """
+    with open(image_path, "rb") as f:
+        data = f.read()
+
+    backend = get_ocr_backend()
+    cache = get_ocr_cache()
+    cache_key = _cache_key(data, backend)
+    cached = cache.get(cache_key) if cache is not None else None
+    _record_cache(cache, cached)
+    if cached is not None:
+        for geometry in cached["pages"]:
+            yield _menu_page(geometry)
+        return
+
+    pages = []
+    for geometry in _iter_analyzed_pages(
+        preprocess_for_ocr(data), backend, max_workers
+    ):
+        page = _menu_page(geometry)
+        pages.append(page)
+        yield page
+
+    analysis = _combine_pages(pages)
+    if cache is not None and _cacheable(analysis["pages"]):
+        cache.put(cache_key, analysis)
+
+
+def _record_cache(cache: OCRCache, cached: dict | None):
+    if cache is not None:
+        result = "hits" if cached is not None else "misses"
+        metrics.incr(f"cache.{result}", cache="ocr")
+
+
+def _combine_pages(pages: list[MenuPage]) -> dict:
+    return {
+        "lines": [line for page in pages for line in page.lines],
+        "pages": [page.geometry for page in pages],
+    }
+
+
+def enable_scheduled_ocr():
+    """Route OCR in this process through the shared OCRScheduler."""
+    return enable_ocr_scheduler(get_azure_client)
+
+
+def prefetch_menu_pages(image_path: str) -> int:
+    """
+    Submit the OCR jobs for a menu to the scheduler without waiting for them,
+    so many documents are in flight before the pipeline asks for their pages.
+    Returns the number of jobs submitted (0 if cached or the scheduler is off).
+    """
+    scheduler = get_ocr_scheduler(get_azure_client)
+    if scheduler is None or env("OCR_BACKEND", "azure") != "azure":
+        return 0
+    data = Path(image_path).read_bytes()
+    cache = get_ocr_cache()
+    if cache is not None and cache.get(OCRCache.make_key(data)) is not None:
+        return 0
+    # Same payload as the pipeline will send, so the scheduler hands the
+    # pipeline this job (or its held result) instead of submitting it again
+    data = preprocess_for_ocr(data)
+    page_count = count_pdf_pages(data)
+    if page_count <= 1:
+        scheduler.prefetch(data)
+        return 1
+    for page_number in range(1, page_count + 1):
+        scheduler.prefetch(data, str(page_number))
+    return page_count
+
+
+def analyze_menu(image_path: str) -> dict:
+    """
+    Runs the Azure Document Intelligence Read model over a menu image or PDF.
+    Returns {"lines": cleaned lines, "pages": page/line geometry}.
+    """
+    return _combine_pages(list(iter_menu_pages(image_path)))
 
 
 def extract_menu_items(image_path: str) -> list[str]:
@@ -28,29 +311,89 @@ def extract_menu_items(image_path: str) -> list[str]:
     Extracts food items (line-by-line) from a menu image using Azure Document Intelligence Read model.
     Returns a list of cleaned food item lines.
     """
-    # Initialize client inside function to avoid import-time errors
-    client = get_azure_client()
+    return analyze_menu(image_path)["lines"]
 
-    with open(image_path, "rb") as f:
-        poller = client.begin_analyze_document(
-            model_id="prebuilt-read", body=f, content_type="application/octet-stream"
+
+# ---- Async API ----
+async def _run_analysis_async(client, data: bytes, pages: str = None):
+    options = {"pages": pages} if pages else {}
+    with metrics.span("ocr.submit", bytes=len(data), pages=pages):
+        poller = await client.begin_analyze_document(
+            model_id="prebuilt-read",
+            body=data,
+            content_type="application/octet-stream",
+            **options,
         )
-        result = poller.result()
-
-    # Extract lines from OCR result
-    raw_lines = [
-        line.content.strip()
-        for page in result.pages
-        for line in page.lines
-        if line.content.strip()
+    with metrics.span("ocr.poll", pages=pages):
+        return await poller.result()
+
+
+async def _analyze_document_async(data: bytes, pages: str = None) -> list[dict]:
+    """Async counterpart of _analyze_document."""
+    client = get_async_azure_client()
+    result = await call_with_retry_async(
+        "document_intelligence", _run_analysis_async, client, data, pages
+    )
+    metrics.incr("ocr.bytes", len(data))
+    metrics.incr("ocr.pages", len(result.pages))
+    first_page = int(pages) if pages else 1
+    return [
+        _page_geometry(first_page - 1 + index, page)
+        for index, page in enumerate(result.pages)
     ]
 
-    # Optional: clean bullet points or stray symbols
-    cleaned_lines = []
-    for line in raw_lines:
-        line = re.sub(r"^[•\-–\d\.\s]*", "", line)  # remove bullets/numbers
-        cleaned_lines.append(line.strip())
-    return cleaned_lines
+
+async def analyze_menu_async(image_path: str, max_concurrency: int = None) -> dict:
+    """
+    Async counterpart of analyze_menu. Pages of multi-page PDFs are analysed
+    concurrently with at most `max_concurrency` (OCR_MAX_WORKERS) jobs in flight,
+    and one failed page cancels the others. Shares the OCR cache with the
+    synchronous API.
+    """
+    data = await asyncio.to_thread(Path(image_path).read_bytes)
+
+    backend = get_ocr_backend()
+    cache = get_ocr_cache()
+    cache_key = _cache_key(data, backend)
+    cached = cache.get(cache_key) if cache is not None else None
+    _record_cache(cache, cached)
+    if cached is not None:
+        return cached
+
+    data = await asyncio.to_thread(preprocess_for_ocr, data)
+    page_count = count_pdf_pages(data)
+    if page_count <= 1:
+        geometries = await backend.analyze_async(data)
+    else:
+        limit = asyncio.Semaphore(max_concurrency or int(env("OCR_MAX_WORKERS", "4")))
+
+        async def _analyze_page(page_number):
+            async with limit:
+                return await backend.analyze_async(data, str(page_number))
+
+        tasks = [
+            asyncio.ensure_future(_analyze_page(n)) for n in range(1, page_count + 1)
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # One failed page fails the menu: stop the others instead of
+            # leaving them to use up OCR quota in the background
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        geometries = [geometry for page in results for geometry in page]
+
+    analysis = _combine_pages([_menu_page(geometry) for geometry in geometries])
+    if cache is not None and _cacheable(analysis["pages"]):
+        cache.put(cache_key, analysis)
+    return analysis
+
+
+async def extract_menu_items_async(image_path: str) -> list[str]:
+    """Async counterpart of extract_menu_items."""
+    return (await analyze_menu_async(image_path))["lines"]
 
 
 # # Example usage
@@ -0,0 +1,106 @@
+# src/app/ocr/ocr_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from src.app.ttl_cache import TTLCache
+from src.app.settings import env
+
+
+class OCRCache:
+    """
+    Two-tier cache for OCR results keyed on the SHA-256 of the uploaded bytes.
+    A bounded in-memory tier serves repeat uploads within the process; an
+    optional on-disk tier of JSON files survives restarts. Both tiers expire
+    entries after `ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        directory=None,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_memory_entries: int = 128,
+    ):
+        self.directory = Path(directory) if directory else None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_memory_entries, ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(data: bytes) -> str:
+        """Hash the uploaded file contents into a cache key."""
+        return hashlib.sha256(data).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached OCR result, or None on a miss."""
+        result = self.memory.get(key)
+        if result is None and self.directory:
+            result = self._read_disk(key)
+            if result is not None:
+                self.memory.set(key, result)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def _read_disk(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if time.time() - entry.get("saved_at", 0) > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+        return entry["result"]
+
+    def put(self, key: str, result: dict):
+        """Store an OCR result in both tiers."""
+        self.memory.set(key, result)
+        if self.directory:
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            entry = {"saved_at": time.time(), "result": result}
+            tmp_path.write_text(json.dumps(entry), encoding="utf-8")
+            os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+        }
+
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> OCRCache | None:
+    """
+    Get the process-wide OCR cache configured by OCR_CACHE_TTL_SECONDS,
+    OCR_CACHE_MEMORY_ENTRIES and OCR_CACHE_DIR (empty for memory only).
+    Returns None when the TTL is 0.
+    """
+    global _ocr_cache
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            ttl_seconds = float(env("OCR_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+            if ttl_seconds <= 0:
+                return None
+            _ocr_cache = OCRCache(
+                directory=env("OCR_CACHE_DIR", ".cache/ocr") or None,
+                ttl_seconds=ttl_seconds,
+                max_memory_entries=int(env("OCR_CACHE_MEMORY_ENTRIES", "128")),
+            )
+        return _ocr_cache
@@ -1,13 +1,123 @@
 # src/app/pipeline.py
-from src.app.ocr.ocr import extract_menu_items
-from src.app.ocr.group_with_gpt import group_lines_with_gpt
+import json
+
+from src.app import metrics
+from src.app.ocr.ocr import analyze_menu, clean_lines
+from src.app.ocr.group_with_gpt import (
+    group_blocks_with_gpt,
+    group_blocks_with_gpt_async,
+    group_lines_with_gpt,
+    group_lines_with_gpt_async,
+    group_regions_with_gpt,
+    group_regions_with_gpt_async,
+    merge_items,
+)
+from src.app.ocr.layout import layout_blocks, layout_grouping_enabled
+from src.app.ocr.local_parser import ParsedMenu, parse_menu_lines
+from src.app.settings import env
+
+
+def get_local_min_confidence() -> float:
+    """
+    Confidence (0-1) at which locally parsed regions skip GPT
+    (LOCAL_PARSER_MIN_CONFIDENCE, default 0.9; above 1 always uses GPT).
+    """
+    return float(env("LOCAL_PARSER_MIN_CONFIDENCE", "0.9"))
+
+
+def parse_locally(lines) -> tuple[ParsedMenu, list[bool]]:
+    """Parse `lines` locally; also return which regions are confident enough."""
+    with metrics.span("parse.local", lines=len(lines)) as span:
+        parsed = parse_menu_lines(lines)
+        span["confidence"] = round(parsed.confidence, 3)
+    threshold = get_local_min_confidence()
+    return parsed, [region.confidence >= threshold for region in parsed.regions]
+
+
+def _combine(parsed: ParsedMenu, confident: list[bool], gpt_items: list) -> str:
+    results = iter(gpt_items)
+    sections = [
+        region.items if ok else next(results)
+        for region, ok in zip(parsed.regions, confident)
+    ]
+    metrics.incr("parse.local_regions", sum(confident))
+    metrics.incr("parse.gpt_regions", len(confident) - sum(confident))
+    return json.dumps(merge_items(sections))
+
+
+def _blocks(lines, pages):
+    if not pages or not layout_grouping_enabled():
+        return None
+    with metrics.span("parse.layout", lines=len(lines)) as span:
+        blocks = layout_blocks(lines, pages)
+        span["blocks"] = len(blocks) if blocks else 0
+    return blocks
+
+
+def _page_lines(lines, pages):
+    """
+    Cleaned lines of each page of a multi-page menu, so flat GPT requests are
+    split at page breaks; None for single pages or geometry that does not
+    match `lines`.
+    """
+    if not pages or len(pages) < 2:
+        return None
+    page_lines = [
+        clean_lines([line["content"] for line in page["lines"]]) for page in pages
+    ]
+    if [line for page in page_lines for line in page] != list(lines):
+        return None
+    return page_lines
+
+
+def structure_lines(lines, pages: list[dict] = None):
+    """
+    Structure OCR lines into a JSON list of items. Regions the local parser is
+    confident about are used as-is; GPT only sees the rest, or the whole menu
+    when no region is confident. With the OCR page geometry (`pages`) the whole
+    menu goes to GPT pre-grouped into layout blocks, or as flat lines split at
+    page breaks when layout grouping is off.
+    """
+    parsed, confident = parse_locally(lines)
+    if confident and all(confident):
+        print(f"Structured locally (confidence {parsed.confidence:.2f}), skipping GPT")
+        return _combine(parsed, confident, [])
+    if any(confident):
+        unsure = [r.lines for r, ok in zip(parsed.regions, confident) if not ok]
+        print(f"Running GPT structuring on {len(unsure)} uncertain regions...")
+        return _combine(parsed, confident, group_regions_with_gpt(unsure))
+    blocks = _blocks(lines, pages)
+    if blocks:
+        print(f"Running GPT structuring on {len(blocks)} layout blocks...")
+        return group_blocks_with_gpt(blocks)
+    print("Running GPT structuring...")
+    return group_lines_with_gpt(lines, _page_lines(lines, pages))
+
+
+async def structure_lines_async(lines, pages: list[dict] = None):
+    """Async counterpart of structure_lines."""
+    parsed, confident = parse_locally(lines)
+    if confident and all(confident):
+        print(f"Structured locally (confidence {parsed.confidence:.2f}), skipping GPT")
+        return _combine(parsed, confident, [])
+    if any(confident):
+        unsure = [r.lines for r, ok in zip(parsed.regions, confident) if not ok]
+        print(f"Running GPT structuring on {len(unsure)} uncertain regions...")
+        return _combine(parsed, confident, await group_regions_with_gpt_async(unsure))
+    blocks = _blocks(lines, pages)
+    if blocks:
+        print(f"Running GPT structuring on {len(blocks)} layout blocks...")
+        return await group_blocks_with_gpt_async(blocks)
+    return await group_lines_with_gpt_async(lines, _page_lines(lines, pages))
 
 
 def run_pipeline(image_path):
     print("Running OCR...")
-    lines = extract_menu_items(image_path)
-    print("Running GPT structuring...")
-    structured = group_lines_with_gpt(lines)
+    with metrics.span("pipeline.ocr"):
+        analysis = analyze_menu(image_path)
+    lines = analysis["lines"]
+    with metrics.span("pipeline.gpt", lines=len(lines)):
+        structured = structure_lines(lines, analysis["pages"])
     print("Done.")
     return structured
 
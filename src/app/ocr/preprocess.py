@@ -0,0 +1,182 @@
+# src/app/ocr/preprocess.py
+"""
+Shrinks menu photos before they are uploaded to Document Intelligence.
+
+Phone photos of menus are often 12-MP JPEGs of several MB, far more than the
+Read model needs. preprocess_image applies the EXIF orientation, downscales to
+a maximum dimension, converts to grayscale, optionally crops to the bright
+paper region, and recompresses as JPEG. PDFs and anything Pillow cannot open
+are passed through unchanged, as is any result that would not be smaller.
+"""
+
+import io
+from typing import NamedTuple
+
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+
+from src.app import metrics
+from src.app.settings import env
+
+
+class PreprocessResult(NamedTuple):
+    """Bytes to upload, with the sizes before and after and the steps applied."""
+
+    data: bytes
+    original_bytes: int
+    processed_bytes: int
+    steps: tuple[str, ...]
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.processed_bytes
+
+
+def _otsu_threshold(image: Image.Image) -> int:
+    """Gray level that best separates the dark and bright pixels of an "L" image."""
+    histogram = image.histogram()
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    sum_dark = weight_dark = 0
+    best_level, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        weight_dark += count
+        weight_bright = total - weight_dark
+        if weight_dark == 0:
+            continue
+        if weight_bright == 0:
+            break
+        sum_dark += level * count
+        mean_dark = sum_dark / weight_dark
+        mean_bright = (sum_all - sum_dark) / weight_bright
+        variance = weight_dark * weight_bright * (mean_dark - mean_bright) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def _paper_span(profile: bytes, min_fill: int) -> tuple[int, int] | None:
+    """First and last index whose share of paper pixels reaches `min_fill`/255."""
+    filled = [index for index, value in enumerate(profile) if value >= min_fill]
+    return (filled[0], filled[-1] + 1) if filled else None
+
+
+def find_document_box(
+    image: Image.Image, min_fill: float = 0.3, margin: float = 0.02
+) -> tuple[int, int, int, int] | None:
+    """
+    Bounding box of the menu page in a photo, found as the rows and columns
+    that are mostly brighter than Otsu's threshold (paper against a darker
+    table or background). Returns None when no smaller region stands out.
+    """
+    gray = ImageOps.grayscale(image)
+    gray.thumbnail((512, 512))
+    threshold = _otsu_threshold(gray)
+    paper = gray.point(lambda level: 255 if level > threshold else 0)
+    # Box-resizing to a single row/column averages the mask per column/row
+    columns = paper.resize((paper.width, 1), Image.BOX).tobytes()
+    rows = paper.resize((1, paper.height), Image.BOX).tobytes()
+    span_x = _paper_span(columns, int(min_fill * 255))
+    span_y = _paper_span(rows, int(min_fill * 255))
+    if span_x is None or span_y is None:
+        return None
+
+    scale_x, scale_y = image.width / paper.width, image.height / paper.height
+    pad_x, pad_y = margin * image.width, margin * image.height
+    box = (
+        max(0, int(span_x[0] * scale_x - pad_x)),
+        max(0, int(span_y[0] * scale_y - pad_y)),
+        min(image.width, int(span_x[1] * scale_x + pad_x)),
+        min(image.height, int(span_y[1] * scale_y + pad_y)),
+    )
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    # Not worth it for a near-full-frame scan; a tiny box is a misdetection
+    if not 0.25 * image.width * image.height < area < 0.9 * image.width * image.height:
+        return None
+    return box
+
+
+def preprocess_image(
+    data: bytes,
+    max_dimension: int = 2000,
+    grayscale: bool = True,
+    quality: int = 85,
+    crop: bool = False,
+) -> PreprocessResult:
+    """
+    Return a smaller JPEG of `data` for OCR, or `data` itself when it is a
+    PDF, not an image, a multi-frame image, or already smaller.
+    """
+    unchanged = PreprocessResult(data, len(data), len(data), ())
+    if data.startswith(b"%PDF"):
+        return unchanged
+    try:
+        image = Image.open(io.BytesIO(data))
+        if getattr(image, "n_frames", 1) > 1:
+            return unchanged
+        # JPEGs can decode straight at 1/2, 1/4 or 1/8 scale, which is much
+        # faster; draft never goes below the size requested here
+        scale = min(1.0, max_dimension / max(image.size))
+        image.draft(
+            "L" if grayscale else "RGB",
+            (round(image.width * scale), round(image.height * scale)),
+        )
+        steps = []
+        if image.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+            steps.append("orient")
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return unchanged
+
+    if crop:
+        box = find_document_box(image)
+        if box is not None:
+            image = image.crop(box)
+            steps.append("crop")
+    if max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        steps.append("downscale")
+    if grayscale:
+        image = ImageOps.grayscale(image)
+        steps.append("grayscale")
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    processed = buffer.getvalue()
+    if len(processed) >= len(data):
+        return unchanged
+    return PreprocessResult(processed, len(data), len(processed), tuple(steps))
+
+
+def preprocess_for_ocr(data: bytes) -> bytes:
+    """
+    Preprocess an upload with the settings from OCR_PREPROCESS (default 1),
+    OCR_MAX_DIMENSION, OCR_GRAYSCALE, OCR_JPEG_QUALITY and OCR_CROP, and
+    record the bytes saved.
+    """
+    if env("OCR_PREPROCESS", "1") != "1":
+        return data
+    quality = int(env("OCR_JPEG_QUALITY", "85"))
+    if not 1 <= quality <= 95:
+        raise ValueError("OCR_JPEG_QUALITY must be between 1 and 95")
+
+    with metrics.span("ocr.preprocess", original_bytes=len(data)) as span:
+        result = preprocess_image(
+            data,
+            max_dimension=int(env("OCR_MAX_DIMENSION", "2000")),
+            grayscale=env("OCR_GRAYSCALE", "1") == "1",
+            quality=quality,
+            crop=env("OCR_CROP", "0") == "1",
+        )
+        span["bytes"] = result.processed_bytes
+    if result.bytes_saved:
+        metrics.incr("ocr.bytes_saved", result.bytes_saved)
+        steps = ", ".join(result.steps) or "recompress"
+        print(
+            f"[INFO] Preprocessed menu for OCR ({steps}): "
+            f"{result.original_bytes / 1e6:.2f} MB"
+            f" -> {result.processed_bytes / 1e6:.2f} MB"
+        )
+    return result.data
@@ -0,0 +1,399 @@
+# src/app/ocr/scheduler.py
+"""
+Document Intelligence jobs submitted up front and polled from one loop.
+
+The SDK poller blocks a thread per document and polls on a fixed cadence.
+OCRScheduler instead submits each analyze request, keeps the returned
+Operation-Location URL, and polls every pending operation from a single
+background thread. Polling intervals follow the completion times seen so far.
+Operation URLs are saved to a JSON file, so a restarted process resumes
+polling the jobs it had already paid for instead of submitting them again.
+Results of prefetched jobs are held until the pipeline claims them, so a job
+that finishes before its menu is reached is not submitted a second time.
+"""
+
+import hashlib
+import json
+import os
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from src.app import metrics
+from src.app.resilience import call_with_retry, is_retryable
+from src.app.settings import env
+
+if TYPE_CHECKING:
+    from azure.ai.documentintelligence.models import AnalyzeResult
+
+API_VERSION = "2024-11-30"
+# Finished prefetched results held for their first claim; older ones are dropped
+MAX_UNCLAIMED_RESULTS = 64
+# Azure keeps analyze results for 24 hours
+OPERATION_RETENTION_SECONDS = 24 * 3600
+
+
+class AnalyzeFailedError(Exception):
+    """Raised when Document Intelligence reports a failed or cancelled job."""
+
+
+class OperationStore:
+    """Pending operation URLs persisted as JSON: {key: {"location", "submitted_at"}}."""
+
+    def __init__(self, path: str | Path | None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._operations = self._load()
+
+    def _load(self) -> dict:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            operations = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Ignoring unreadable OCR operation store: {e}")
+            return {}
+        cutoff = time.time() - OPERATION_RETENTION_SECONDS
+        return {
+            key: entry
+            for key, entry in operations.items()
+            if entry.get("submitted_at", 0) > cutoff
+        }
+
+    def _save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._operations), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            return self._operations.get(key)
+
+    def put(self, key: str, location: str, submitted_at: float):
+        with self._lock:
+            self._operations[key] = {"location": location, "submitted_at": submitted_at}
+            self._save()
+
+    def remove(self, key: str):
+        with self._lock:
+            if self._operations.pop(key, None) is not None:
+                self._save()
+
+
+class _Operation:
+    def __init__(
+        self,
+        key: str,
+        location: str,
+        submitted_at: float,
+        started: float,
+        future: Future,
+    ):
+        self.key = key
+        self.location = location
+        self.submitted_at = submitted_at  # wall clock, persisted
+        self.started = started  # scheduler clock
+        self.next_poll = started
+        self.polls = 0
+        self.running_age = None  # age at the last poll that saw it still running
+        self.future = future
+        self.claimed = True  # False while only a prefetch is waiting for it
+
+
+class OCRScheduler:
+    """
+    Submits prebuilt-read jobs and resolves their futures from one polling loop.
+    The first poll of a job waits for the median completion time observed so
+    far; after that the interval grows with the job's age, between
+    `min_interval` and `max_interval` seconds. A job still running, or still
+    failing to poll, `timeout` seconds after submission fails with TimeoutError.
+    """
+
+    def __init__(
+        self,
+        client,
+        state_path: str | Path | None = None,
+        min_interval: float = 0.05,
+        max_interval: float = 2.0,
+        timeout: float = 300.0,
+        model_id: str = "prebuilt-read",
+        clock=time.monotonic,
+    ):
+        self.client = client
+        self.model_id = model_id
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self._clock = clock
+        self._store = OperationStore(state_path)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}  # key -> _Operation being polled
+        self._submitting = {}  # key -> Future of a submit request in flight
+        self._claimed_submits = set()  # submitting keys a non-prefetch caller awaits
+        self._unclaimed = OrderedDict()  # key -> finished Future of a prefetch
+        self._durations = deque(maxlen=50)
+        self._stopped = False
+        self._thread = None
+
+    @staticmethod
+    def make_key(data: bytes, pages: str = None) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{digest}:{pages}" if pages else digest
+
+    def submit(self, data: bytes, pages: str = None) -> Future:
+        """
+        Queue `data` (optionally one page range such as "3") for analysis and
+        return a Future resolving to the AnalyzeResult. Identical pending
+        documents share one job; a job saved by an earlier process is resumed,
+        and a finished prefetched job is handed over instead of resubmitted.
+        """
+        return self._submit(data, pages, claim=True)
+
+    def prefetch(self, data: bytes, pages: str = None) -> Future:
+        """
+        Like submit, but the result is held after the job finishes until the
+        first submit or analyze of the same document claims it.
+        """
+        return self._submit(data, pages, claim=False)
+
+    def _submit(self, data: bytes, pages: str, claim: bool) -> Future:
+        key = self.make_key(data, pages)
+        with self._lock:
+            future = self._unclaimed.get(key)
+            if future is not None:
+                if claim:
+                    del self._unclaimed[key]
+                return future
+            operation = self._pending.get(key)
+            if operation is not None:
+                operation.claimed = operation.claimed or claim
+                return operation.future
+            if claim:
+                self._claimed_submits.add(key)
+            future = self._submitting.get(key)
+            if future is not None:  # another caller is submitting it right now
+                return future
+            future = self._submitting[key] = Future()
+
+        try:
+            saved = self._store.get(key)
+            if saved is not None:
+                print(f"[INFO] Resuming OCR operation for {key[:12]}")
+                metrics.incr("ocr.resumed")
+                location, submitted_at = saved["location"], saved["submitted_at"]
+                first_wait = 0.0
+            else:
+                location = call_with_retry(
+                    "document_intelligence", self._submit_request, data, pages
+                )
+                submitted_at = time.time()
+                first_wait = self._first_wait()
+                self._store.put(key, location, submitted_at)
+        except Exception as e:
+            with self._lock:
+                self._submitting.pop(key, None)
+                self._claimed_submits.discard(key)
+            future.set_exception(e)
+            raise
+
+        operation = _Operation(key, location, submitted_at, self._clock(), future)
+        operation.next_poll = operation.started + first_wait
+        with self._lock:
+            self._submitting.pop(key, None)
+            operation.claimed = key in self._claimed_submits
+            self._claimed_submits.discard(key)
+            self._pending[key] = operation
+            self._ensure_loop()
+        self._wakeup.set()
+        return future
+
+    def analyze(self, data: bytes, pages: str = None) -> "AnalyzeResult":
+        """Submit and block until the result is available (or `timeout`)."""
+        # The polling loop fails the job at its deadline; the wait is a backstop
+        return self.submit(data, pages).result(timeout=self.timeout + self.max_interval)
+
+    def _submit_request(self, data: bytes, pages: str = None) -> str:
+        from azure.core.rest import HttpRequest
+
+        params = {"api-version": API_VERSION}
+        if pages:
+            params["pages"] = pages
+        with metrics.span("ocr.submit", bytes=len(data), pages=pages):
+            response = self.client.send_request(
+                HttpRequest(
+                    "POST",
+                    f"/documentModels/{self.model_id}:analyze",
+                    params=params,
+                    content=data,
+                    headers={"Content-Type": "application/octet-stream"},
+                )
+            )
+            response.raise_for_status()
+        return response.headers["Operation-Location"]
+
+    # ---- Polling loop ----
+    def _first_wait(self) -> float:
+        """Expected completion time, from the median of recent jobs."""
+        with self._lock:
+            durations = list(self._durations)
+        if not durations:
+            return self.min_interval
+        return max(self.min_interval, statistics.median(durations))
+
+    def _next_interval(self, operation: _Operation, now: float) -> float:
+        age = now - operation.started
+        return min(self.max_interval, max(self.min_interval, age * 0.25))
+
+    def _ensure_loop(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="ocr-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            # Cleared before scanning, so a submit during the scan wakes the wait
+            self._wakeup.clear()
+            now = self._clock()
+            with self._lock:
+                due = [op for op in self._pending.values() if op.next_poll <= now]
+            for operation in due:
+                self._poll(operation)
+
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                wait = (
+                    min(op.next_poll for op in self._pending.values()) - self._clock()
+                )
+            self._wakeup.wait(max(0.0, wait))
+
+    def _poll(self, operation: _Operation):
+        from azure.ai.documentintelligence.models import AnalyzeResult
+        from azure.core.rest import HttpRequest
+
+        operation.polls += 1
+        metrics.incr("ocr.polls")
+        try:
+            response = self.client.send_request(HttpRequest("GET", operation.location))
+            if response.status_code == 404:
+                # Expired or unknown operation: forget it so a resubmit starts fresh
+                self._store.remove(operation.key)
+            response.raise_for_status()
+            body = response.json()
+            status = body.get("status")
+            if status == "succeeded":
+                result = AnalyzeResult(body["analyzeResult"])
+            elif status in ("failed", "canceled"):
+                message = body.get("error", {}).get("message", status)
+                error = AnalyzeFailedError(message)
+        except Exception as e:
+            if not is_retryable(e):
+                self._finish(operation, error=e)
+                return
+            status = None  # poll again, like a running job
+
+        now = self._clock()
+        if status == "succeeded":
+            self._finish(operation, result=result)
+        elif status in ("failed", "canceled"):
+            self._finish(operation, error=error)
+        elif now - operation.started >= self.timeout:
+            # Left saved in the store: a later process may still resume it
+            self._finish(
+                operation,
+                error=TimeoutError(
+                    f"OCR operation {operation.key[:12]} not finished after "
+                    f"{self.timeout:g}s ({operation.polls} polls)"
+                ),
+            )
+        else:
+            if status is not None:
+                operation.running_age = now - operation.started
+            operation.next_poll = now + self._next_interval(operation, now)
+
+    def _finish(self, operation: _Operation, result=None, error=None):
+        with self._lock:
+            self._pending.pop(operation.key, None)
+            if error is None:
+                # The last "running" poll bounds completion time from below; the
+                # finishing poll's age would include our own polling lateness and
+                # push every later first wait further out
+                age = self._clock() - operation.started
+                self._durations.append(
+                    age if operation.running_age is None else operation.running_age
+                )
+                if not operation.claimed:
+                    self._unclaimed[operation.key] = operation.future
+                    while len(self._unclaimed) > MAX_UNCLAIMED_RESULTS:
+                        self._unclaimed.popitem(last=False)
+        if error is None or isinstance(error, AnalyzeFailedError):
+            self._store.remove(operation.key)
+        if error is None:
+            operation.future.set_result(result)
+        else:
+            operation.future.set_exception(error)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def unclaimed(self) -> int:
+        """Finished prefetched results not yet handed to the pipeline."""
+        with self._lock:
+            return len(self._unclaimed)
+
+    def shutdown(self):
+        """Stop polling. Unfinished operations stay saved for the next process."""
+        self._stopped = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def create_ocr_scheduler(client) -> OCRScheduler:
+    """
+    OCRScheduler configured from OCR_SCHEDULER_STATE (default
+    .cache/ocr_operations.json, empty disables persistence),
+    OCR_POLL_MIN_INTERVAL, OCR_POLL_MAX_INTERVAL and OCR_OPERATION_TIMEOUT
+    (default 300 seconds).
+    """
+    state_path = env("OCR_SCHEDULER_STATE", ".cache/ocr_operations.json")
+    return OCRScheduler(
+        client,
+        state_path=state_path or None,
+        min_interval=float(env("OCR_POLL_MIN_INTERVAL", "0.05")),
+        max_interval=float(env("OCR_POLL_MAX_INTERVAL", "2")),
+        timeout=float(env("OCR_OPERATION_TIMEOUT", "300")),
+    )
+
+
+def enable_ocr_scheduler(client_factory) -> OCRScheduler:
+    """Create the process-wide scheduler (if needed) and return it."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = create_ocr_scheduler(client_factory())
+        return _scheduler
+
+
+def get_ocr_scheduler(client_factory) -> OCRScheduler | None:
+    """The process-wide scheduler, or None unless enabled (or OCR_SCHEDULER=1)."""
+    if _scheduler is None and env("OCR_SCHEDULER", "0") == "1":
+        return enable_ocr_scheduler(client_factory)
+    return _scheduler
@@ -1,33 +1,162 @@
-import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+from src.app import metrics
+from src.app.clients import registry
+from src.app.events import (
+    ImageReady,
+    ItemFailed,
+    MenuStructured,
+    OCRCompleted,
+    PageRead,
+)
+from src.app.ocr.group_with_gpt import merge_items, parse_menu_json
+from src.app.ocr.ocr import analyze_menu_async, iter_menu_pages
 from src.app.ocr.ocr_pipeline import run_pipeline as run_ocr_pipeline
-from src.app.image_gen import generate_images  # You may need to implement this
-# from src.app.nlp import ... (if needed)
+from src.app.ocr.ocr_pipeline import structure_lines, structure_lines_async
+from src.app.image_gen import (
+    generate_images,
+    generate_images_async,
+    get_generation_settings,
+    is_content_policy_violation,
+    iter_images,
+)
+from src.app.settings import env
 
 
-def full_menu_pipeline(image_path):
-    """
-    1. Run OCR pipeline to extract and structure menu items.
-    2. Generate images for each menu item.
-    3. Return structured menu and generated images.
-    """
-    structured_menu_json = run_ocr_pipeline(image_path)
-
-    # Parse the JSON string into a list of dictionaries
+def parse_structured_menu(structured_menu_json) -> list[dict]:
+    """Parse the GPT output into a list of menu item dicts ([] if unparseable)."""
     try:
         if isinstance(structured_menu_json, str):
-            structured_menu = json.loads(structured_menu_json)
+            structured_menu = parse_menu_json(structured_menu_json)
         else:
             # If it's already a list/dict, use it directly
             structured_menu = structured_menu_json
-    except json.JSONDecodeError as e:
+    except ValueError as e:  # includes json.JSONDecodeError
         print(f"Error parsing JSON: {e}")
         print(f"Raw response: {structured_menu_json}")
         structured_menu = []
+    return structured_menu
+
+
+def iter_menu_pipeline(image_path, size: str = None, quality: str = None) -> Iterator:
+    """
+    Streaming form of full_menu_pipeline. Yields, in order:
+    a PageRead per page, OCRCompleted, MenuStructured, then one ImageReady or
+    ItemFailed per menu item as each image finishes (completion order; events
+    carry the menu index). Each page is sent for structuring as soon as it has
+    been read, so GPT works on page 1 while later pages are still in OCR.
+    `size` and `quality` set the image generation options for this menu.
+    """
+    get_generation_settings(size, quality)  # reject bad options before any work
+    lines = []
+    degraded = False
+    page_results = []
+    max_workers = int(env("GPT_MAX_WORKERS", "4"))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for page in iter_menu_pages(image_path):
+            lines.extend(page.lines)
+            degraded = degraded or bool(page.geometry.get("fallback"))
+            yield PageRead(page.page_number, page.lines)
+            if page.lines:
+                page_results.append(
+                    pool.submit(
+                        metrics.bind(structure_lines), page.lines, [page.geometry]
+                    )
+                )
+        yield OCRCompleted(lines, degraded)
+
+        page_menus = [parse_structured_menu(future.result()) for future in page_results]
+    if len(page_menus) == 1:
+        structured_menu = page_menus[0]
+    else:
+        # Items can repeat across pages (e.g. lunch and dinner menus)
+        structured_menu = merge_items(page_menus)
+    yield MenuStructured(structured_menu)
+
+    for result in iter_images(structured_menu, size=size, quality=quality):
+        item = structured_menu[result.index]
+        if result.error is None:
+            yield ImageReady(result.index, item, result.data, result.thumbnail)
+        else:
+            yield ItemFailed(
+                result.index,
+                item,
+                str(result.error),
+                skipped=is_content_policy_violation(result.error),
+            )
 
-    # Generate images for each menu item
-    images = generate_images(structured_menu)
 
-    return {"menu": structured_menu, "images": images}
+def full_menu_pipeline(image_path):
+    """
+    1. Run OCR pipeline to extract and structure menu items.
+    2. Generate images for each menu item.
+    3. Return structured menu, generated images (an ImageSet that spools to
+       disk above IMAGE_RESULTS_MAX_MEMORY_MB) and the run's metrics
+       (see src.app.metrics).
+    """
+    with metrics.collect() as run_metrics, metrics.span("pipeline.total"):
+        structured_menu = parse_structured_menu(run_ocr_pipeline(image_path))
+
+        # Generate images for each menu item
+        with metrics.span("pipeline.images", items=len(structured_menu)):
+            images = generate_images(structured_menu)
+
+    return {
+        "menu": structured_menu,
+        "images": images,
+        "metrics": run_metrics.snapshot(),
+    }
+
+
+def get_stage_timeouts() -> dict:
+    """Per-stage time limits in seconds (PIPELINE_*_TIMEOUT); None means no limit."""
+    timeouts = {}
+    for stage in ("ocr", "gpt", "images"):
+        value = env(f"PIPELINE_{stage.upper()}_TIMEOUT")
+        timeouts[stage] = float(value) if value else None
+    return timeouts
+
+
+async def full_menu_pipeline_async(
+    image_path,
+    ocr_timeout: float = None,
+    gpt_timeout: float = None,
+    images_timeout: float = None,
+):
+    """
+    Async counterpart of full_menu_pipeline built on the SDKs' async clients,
+    so one event loop can drive many menus at once.
+    Each stage is bounded by its timeout (falling back to PIPELINE_*_TIMEOUT) and
+    raises TimeoutError when it expires; cancelling the call cancels every
+    request still in flight. The loop's async clients are closed once the last
+    pipeline running on it returns.
+    """
+    defaults = get_stage_timeouts()
+    async with registry.loop_scope():
+        with metrics.collect() as run_metrics, metrics.span("pipeline.total"):
+            with metrics.span("pipeline.ocr"):
+                analysis = await asyncio.wait_for(
+                    analyze_menu_async(image_path), ocr_timeout or defaults["ocr"]
+                )
+            lines = analysis["lines"]
+            with metrics.span("pipeline.gpt", lines=len(lines)):
+                structured_menu = parse_structured_menu(
+                    await asyncio.wait_for(
+                        structure_lines_async(lines, analysis["pages"]),
+                        gpt_timeout or defaults["gpt"],
+                    )
+                )
+            with metrics.span("pipeline.images", items=len(structured_menu)):
+                images = await asyncio.wait_for(
+                    generate_images_async(structured_menu),
+                    images_timeout or defaults["images"],
+                )
+    return {
+        "menu": structured_menu,
+        "images": images,
+        "metrics": run_metrics.snapshot(),
+    }
 
 
 # if __name__ == "__main__":
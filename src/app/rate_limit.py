@@ -0,0 +1,65 @@
+# src/app/rate_limit.py
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe requests-per-minute limiter.
+    Spaces calls evenly so that at most `requests_per_minute` calls start in any
+    60 second window, which keeps concurrent workers inside a deployment's quota.
+    """
+
+    def __init__(
+        self, requests_per_minute: float, clock=time.monotonic, sleep=time.sleep
+    ):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        self.interval = 60.0 / requests_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def _reserve(self) -> float:
+        """Claim the next request slot and return how long to wait for it."""
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+
+    def acquire(self) -> float:
+        """Block until the next request slot is free. Returns the time waited."""
+        wait = self._reserve()
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Like acquire, but yields to the event loop while waiting."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(deployment: str, requests_per_minute: float) -> RateLimiter:
+    """
+    Process-wide limiter for one deployment, shared by every menu and by the
+    sync and async image paths, so concurrent menus stay inside one quota.
+    The latest `requests_per_minute` asked for becomes the deployment's rate.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(deployment)
+        if limiter is None:
+            limiter = RateLimiter(requests_per_minute)
+            _limiters[deployment] = limiter
+        else:
+            limiter.interval = 60.0 / requests_per_minute
+        return limiter
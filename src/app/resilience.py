@@ -0,0 +1,335 @@
+# src/app/resilience.py
+"""
+Shared retry and circuit-breaking for calls to Document Intelligence, GPT and
+DALL-E.
+
+Throttled (429), timed-out and 5xx responses are retried with full-jitter
+exponential backoff, waiting exactly as long as the service asks when it sends
+Retry-After. A circuit breaker per deployment opens after repeated throttling or
+server errors and then fails calls immediately with CircuitOpenError, so a
+saturated deployment is not hammered by every worker at once.
+"""
+
+import asyncio
+import email.utils
+import functools
+import random
+import threading
+import time
+from collections.abc import Mapping
+
+from src.app import metrics
+from src.app.settings import env
+
+RETRYABLE_STATUS_CODES = {408, 429}
+
+
+@functools.cache
+def transient_errors() -> tuple:
+    """
+    Connection and timeout errors of the SDKs and HTTP libraries. Imported on
+    first use: by the time a call has failed, its SDK is loaded anyway.
+    """
+    import httpx
+    import openai
+    import requests
+    from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+
+    return (
+        openai.APIConnectionError,  # includes APITimeoutError
+        requests.ConnectionError,
+        requests.Timeout,
+        httpx.TransportError,
+        ServiceRequestError,
+        ServiceResponseError,
+        ConnectionError,
+        TimeoutError,
+    )
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a deployment whose circuit breaker is open."""
+
+
+def get_status_code(error: Exception) -> int | None:
+    """HTTP status of an SDK, requests or httpx error, if it carries one."""
+    status = getattr(error, "status_code", None)
+    if not isinstance(status, int):
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def get_retry_after(error: Exception) -> float | None:
+    """Seconds the service asked us to wait (retry-after-ms or Retry-After)."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not isinstance(headers, Mapping):
+        return None
+    for name, scale in (
+        ("retry-after-ms", 1000),
+        ("x-ms-retry-after-ms", 1000),
+        ("retry-after", 1),
+    ):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) / scale)
+        except ValueError:
+            pass
+        try:  # Retry-After may also be an HTTP date
+            return max(
+                0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            )
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for throttling, timeouts, 5xx responses and dropped connections."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = get_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return isinstance(error, transient_errors())
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for one deployment.
+    After `failure_threshold` consecutive retryable failures the circuit opens
+    for `reset_timeout` seconds, or for as long as the service's Retry-After
+    asks when it sent one, and calls fail fast. Then a single trial call is
+    let through: success closes the circuit, another failure opens it again.
+    Only successes reset the failure count; other errors leave it as it is.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and self._clock() >= self._open_until:
+                return "half_open"
+            return self._state
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError if the call should be shed. Returns True when
+        the call is the half-open trial.
+        """
+        with self._lock:
+            if self._state == "open":
+                remaining = self._open_until - self._clock()
+                if remaining > 0:
+                    metrics.incr("resilience.shed", service=self.name)
+                    raise CircuitOpenError(
+                        f"{self.name} is saturated; retry in {remaining:.1f}s"
+                    )
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "half_open":
+                if self._trial_in_flight:
+                    metrics.incr("resilience.shed", service=self.name)
+                    raise CircuitOpenError(f"{self.name} is being probed")
+                self._trial_in_flight = True
+                return True
+        return False
+
+    def release_trial(self):
+        """Let another call be the trial after one ended without an outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, retry_after: float = None):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state != "half_open" and self._failures < self.failure_threshold:
+                return
+            self._state = "open"
+            if retry_after is None:
+                retry_after = self.reset_timeout
+            self._open_until = self._clock() + retry_after
+        print(f"[WARNING] Circuit opened for {self.name}")
+        metrics.incr("resilience.breaker_opened", service=self.name)
+
+
+class RetryPolicy:
+    """
+    Retries retryable failures up to `max_attempts` calls in total.
+    Waits for the service's Retry-After when given (capped at
+    `max_retry_after`), otherwise for a random time between 0 and
+    `base_delay * 2 ** (attempt - 1)`, capped at `max_delay`.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        max_retry_after: float = 60.0,
+        rng: random.Random = None,
+        sleep=time.sleep,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._random = rng or random.Random()
+        self._sleep = sleep
+
+    def delay_for(self, attempt: int, error: Exception) -> float:
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return self._random.uniform(0, ceiling)
+
+    def _on_failure(
+        self,
+        service: str,
+        attempt: int,
+        error: Exception,
+        breaker: CircuitBreaker,
+        trial: bool,
+    ) -> float | None:
+        """Record the failure; return the delay before retrying, or None to raise."""
+        if not is_retryable(error):
+            # The service answered, but only a success closes the circuit
+            if trial:
+                breaker.release_trial()
+            return None
+        if breaker is not None:
+            breaker.record_failure(get_retry_after(error))
+        if attempt >= self.max_attempts:
+            metrics.incr("resilience.gave_up", service=service)
+            return None
+        delay = self.delay_for(attempt, error)
+        reason = get_status_code(error) or type(error).__name__
+        print(
+            f"[WARNING] {service} call failed ({reason}), "
+            f"retrying in {delay:.2f}s (attempt {attempt}/{self.max_attempts})"
+        )
+        metrics.incr("resilience.retries", service=service)
+        return delay
+
+    def call(self, service: str, fn, *args, breaker: CircuitBreaker = None, **kwargs):
+        """Call fn(*args, **kwargs), retrying retryable failures."""
+        # The breaker admits a call once: its retries are not shed by a circuit
+        # that its own failed attempts opened
+        trial = breaker is not None and breaker.before_call()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(service, attempt, e, breaker, trial)
+                trial = False  # the failure settled the trial
+                if delay is None:
+                    raise
+                with metrics.span("resilience.backoff", service=service):
+                    self._sleep(delay)
+            except BaseException:
+                # Cancelled or interrupted: without an outcome, free the trial
+                if trial:
+                    breaker.release_trial()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+    async def call_async(
+        self, service: str, fn, *args, breaker: CircuitBreaker = None, **kwargs
+    ):
+        """Async counterpart of call; `fn` returns an awaitable."""
+        # The breaker admits a call once: its retries are not shed by a circuit
+        # that its own failed attempts opened
+        trial = breaker is not None and breaker.before_call()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(service, attempt, e, breaker, trial)
+                trial = False  # the failure settled the trial
+                if delay is None:
+                    raise
+                with metrics.span("resilience.backoff", service=service):
+                    await asyncio.sleep(delay)
+            except BaseException:
+                # Cancelled or interrupted: without an outcome, free the trial
+                if trial:
+                    breaker.release_trial()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+
+def get_retry_policy() -> RetryPolicy:
+    """RetryPolicy from RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY and RETRY_MAX_DELAY."""
+    return RetryPolicy(
+        max_attempts=int(env("RETRY_MAX_ATTEMPTS", "4")),
+        base_delay=float(env("RETRY_BASE_DELAY", "0.5")),
+        max_delay=float(env("RETRY_MAX_DELAY", "30")),
+    )
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(service: str) -> CircuitBreaker:
+    """
+    Process-wide breaker for one deployment, configured from
+    BREAKER_FAILURE_THRESHOLD (default 5) and BREAKER_RESET_SECONDS (default 30).
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(service)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                service,
+                failure_threshold=int(env("BREAKER_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(env("BREAKER_RESET_SECONDS", "30")),
+            )
+            _breakers[service] = breaker
+        return breaker
+
+
+def call_with_retry(service: str, fn, *args, **kwargs):
+    """Call fn with the configured retry policy and the service's breaker."""
+    return get_retry_policy().call(
+        service, fn, *args, breaker=get_breaker(service), **kwargs
+    )
+
+
+async def call_with_retry_async(service: str, fn, *args, **kwargs):
+    """Async counterpart of call_with_retry."""
+    return await get_retry_policy().call_async(
+        service, fn, *args, breaker=get_breaker(service), **kwargs
+    )
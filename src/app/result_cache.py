@@ -0,0 +1,240 @@
+# src/app/result_cache.py
+"""
+Process-wide cache of finished pipeline runs, keyed by upload content.
+
+Streamlit re-runs main.py on every widget interaction. Replaying the events of
+a cached run instead of running the pipeline again makes those reruns cost
+milliseconds rather than fresh OCR, GPT and DALL-E calls. The cache lives in
+the server process, so every session shares it; behind it, the persistent
+menu store (src.app.menu_store) serves menus processed before a restart.
+"""
+
+import hashlib
+import json
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from src.app import metrics
+from src.app.events import ImageReady, ItemFailed, MenuStructured, OCRCompleted
+from src.app.image_results import ImageSet
+from src.app.menu_store import StoredImage, StoredMenu, get_menu_store
+from src.app.pipeline import iter_menu_pipeline
+from src.app.settings import env
+from src.app.ttl_cache import TTLCache
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> TTLCache | None:
+    """
+    Get the process-wide result cache configured by RESULT_CACHE_MAX_ENTRIES
+    (menus kept, default 16) and RESULT_CACHE_TTL_SECONDS (default 3600).
+    Returns None when the cache is disabled (0 entries).
+    """
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            max_entries = int(env("RESULT_CACHE_MAX_ENTRIES", "16"))
+            if max_entries <= 0:
+                return None
+            ttl_seconds = float(env("RESULT_CACHE_TTL_SECONDS", "3600"))
+            _result_cache = TTLCache(max_entries, ttl_seconds)
+        return _result_cache
+
+
+def result_key(data: bytes, options: dict = None) -> str:
+    """SHA-256 of the upload and the pipeline options it was run with."""
+    digest = hashlib.sha256(data)
+    options = {k: v for k, v in (options or {}).items() if v is not None}
+    if options:
+        digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+@contextmanager
+def temporary_upload(data: bytes, suffix: str = "") -> Iterator[Path]:
+    """Write an upload to a temporary file for the pipeline and delete it after."""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(data)
+        path = Path(tmp.name)
+    try:
+        yield path
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def _reusable(events: list) -> bool:
+    """
+    Runs with failures other than content-policy skips, or read by the
+    fallback OCR backend, are worth retrying.
+    """
+    return not any(
+        (isinstance(event, ItemFailed) and not event.skipped)
+        or (isinstance(event, OCRCompleted) and event.degraded)
+        for event in events
+    )
+
+
+class ImageOnDisk(NamedTuple):
+    """
+    An ImageReady event kept without its image bytes, which are read back from
+    `source` (a menu-store blob or the run's spooled ImageSet) on replay.
+    """
+
+    index: int
+    item: dict
+    source: Path | ImageSet
+    thumbnail: bytes | None = None
+
+    def available(self) -> bool:
+        return not isinstance(self.source, Path) or self.source.exists()
+
+    def load(self) -> ImageReady:
+        if isinstance(self.source, Path):
+            image = self.source.read_bytes()
+        else:
+            image = self.source.image(self.index)
+        return ImageReady(self.index, self.item, image, self.thumbnail)
+
+
+def replay(events) -> Iterator:
+    """Yield recorded events, reading each image only when it is reached."""
+    for event in events:
+        yield event.load() if isinstance(event, ImageOnDisk) else event
+
+
+def events_from_store(stored: StoredMenu) -> tuple:
+    """
+    Pipeline events that replay a stored menu, read with load_images=False:
+    images stay in their blobs (see replay).
+    """
+    events = [OCRCompleted(stored.lines), MenuStructured(stored.menu)]
+    for result in stored.images:
+        item = stored.menu[result.index]
+        if result.image is not None:
+            events.append(
+                ImageOnDisk(result.index, item, result.image, result.thumbnail)
+            )
+        else:
+            events.append(ItemFailed(result.index, item, result.error, skipped=True))
+    return tuple(events)
+
+
+def _store_run(store, key: str, events: list, timings: dict) -> list:
+    """Store a recorded run; returns its events with images in the store."""
+    lines, menu = [], []
+    for event in events:
+        if isinstance(event, OCRCompleted):
+            lines = event.lines
+        elif isinstance(event, MenuStructured):
+            menu = event.menu
+
+    def images():
+        # One image in memory at a time, read back from the run's spool
+        for event in events:
+            if isinstance(event, ImageOnDisk):
+                yield StoredImage(event.index, event.load().image, event.thumbnail)
+            elif isinstance(event, ItemFailed):
+                yield StoredImage(event.index, None, error=event.error)
+
+    paths = {
+        result.index: result.image
+        for result in store.put(key, lines, menu, images(), timings)
+    }
+    return [
+        (
+            event._replace(source=paths[event.index])
+            if isinstance(event, ImageOnDisk)
+            else event
+        )
+        for event in events
+    ]
+
+
+def _available(events: tuple) -> bool:
+    return all(e.available() for e in events if isinstance(e, ImageOnDisk))
+
+
+def _lookup(cache, store, key: str) -> tuple | None:
+    """Cached events for `key` from memory, then from the persistent store."""
+    for name, source in (("result", cache), ("store", store)):
+        if source is None:
+            continue
+        if name == "result":
+            found = cache.get(key)
+            if found is not None and not _available(found):
+                # The store evicted the run's images since it was cached
+                cache.pop(key)
+                found = None
+        else:
+            found = store.get(key, load_images=False)
+        metrics.incr(f"cache.{'hits' if found is not None else 'misses'}", cache=name)
+        if found is None:
+            continue
+        if name == "store":
+            found = events_from_store(found)
+            if cache is not None:
+                cache.set(key, found)
+        return found
+    return None
+
+
+def iter_cached_pipeline(
+    data: bytes, suffix: str = "", runner=None, **options
+) -> Iterator:
+    """
+    Pipeline events for an upload: replayed from the result cache or the menu
+    store when the same bytes were run with the same `options` before,
+    otherwise streamed from `runner` (default iter_menu_pipeline) over a
+    temporary copy of the upload. Runs that finish without transient failures
+    are cached and stored with their stage timings; a run abandoned part-way
+    (e.g. a Streamlit rerun) is not.
+    """
+    cache, store = get_result_cache(), get_menu_store()
+    key = result_key(data, options)
+    events = _lookup(cache, store, key)
+    if events is not None:
+        print("[INFO] Using saved pipeline results for this menu")
+        yield from replay(events)
+        return
+
+    recorded = []
+    # Recorded images go straight to disk, so neither the run nor the cached
+    # events hold image bytes in memory
+    images = ImageSet(max_memory_bytes=0)
+    started = time.perf_counter()
+    timings = {}
+    try:
+        with temporary_upload(data, suffix) as path:
+            for event in (runner or iter_menu_pipeline)(path, **options):
+                if isinstance(event, ImageReady):
+                    images.add(event.index, event.image)
+                    recorded.append(
+                        ImageOnDisk(event.index, event.item, images, event.thumbnail)
+                    )
+                else:
+                    recorded.append(event)
+                # Wall-clock seconds from the start of the run to each stage's end
+                if isinstance(event, OCRCompleted):
+                    timings["ocr"] = time.perf_counter() - started
+                elif isinstance(event, MenuStructured):
+                    timings["structure"] = time.perf_counter() - started
+                yield event
+    except BaseException:
+        images.close()
+        raise
+    timings["total"] = time.perf_counter() - started
+    if not _reusable(recorded):
+        images.close()
+        return
+    if store is not None:
+        # Cached events then point at the store's blobs, not the spool
+        recorded = _store_run(store, key, recorded, timings)
+        images.close()
+    if cache is not None:
+        cache.set(key, tuple(recorded))
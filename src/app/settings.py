@@ -0,0 +1,107 @@
+# src/app/settings.py
+"""
+Service configuration, loaded once per process.
+
+Endpoints, keys and deployment names of the Azure services are read from the
+environment (and .env, loaded on first use) into one Settings object, instead
+of every module loading .env at import and re-reading the environment on each
+client call. Tuning knobs (worker counts, cache sizes, ...) are still read
+where they are used, through env(), so .env applies to them as well. Code that
+changes the environment afterwards, such as tests or the benchmark harness,
+drops the cached object (`_settings = None`).
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Settings:
+    azure_endpoint: str | None = None
+    azure_key: str | None = None
+    openai_endpoint: str | None = None
+    openai_key: str | None = None
+    openai_deployment: str | None = None
+    dalle_endpoint: str | None = None
+    dalle_key: str | None = None
+    dalle_deployment: str | None = None
+    client_pool_size: int = 20
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            azure_endpoint=os.getenv("AZURE_ENDPOINT"),
+            azure_key=os.getenv("AZURE_KEY"),
+            openai_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            openai_key=os.getenv("AZURE_OPENAI_KEY"),
+            openai_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+            dalle_endpoint=os.getenv("DALLE_3_ENDPOINT"),
+            dalle_key=os.getenv("DALLE_3_KEY"),
+            dalle_deployment=os.getenv("DALLE_3_DEPLOYMENT_NAME"),
+            client_pool_size=int(os.getenv("CLIENT_POOL_SIZE", "20")),
+        )
+
+    def document_intelligence(self) -> tuple[str, str]:
+        """Document Intelligence endpoint and key."""
+        if not all((self.azure_endpoint, self.azure_key)):
+            raise ValueError(
+                "AZURE_ENDPOINT and AZURE_KEY environment variables must be set"
+            )
+        return self.azure_endpoint, self.azure_key
+
+    def gpt(self) -> tuple[str, str, str]:
+        """Azure OpenAI key, endpoint and chat deployment."""
+        if not all((self.openai_key, self.openai_endpoint, self.openai_deployment)):
+            raise ValueError(
+                "AZURE_OPENAI_KEY, AZURE_OPENAI_ENDPOINT, and"
+                " AZURE_OPENAI_DEPLOYMENT_NAME environment variables must be set"
+            )
+        return self.openai_key, self.openai_endpoint, self.openai_deployment
+
+    def dalle(self) -> tuple[str, str, str]:
+        """DALL-E key, endpoint and deployment."""
+        if not all((self.dalle_key, self.dalle_endpoint, self.dalle_deployment)):
+            raise ValueError(
+                "DALLE_3_KEY, DALLE_3_ENDPOINT, and DALLE_3_DEPLOYMENT_NAME"
+                " environment variables must be set"
+            )
+        return self.dalle_key, self.dalle_endpoint, self.dalle_deployment
+
+
+_settings = None
+_settings_lock = threading.Lock()
+_dotenv_loaded = False
+_dotenv_lock = threading.Lock()
+
+
+def _load_dotenv():
+    """Load .env into the environment, once per process."""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    with _dotenv_lock:
+        if not _dotenv_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _dotenv_loaded = True
+
+
+def env(name: str, default: str = None) -> str | None:
+    """os.getenv, after .env has been loaded into the environment."""
+    _load_dotenv()
+    return os.getenv(name, default)
+
+
+def get_settings() -> Settings:
+    """Get the process-wide settings, reading .env and the environment once."""
+    global _settings
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _load_dotenv()
+                _settings = Settings.from_env()
+            settings = _settings
+    return settings
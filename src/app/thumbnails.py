@@ -0,0 +1,76 @@
+# src/app/thumbnails.py
+"""
+Display-sized derivatives of generated dish images.
+
+DALL-E returns 1024px (or larger) PNGs of 1-3 MB each, while the menu grid
+shows them a few hundred pixels wide. make_thumbnail produces a small WebP
+(or JPEG) copy for display; the original is kept for viewing on demand.
+"""
+
+import io
+
+from PIL import Image, UnidentifiedImageError, features
+
+from src.app import metrics
+from src.app.settings import env
+
+THUMBNAIL_FORMATS = ("webp", "jpeg")
+
+
+def make_thumbnail(
+    data: bytes, max_dimension: int = 384, format: str = "webp", quality: int = 80
+) -> bytes | None:
+    """
+    `data` scaled to fit `max_dimension` and re-encoded as WebP or JPEG, or
+    None when it is not an image Pillow can read. JPEG is used instead of
+    WebP when Pillow was built without WebP support.
+    """
+    if format not in THUMBNAIL_FORMATS:
+        raise ValueError(f"Unknown thumbnail format {format!r}")
+    if format == "webp" and not features.check("webp"):
+        format = "jpeg"
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.draft("RGB", (max_dimension, max_dimension))
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+    if image.mode not in ("RGB", "L") and not (
+        format == "webp" and image.mode == "RGBA"
+    ):
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    if format == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def get_thumbnail_settings() -> dict | None:
+    """
+    Thumbnail settings from IMAGE_THUMBNAIL_SIZE (longest side in pixels,
+    default 384; 0 disables thumbnails), IMAGE_THUMBNAIL_FORMAT (webp or jpeg)
+    and IMAGE_THUMBNAIL_QUALITY (default 80). None when disabled.
+    """
+    max_dimension = int(env("IMAGE_THUMBNAIL_SIZE", "384"))
+    if max_dimension <= 0:
+        return None
+    format = env("IMAGE_THUMBNAIL_FORMAT", "webp").lower()
+    if format not in THUMBNAIL_FORMATS:
+        raise ValueError("IMAGE_THUMBNAIL_FORMAT must be webp or jpeg")
+    quality = int(env("IMAGE_THUMBNAIL_QUALITY", "80"))
+    if not 1 <= quality <= 100:
+        raise ValueError("IMAGE_THUMBNAIL_QUALITY must be between 1 and 100")
+    return {"max_dimension": max_dimension, "format": format, "quality": quality}
+
+
+def thumbnail_for_display(data: bytes, settings: dict) -> bytes | None:
+    """make_thumbnail with `settings`, timed and counted in the run's metrics."""
+    with metrics.span("image.thumbnail", original_bytes=len(data)) as span:
+        thumbnail = make_thumbnail(data, **settings)
+        span["bytes"] = len(thumbnail) if thumbnail is not None else 0
+    if thumbnail is not None:
+        metrics.incr("image.thumbnail_bytes_saved", len(data) - len(thumbnail))
+    return thumbnail
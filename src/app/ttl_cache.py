@@ -0,0 +1,51 @@
+# src/app/ttl_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache bounded by entry count and entry age.
+    The least recently used entry is dropped once `max_entries` is exceeded and
+    entries older than `ttl_seconds` are treated as missing.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            stored_at, value = entry
+            if self._clock() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (self._clock(), value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,133 @@
+# src/app/variants.py
+"""
+Grouping of menu variants that should share one dish photo.
+
+Menus list the same dish more than once: in sizes ("Pizza Margherita (small)"
+/ "(large)"), portions ("Wings 6pc" / "Wings 12pc") or repeated lunch and
+dinner sections. Names are normalised by dropping those qualifiers, and items
+whose names match and whose descriptions do not disagree are clustered, so
+image generation makes one call per cluster instead of one per item.
+Near-miss names ("Chicken Wings" / "Chicken Rings") are usually different
+dishes, so fuzzy matching is opt-in and also needs matching descriptions.
+"""
+
+import re
+from difflib import SequenceMatcher
+from typing import NamedTuple
+
+from src.app.settings import env
+
+# "(small)", "[vegan]", "{2 pers}"
+_BRACKETED = re.compile(r"\([^)]*\)|\[[^\]]*\]|\{[^}]*\}")
+# "6pc", "12 pcs", "x6", "10 pieces", '12"', "12 inch", "330ml", "0.5l", "500g"
+_QUANTITY = re.compile(
+    r"\b(?:x\s?\d+|\d+(?:[.,]\d+)?\s?(?:pcs?|pieces?|pc\.|ct|inch(?:es)?|in\b|cm|"
+    r"ml|cl|l|g|kg|oz|lbs?)|\d+(?:[.,]\d+)?\s?\")(?=\W|$)"
+)
+SIZE_WORDS = {
+    "small", "medium", "large", "regular", "sm", "md", "lg", "xl", "xxl",
+    "mini", "half", "full", "family", "personal", "kids", "jumbo", "petite",
+    "grande", "portion", "size",
+}  # fmt: skip
+_WORD = re.compile(r"[^\W_]+")
+
+
+class VariantGroup(NamedTuple):
+    """Indices of menu items that share one image; `representative` is generated."""
+
+    representative: int
+    members: list[int]
+
+
+def normalize_name(name: str) -> str:
+    """
+    Dish name without size, portion or quantity qualifiers, casefolded,
+    e.g. "Wings (12 pcs)" -> "wings".
+    """
+    text = _QUANTITY.sub(" ", _BRACKETED.sub(" ", str(name).casefold()))
+    words = [word for word in _WORD.findall(text) if word not in SIZE_WORDS]
+    # A name made only of qualifiers ("Large") keeps them rather than vanishing
+    return " ".join(words or _WORD.findall(str(name).casefold()))
+
+
+def normalize_description(description: str) -> str:
+    return " ".join(_WORD.findall(str(description or "").casefold()))
+
+
+def get_variant_similarity() -> float:
+    """
+    How alike (0-1) two normalised names must be to share an image
+    (IMAGE_VARIANT_SIMILARITY, default 1: exact matches only).
+    """
+    similarity = float(env("IMAGE_VARIANT_SIMILARITY", "1"))
+    if not 0 < similarity <= 1:
+        raise ValueError("IMAGE_VARIANT_SIMILARITY must be in (0, 1]")
+    return similarity
+
+
+def variant_grouping_enabled() -> bool:
+    """Whether variants share one image (IMAGE_VARIANT_GROUPING, default 1)."""
+    return env("IMAGE_VARIANT_GROUPING", "1") == "1"
+
+
+def _similar(a: str, b: str, threshold: float) -> bool:
+    if a == b:
+        return True
+    if not a or not b or threshold >= 1:
+        return False
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    # The cheap upper bounds rule out most pairs before the full comparison
+    return (
+        matcher.real_quick_ratio() >= threshold
+        and matcher.quick_ratio() >= threshold
+        and matcher.ratio() >= threshold
+    )
+
+
+def _compatible(a: str, b: str, threshold: float) -> bool:
+    """Descriptions agree when either is missing or they (nearly) match."""
+    return not a or not b or _similar(a, b, threshold)
+
+
+def group_variants(menu_items: list[dict], similarity: float = None) -> list:
+    """
+    Cluster menu items that are variants of one dish. Returns VariantGroups in
+    order of first appearance; every item index is in exactly one group. The
+    representative is the first member with a description, else the first.
+    With `similarity` below 1, an item whose name only nearly matches joins a
+    cluster when both have descriptions and those match as well.
+    """
+    similarity = similarity or get_variant_similarity()
+    clusters = []  # [name, description, members]
+    by_name = {}  # normalised name -> clusters with that name
+    for index, item in enumerate(menu_items):
+        name = normalize_name(item.get("name", ""))
+        description = normalize_description(item.get("description"))
+        candidates = by_name.get(name, [])
+        match = next(
+            (c for c in candidates if _compatible(description, c[1], similarity)),
+            None,
+        )
+        if match is None and similarity < 1 and not candidates and description:
+            match = next(
+                (
+                    c
+                    for c in clusters
+                    if c[1]
+                    and _similar(name, c[0], similarity)
+                    and _similar(description, c[1], similarity)
+                ),
+                None,
+            )
+        if match is None:
+            clusters.append([name, description, [index]])
+            by_name.setdefault(name, []).append(clusters[-1])
+        else:
+            match[1] = match[1] or description
+            match[2].append(index)
+
+    groups = []
+    for _name, _description, members in clusters:
+        described = [i for i in members if menu_items[i].get("description")]
+        groups.append(VariantGroup((described or members)[0], members))
+    return groups
@@ -92,6 +92,12 @@ def temp_image_file():
         os.unlink(temp_path)
 
 
+@pytest.fixture
+def gpt_structuring(monkeypatch):
+    """Send every menu to GPT, even ones the local parser could structure."""
+    monkeypatch.setenv("LOCAL_PARSER_MIN_CONFIDENCE", "2")
+
+
 @pytest.fixture(autouse=True)
 def mock_env_vars(monkeypatch):
     """Mock environment variables for testing."""
@@ -104,3 +110,25 @@ def mock_env_vars(monkeypatch):
         "AZURE_OPENAI_ENDPOINT", "https://fake-openai-endpoint.openai.azure.com/"
     )
     monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT_NAME", "fake-deployment")
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """
+    Point on-disk caches at a per-test directory and drop process-wide instances,
+    including circuit breakers left open, rate limiters, OCR schedulers or
+    engines and cached pipeline results from earlier tests.
+    """
+    monkeypatch.setenv("IMAGE_CACHE_DIR", str(tmp_path / "image_cache"))
+    monkeypatch.setattr("src.app.image_cache._image_cache", None)
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path / "ocr_cache"))
+    monkeypatch.setattr("src.app.ocr.ocr_cache._ocr_cache", None)
+    monkeypatch.setattr("src.app.resilience._breakers", {})
+    monkeypatch.setattr("src.app.rate_limit._limiters", {})
+    monkeypatch.setattr("src.app.ocr.scheduler._scheduler", None)
+    monkeypatch.setattr("src.app.ocr.backends._easyocr_backend", None)
+    monkeypatch.setattr("src.app.result_cache._result_cache", None)
+    monkeypatch.setenv("MENU_STORE_DIR", str(tmp_path / "menu_store"))
+    monkeypatch.setattr("src.app.menu_store._menu_store", None)
+    monkeypatch.setattr("src.app.settings._settings", None)
+    monkeypatch.delenv("OCR_SCHEDULER", raising=False)
@@ -0,0 +1,205 @@
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.app import api
+from src.app.events import ImageReady, ItemFailed, MenuStructured, OCRCompleted
+from src.app.jobs import JobQueue, QueueFullError
+from src.app.ttl_cache import TTLCache
+
+MENU = [{"name": "Soup", "description": "Tomato", "price": "$5"}]
+
+
+def fake_pipeline(image_path, **options):
+    yield OCRCompleted(["Soup", "$5"])
+    yield MenuStructured(MENU)
+    yield ImageReady(0, MENU[0], b"soup-image", b"thumb")
+
+
+class TestJobQueue:
+    """Test cases for the background JobQueue."""
+
+    def test_job_runs_and_records_events(self):
+        queue = JobQueue(max_workers=1, runner=fake_pipeline)
+
+        job, coalesced = queue.submit(b"menu-bytes", ".jpg")
+        events = list(job.iter_events(timeout=5))
+
+        assert coalesced is False
+        assert [e["type"] for e in events] == [
+            "ocr_completed",
+            "menu_structured",
+            "image_ready",
+        ]
+        assert job.status == "done"
+        assert job.result()["images"] == ["c291cC1pbWFnZQ=="]
+        assert job.result()["thumbnails"] == ["dGh1bWI="]
+        queue.shutdown()
+
+    def test_retained_jobs_keep_images_on_disk(self):
+        queue = JobQueue(max_workers=1, runner=fake_pipeline)
+
+        job, _ = queue.submit(b"menu-bytes", ".jpg")
+        streamed = list(job.iter_events(timeout=5))
+
+        assert job.events[-1]["image"] is None
+        assert job.images.memory_bytes == 0
+        assert streamed[-1]["image"] == "c291cC1pbWFnZQ=="
+        queue.shutdown()
+
+    def test_options_reach_the_pipeline_and_the_job_key(self):
+        seen = []
+
+        def pipeline(image_path, **options):
+            seen.append(options)
+            return iter([])
+
+        queue = JobQueue(max_workers=1, runner=pipeline)
+
+        hd, _ = queue.submit(b"menu-bytes", ".jpg", {"quality": "hd", "size": None})
+        list(hd.iter_events(timeout=5))
+        standard, coalesced = queue.submit(b"menu-bytes", ".jpg")
+        list(standard.iter_events(timeout=5))
+
+        assert coalesced is False and standard is not hd
+        assert seen == [{"quality": "hd"}, {}]
+        queue.shutdown()
+
+    def test_identical_uploads_are_coalesced(self):
+        release = threading.Event()
+        runs = []
+
+        def slow_pipeline(image_path):
+            runs.append(image_path)
+            release.wait(5)
+            yield from fake_pipeline(image_path)
+
+        queue = JobQueue(max_workers=2, runner=slow_pipeline)
+
+        first, _ = queue.submit(b"menu-bytes", ".jpg")
+        second, coalesced = queue.submit(b"menu-bytes", ".jpg")
+        other, other_coalesced = queue.submit(b"other-menu", ".jpg")
+        release.set()
+        list(first.iter_events(timeout=5))
+        list(other.iter_events(timeout=5))
+
+        assert second is first and coalesced is True
+        assert other is not first and other_coalesced is False
+        assert len(runs) == 2
+        # Finished jobs keep serving repeat uploads until they expire
+        assert queue.submit(b"menu-bytes", ".jpg") == (first, True)
+        queue.shutdown()
+
+    def test_queue_rejects_when_full(self):
+        release = threading.Event()
+
+        def blocked_pipeline(image_path):
+            release.wait(5)
+            return iter([])
+
+        queue = JobQueue(max_workers=1, max_pending=1, runner=blocked_pipeline)
+        queue.submit(b"first", ".jpg")
+
+        with pytest.raises(QueueFullError):
+            queue.submit(b"second", ".jpg")
+        release.set()
+        queue.shutdown()
+
+    def test_running_jobs_are_never_evicted(self):
+        release = threading.Event()
+
+        def slow_pipeline(image_path):
+            release.wait(5)
+            yield from fake_pipeline(image_path)
+
+        queue = JobQueue(max_workers=3, runner=slow_pipeline)
+        queue._jobs = TTLCache(max_entries=1, ttl_seconds=60)
+
+        jobs = [queue.submit(b"menu-%d" % i, ".jpg")[0] for i in range(3)]
+
+        assert [queue.get(job.id) for job in jobs] == jobs
+        release.set()
+        queue.shutdown()
+        # Once finished they compete for the retention cache
+        assert sum(queue.get(job.id) is not None for job in jobs) == 1
+
+    def test_failed_job_reports_error(self):
+        def broken_pipeline(image_path):
+            yield OCRCompleted([])
+            raise RuntimeError("OCR Error")
+
+        queue = JobQueue(max_workers=1, runner=broken_pipeline)
+
+        job, _ = queue.submit(b"menu-bytes", ".jpg")
+        list(job.iter_events(timeout=5))
+
+        assert job.status == "failed"
+        assert job.summary()["error"] == "OCR Error"
+        queue.shutdown()
+
+
+class TestMenuAPI:
+    """Test cases for the FastAPI endpoints."""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        def pipeline(image_path):
+            yield from fake_pipeline(image_path)
+            yield ItemFailed(1, {"name": "Wine"}, "content_policy_violation", True)
+
+        queue = JobQueue(max_workers=1, runner=pipeline)
+        monkeypatch.setattr(api, "jobs", queue)
+        yield TestClient(api.app)
+        queue.shutdown()
+
+    def test_upload_stream_and_result(self, client):
+        response = client.post(
+            "/menus", files={"file": ("menu.jpg", b"menu-bytes", "image/jpeg")}
+        )
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        events = client.get(f"/jobs/{job_id}/events")
+        types = [json.loads(line)["type"] for line in events.text.splitlines()]
+        assert types == [
+            "ocr_completed",
+            "menu_structured",
+            "image_ready",
+            "item_failed",
+        ]
+
+        status = client.get(f"/jobs/{job_id}").json()
+        assert status["status"] == "done"
+        assert status["menu"] == MENU
+        assert status["items_failed"] == 1
+
+        result = client.get(f"/jobs/{job_id}/result").json()
+        assert result["menu"] == MENU
+
+    def test_duplicate_upload_returns_same_job(self, client):
+        files = {"file": ("menu.jpg", b"menu-bytes", "image/jpeg")}
+
+        first = client.post("/menus", files=files).json()
+        second = client.post("/menus", files=files).json()
+
+        assert second["job_id"] == first["job_id"]
+        assert second["coalesced"] is True
+
+    def test_rejects_unsupported_files(self, client):
+        response = client.post(
+            "/menus", files={"file": ("menu.txt", b"text", "text/plain")}
+        )
+        assert response.status_code == 415
+
+    def test_rejects_unknown_image_options(self, client):
+        response = client.post(
+            "/menus",
+            params={"size": "512x512"},
+            files={"file": ("menu.jpg", b"menu-bytes", "image/jpeg")},
+        )
+        assert response.status_code == 422
+
+    def test_unknown_job(self, client):
+        assert client.get("/jobs/missing").status_code == 404
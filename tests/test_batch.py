@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from src.app.batch import MenuProgress, find_inputs, main, prefetch_ocr, run_batch
+from src.app.image_results import ImageSet
+
+
+def _write_menus(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / name).write_bytes(name.encode())
+
+
+def fake_pipeline(path):
+    if "broken" in str(path):
+        raise RuntimeError("OCR Error")
+    images = ImageSet(max_memory_bytes=1)  # the second image is spooled
+    images.add(2, b"c")  # "Wine" (index 1) was skipped
+    images.add(0, b"a")
+    return {
+        "menu": [{"name": "Soup"}, {"name": "Wine"}, {"name": "Steak"}],
+        "images": images,
+        "metrics": {"counters": {"image.generated": 2}, "totals": {}, "spans": []},
+    }
+
+
+class TestBatch:
+    """Test cases for the bulk-processing CLI."""
+
+    def test_find_inputs_from_directory_and_manifest(self, tmp_path):
+        _write_menus(tmp_path / "menus", ["a.jpg", "b.pdf", "notes.txt"])
+        listing = tmp_path / "list.txt"
+        listing.write_text('menus/a.jpg\n{"path": "menus/b.pdf"}\n# comment\n')
+
+        assert [p.name for p in find_inputs(tmp_path / "menus")] == ["a.jpg", "b.pdf"]
+        assert find_inputs(listing) == [
+            tmp_path / "menus" / "a.jpg",
+            tmp_path / "menus" / "b.pdf",
+        ]
+
+    @patch("src.app.batch.full_menu_pipeline", side_effect=fake_pipeline)
+    def test_run_batch_writes_manifest_and_outputs(self, mock_pipeline, tmp_path):
+        _write_menus(tmp_path / "menus", ["a.jpg", "broken.jpg"])
+        manifest = tmp_path / "results.jsonl"
+
+        summary = run_batch(tmp_path / "menus", manifest, tmp_path / "out", workers=2)
+
+        records = [json.loads(line) for line in manifest.read_text().splitlines()]
+        assert sorted(r["status"] for r in records) == ["error", "ok"]
+        ok = next(r for r in records if r["status"] == "ok")
+        assert ok["images"] == 2
+        assert ok["metrics"] == {"counters": {"image.generated": 2}, "totals": {}}
+        assert (tmp_path / "out" / ok["sha256"] / "menu.json").exists()
+        saved = {i: Path(path).read_bytes() for i, path in ok["image_paths"].items()}
+        assert saved == {"0": b"a", "2": b"c"}
+        assert Path(ok["image_paths"]["2"]).name == "image_002.png"
+        assert summary["processed"] == 1
+        assert summary["failures"] == 1
+        assert summary["images"] == 2
+
+    @patch("src.app.batch.full_menu_pipeline", side_effect=fake_pipeline)
+    def test_resume_skips_completed_inputs(self, mock_pipeline, tmp_path):
+        _write_menus(tmp_path / "menus", ["a.jpg", "broken.jpg"])
+        manifest = tmp_path / "results.jsonl"
+        run_batch(tmp_path / "menus", manifest, tmp_path / "out", workers=1)
+        mock_pipeline.reset_mock()
+
+        summary = run_batch(tmp_path / "menus", manifest, tmp_path / "out", workers=1)
+
+        # Only the failed input is retried
+        assert summary["skipped"] == 1
+        mock_pipeline.assert_called_once_with(str(tmp_path / "menus" / "broken.jpg"))
+
+    @patch("src.app.batch.prefetch_ocr")
+    @patch("src.app.batch.enable_scheduled_ocr")
+    @patch("src.app.batch.full_menu_pipeline", side_effect=fake_pipeline)
+    def test_prefetch_submits_pending_menus(
+        self, mock_pipeline, mock_enable, mock_prefetch, tmp_path
+    ):
+        _write_menus(tmp_path / "menus", ["a.jpg", "broken.jpg"])
+
+        run_batch(
+            tmp_path / "menus",
+            tmp_path / "results.jsonl",
+            tmp_path / "out",
+            workers=2,
+            prefetch=True,
+        )
+
+        mock_enable.assert_called_once()
+        paths, progress, ahead = mock_prefetch.call_args.args
+        assert paths == [
+            str(tmp_path / "menus" / "a.jpg"),
+            str(tmp_path / "menus" / "broken.jpg"),
+        ]
+        assert progress.started(paths[0]) and progress.started(paths[1])
+        assert ahead == 8
+
+    @patch("src.app.batch.prefetch_menu_pages")
+    def test_prefetch_stays_ahead_of_started_menus(self, mock_prefetch):
+        progress = MenuProgress()
+        prefetcher = threading.Thread(
+            target=prefetch_ocr, args=(["a", "b", "c"], progress, 1)
+        )
+        prefetcher.start()
+
+        progress.start("b")  # reached by a worker first, so never prefetched
+        time.sleep(0.05)
+        assert [call.args[0] for call in mock_prefetch.call_args_list] == ["a"]
+        progress.start("a")
+        prefetcher.join(timeout=5)
+
+        assert [call.args[0] for call in mock_prefetch.call_args_list] == ["a", "c"]
+
+    @patch("src.app.batch.full_menu_pipeline", side_effect=fake_pipeline)
+    def test_main_prints_summary(self, mock_pipeline, tmp_path, capsys):
+        _write_menus(tmp_path / "menus", ["a.jpg"])
+
+        exit_code = main(
+            [
+                str(tmp_path / "menus"),
+                "--manifest",
+                str(tmp_path / "results.jsonl"),
+                "--output-dir",
+                str(tmp_path / "out"),
+                "--no-prefetch-ocr",
+            ]
+        )
+
+        assert exit_code == 0
+        assert "menus/min" in capsys.readouterr().out
@@ -0,0 +1,62 @@
+from benchmarks.bench import STAGES, percentile, run_benchmark
+from benchmarks.fake_services import FakeServiceConfig
+from benchmarks.import_time import measure_import
+
+BENCH_ENV = [
+    "AZURE_ENDPOINT",
+    "AZURE_KEY",
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_OPENAI_KEY",
+    "AZURE_OPENAI_DEPLOYMENT_NAME",
+    "DALLE_3_ENDPOINT",
+    "DALLE_3_KEY",
+    "DALLE_3_DEPLOYMENT_NAME",
+    "IMAGE_CACHE_MAX_MB",
+    "OCR_CACHE_TTL_SECONDS",
+    "OCR_SCHEDULER_STATE",
+    "OCR_PREPROCESS",
+    "GPT_LAYOUT_BLOCKS",
+    "LOCAL_PARSER_MIN_CONFIDENCE",
+]
+
+
+class TestBenchmark:
+    """Test cases for the offline benchmark harness."""
+
+    def test_percentile(self):
+        values = [float(v) for v in range(1, 101)]
+
+        assert percentile(values, 50) == 50.0
+        assert percentile(values, 99) == 99.0
+        assert percentile([], 50) == 0.0
+
+    def test_sweep_against_fake_services(self, monkeypatch):
+        # The harness rewrites the environment; restore it after the test
+        for name in BENCH_ENV:
+            monkeypatch.setenv(name, "")
+        config = FakeServiceConfig(latency=0, poll_latency=0, polls_until_done=1)
+
+        results = run_benchmark([1, 2], menus=2, config=config)
+
+        assert [level["concurrency"] for level in results["levels"]] == [1, 2]
+        for level in results["levels"]:
+            assert level["failures"] == 0
+            assert set(level["stages"]) == set(STAGES)
+            assert level["stages"]["total"]["p50"] > 0
+        # 2 menus x 2 levels, with 4 images per menu and one extra poll per job
+        assert results["requests"] == {
+            "analyze": 4,
+            "poll": 8,
+            "chat": 4,
+            "images": 16,
+        }
+
+
+class TestImportTime:
+    """Test cases for the cold-start import benchmark."""
+
+    def test_pipeline_import_leaves_sdks_unloaded(self):
+        result = measure_import("src.app.pipeline", runs=1)
+
+        assert result["loaded"] == []
+        assert result["median"] > 0
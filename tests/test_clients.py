@@ -0,0 +1,174 @@
+import asyncio
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.app.clients import (
+    ClientRegistry,
+    get_async_document_intelligence_client,
+    get_async_http_client,
+    get_azure_openai_client,
+    get_document_intelligence_client,
+    get_http_session,
+    registry,
+)
+from src.app.image_gen import get_generation_settings
+from src.app.image_cache import get_image_cache
+from src.app.settings import get_settings
+
+
+class TestClientRegistry:
+    """Test cases for the process-wide client registry."""
+
+    def test_get_or_create_builds_once_per_key(self):
+        reg = ClientRegistry()
+        factory = Mock(side_effect=lambda: object())
+
+        first = reg.get_or_create("a", factory)
+        second = reg.get_or_create("a", factory)
+        other = reg.get_or_create("b", factory)
+
+        assert first is second
+        assert other is not first
+        assert factory.call_count == 2
+
+    def test_get_or_create_is_thread_safe(self):
+        reg = ClientRegistry()
+        barrier = threading.Barrier(8)
+        created = []
+
+        def factory():
+            created.append(object())
+            return created[-1]
+
+        def worker():
+            barrier.wait()
+            reg.get_or_create("shared", factory)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(created) == 1
+
+    def test_close_all_closes_and_forgets_clients(self):
+        reg = ClientRegistry()
+        client = Mock()
+        reg.get_or_create("a", lambda: client)
+
+        reg.close_all()
+
+        client.close.assert_called_once()
+        assert reg.get_or_create("a", lambda: "new") == "new"
+
+    def test_service_clients_are_shared(self, monkeypatch):
+        monkeypatch.setenv("CLIENT_POOL_SIZE", "5")
+        try:
+            openai_client = get_azure_openai_client(
+                "key", "https://fake.openai.azure.com/", "2024-03-01-preview"
+            )
+            assert openai_client is get_azure_openai_client(
+                "key", "https://fake.openai.azure.com/", "2024-03-01-preview"
+            )
+            di_client = get_document_intelligence_client(
+                "https://fake.cognitiveservices.azure.com/", "key"
+            )
+            assert di_client is get_document_intelligence_client(
+                "https://fake.cognitiveservices.azure.com/", "key"
+            )
+            session = get_http_session()
+            assert session is get_http_session()
+            assert session.get_adapter("https://example.com")._pool_maxsize == 5
+        finally:
+            registry.close_all()
+
+    def test_loop_scope_closes_async_clients(self):
+        async def run_pipelines():
+            async with registry.loop_scope():
+                client = get_async_http_client()
+                async with registry.loop_scope():  # a second pipeline on the loop
+                    assert get_async_http_client() is client
+                assert not client.is_closed
+            return client
+
+        clients = [asyncio.run(run_pipelines()) for _ in range(3)]
+
+        assert all(client.is_closed for client in clients)
+        assert not [key for key in registry._clients if key[0] == "async"]
+
+    def test_new_loop_never_gets_a_finished_loops_client(self):
+        async def first():
+            client = get_async_http_client()
+            # Pretend this loop id belongs to a loop that has already finished
+            registry._loops[registry.loop_key()[1]] = lambda: None
+            return client
+
+        async def second():
+            return get_async_http_client()
+
+        async def both():
+            stale = await first()
+            return stale, await second()
+
+        stale, fresh = asyncio.run(both())
+
+        assert fresh is not stale
+
+    def test_async_document_intelligence_client_uses_the_loop_http_client(self):
+        """The aio client runs on the pooled httpx client, without aiohttp."""
+        from benchmarks.fake_services import FakeAzureServer
+        from src.app.ocr.ocr import _run_analysis_async
+
+        async def analyze(url):
+            async with registry.loop_scope():
+                client = get_async_document_intelligence_client(url, "key")
+                assert client is get_async_document_intelligence_client(url, "key")
+                result = await _run_analysis_async(client, b"menu image")
+                return result, get_async_http_client()
+
+        with FakeAzureServer() as server:
+            result, http_client = asyncio.run(analyze(server.url))
+
+        assert result.pages[0].lines
+        assert server.requests == {"analyze": 1, "poll": 3}
+        assert http_client.is_closed
+
+
+class TestSettings:
+    """Test cases for the process-wide service settings."""
+
+    def test_loaded_once(self, monkeypatch):
+        monkeypatch.setenv("AZURE_ENDPOINT", "https://first.example.com/")
+        settings = get_settings()
+        monkeypatch.setenv("AZURE_ENDPOINT", "https://second.example.com/")
+
+        assert get_settings() is settings
+        assert get_settings().document_intelligence() == (
+            "https://first.example.com/",
+            "fake-key",
+        )
+
+    def test_missing_credentials(self, monkeypatch):
+        monkeypatch.delenv("DALLE_3_KEY", raising=False)
+
+        with pytest.raises(ValueError, match="DALLE_3_KEY"):
+            get_settings().dalle()
+
+    def test_dotenv_applies_to_knobs_read_before_settings(self, monkeypatch):
+        monkeypatch.setattr("src.app.settings._dotenv_loaded", False)
+        monkeypatch.delenv("DALLE_3_SIZE", raising=False)
+        monkeypatch.delenv("IMAGE_CACHE_MAX_MB", raising=False)
+
+        def load_dotenv():
+            monkeypatch.setenv("DALLE_3_SIZE", "1792x1024")
+            monkeypatch.setenv("IMAGE_CACHE_MAX_MB", "0")
+
+        with patch("dotenv.load_dotenv", side_effect=load_dotenv) as mock_load:
+            assert get_generation_settings()[0] == "1792x1024"
+            assert get_image_cache() is None
+            get_settings()
+
+        mock_load.assert_called_once()
@@ -0,0 +1,646 @@
+import asyncio
+import base64
+import io
+import time
+import pytest
+import openai
+from unittest.mock import AsyncMock, Mock, patch
+from src.app import metrics
+from src.app.image_gen import (
+    build_prompt,
+    generate_image,
+    generate_image_async,
+    generate_images,
+    generate_images_async,
+    get_generation_settings,
+    iter_images,
+    iter_images_async,
+)
+from src.app.image_cache import ImageCache, get_image_cache
+from src.app.image_results import ImageSet
+from src.app.rate_limit import RateLimiter
+from src.app.thumbnails import get_thumbnail_settings, make_thumbnail
+from src.app.variants import group_variants, normalize_name
+
+
+def _content_policy_error():
+    response = Mock(status_code=400, headers={})
+    return openai.BadRequestError(
+        "content_policy_violation", response=response, body=None
+    )
+
+
+class TestGenerateImages:
+    """Test cases for the generate_images function."""
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_generate_images_preserves_menu_order(
+        self, mock_get_client, mock_generate, sample_structured_menu
+    ):
+        """Images come back in menu order even when later items finish first."""
+        mock_get_client.return_value = (Mock(), "dalle")
+        delays = {"Burger Deluxe": 0.05, "Chicken Salad": 0.02, "Steak House": 0.0}
+
+        def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            time.sleep(delays[name])
+            return name.encode()
+
+        mock_generate.side_effect = fake_generate
+
+        result = generate_images(sample_structured_menu, max_workers=3)
+
+        assert result == [b"Burger Deluxe", b"Chicken Salad", b"Steak House"]
+        assert mock_generate.call_count == 3
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_generate_images_skips_content_policy(
+        self, mock_get_client, mock_generate, sample_structured_menu, capsys
+    ):
+        """Content-policy rejections are skipped and reported per item."""
+        mock_get_client.return_value = (Mock(), "dalle")
+
+        def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            if name == "Chicken Salad":
+                raise _content_policy_error()
+            return name.encode()
+
+        mock_generate.side_effect = fake_generate
+
+        result = generate_images(sample_structured_menu, max_workers=2)
+
+        assert result == [b"Burger Deluxe", b"Steak House"]
+        assert "Skipping Chicken Salad due to content policy" in capsys.readouterr().out
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_generate_images_duplicate_names(self, mock_get_client, mock_generate):
+        """Items sharing a name each get their own image."""
+        mock_get_client.return_value = (Mock(), "dalle")
+
+        def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            return prompt.encode()
+
+        mock_generate.side_effect = fake_generate
+        menu = [
+            {"name": "Soup", "description": "Tomato"},
+            {"name": "Soup", "description": "Onion"},
+        ]
+
+        result = generate_images(menu, max_workers=2)
+
+        assert result == [
+            build_prompt("Soup", "Tomato").encode(),
+            build_prompt("Soup", "Onion").encode(),
+        ]
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_generate_images_reraises_other_errors(
+        self, mock_get_client, mock_generate, sample_structured_menu
+    ):
+        """Errors other than content-policy rejections still propagate."""
+        mock_get_client.return_value = (Mock(), "dalle")
+        mock_generate.side_effect = RuntimeError("DALL-E down")
+
+        with pytest.raises(RuntimeError, match="DALL-E down"):
+            generate_images(sample_structured_menu, max_workers=2)
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_iter_images_yields_failures_per_item(
+        self, mock_get_client, mock_generate, sample_structured_menu
+    ):
+        """iter_images reports failures as results instead of raising."""
+        mock_get_client.return_value = (Mock(), "dalle")
+
+        def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            if name == "Steak House":
+                raise RuntimeError("DALL-E down")
+            return name.encode()
+
+        mock_generate.side_effect = fake_generate
+
+        results = sorted(
+            iter_images(sample_structured_menu, max_workers=3), key=lambda r: r.index
+        )
+
+        assert [r.data for r in results] == [b"Burger Deluxe", b"Chicken Salad", None]
+        assert str(results[2].error) == "DALL-E down"
+
+
+VARIANT_MENU = [
+    {"name": "Pizza Margherita (small)", "description": "Tomato, mozzarella"},
+    {"name": "Wings 6pc", "description": ""},
+    {"name": "Pizza Margherita (large)", "description": "Tomato, mozzarella"},
+    {"name": "Wings 12 pcs", "description": "Buffalo sauce"},
+    {"name": "Combo 1", "description": ""},
+    {"name": "Combo 2", "description": ""},
+]
+
+
+class TestImageSet:
+    """Test cases for the memory-bounded image results."""
+
+    def test_spools_images_over_budget(self):
+        images = ImageSet(max_memory_bytes=6)
+        images.add(2, b"ccc")
+        images.add(0, b"aaa")
+        images.add(1, b"bbb")
+
+        assert images == [b"aaa", b"bbb", b"ccc"]
+        assert images.indices == [0, 1, 2]
+        assert images[-1] == b"ccc" and images[1:] == [b"bbb", b"ccc"]
+        assert (images.memory_bytes, images.spooled_bytes) == (6, 3)
+        spool_dir = images._spool_dir
+        assert len(list(spool_dir.iterdir())) == 1
+
+        images.close()
+
+        assert not spool_dir.exists()
+        assert len(images) == 0
+
+    def test_spool_removed_when_collected(self):
+        images = ImageSet(max_memory_bytes=0)
+        images.add(0, b"a")
+        spool_dir = images._spool_dir
+
+        del images
+
+        assert not spool_dir.exists()
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_generate_images_memory_budget(
+        self, mock_get_client, mock_generate, sample_structured_menu, monkeypatch
+    ):
+        """With no memory budget every image is on disk, in menu order."""
+        monkeypatch.setenv("IMAGE_RESULTS_MAX_MEMORY_MB", "0")
+        mock_get_client.return_value = (Mock(), "dalle")
+        mock_generate.side_effect = lambda client, d, p, name, **kw: name.encode()
+
+        with metrics.collect() as run_metrics:
+            result = generate_images(sample_structured_menu, max_workers=3)
+
+        assert isinstance(result, ImageSet)
+        assert result == [b"Burger Deluxe", b"Chicken Salad", b"Steak House"]
+        assert result.memory_bytes == 0
+        counters = run_metrics.snapshot()["counters"]
+        assert counters["image.spooled_bytes"] == result.spooled_bytes
+
+
+class TestVariantGrouping:
+    """Test cases for sharing one image between variants of a dish."""
+
+    def test_normalize_name_drops_qualifiers(self):
+        assert normalize_name("Pizza Margherita (small)") == "pizza margherita"
+        assert normalize_name("Wings 12 pcs") == "wings"
+        assert normalize_name("LARGE Fries") == "fries"
+        assert normalize_name('Pepperoni 12"') == "pepperoni"
+        assert normalize_name("Combo 2") == "combo 2"
+        assert normalize_name("Large") == "large"
+
+    def test_group_variants(self):
+        groups = group_variants(VARIANT_MENU)
+
+        assert [group.members for group in groups] == [[0, 2], [1, 3], [4], [5]]
+        # The described wings variant makes the better prompt
+        assert groups[1].representative == 3
+
+    def test_near_matches_and_different_descriptions(self):
+        menu = [
+            {"name": "Pizza Margherita", "description": "Tomato, mozzarella"},
+            {"name": "Pizza Margarita", "description": "tomato mozzarella"},
+            {"name": "Soup", "description": "Tomato"},
+            {"name": "Soup", "description": "Onion"},
+        ]
+
+        assert [g.members for g in group_variants(menu, similarity=0.9)] == [
+            [0, 1],
+            [2],
+            [3],
+        ]
+        # Exact names only by default
+        assert [g.members for g in group_variants(menu)] == [[0], [1], [2], [3]]
+
+    @pytest.mark.parametrize(
+        "first, second",
+        [
+            ("Chicken Wings", "Chicken Rings"),
+            ("Espresso", "Espresso Double"),
+            ("Chicken Burger", "Chicken Burgers"),
+        ],
+    )
+    def test_near_miss_names_are_different_dishes(self, first, second):
+        menu = [
+            {"name": first, "description": ""},
+            {"name": second, "description": ""},
+        ]
+
+        assert [g.members for g in group_variants(menu)] == [[0], [1]]
+        # Fuzzy matching needs descriptions that confirm the dish
+        assert [g.members for g in group_variants(menu, similarity=0.9)] == [[0], [1]]
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_one_generation_per_cluster(self, mock_get_client, mock_generate):
+        mock_get_client.return_value = (Mock(), "dalle")
+        mock_generate.side_effect = lambda client, deployment, prompt, name, **kw: (
+            name.encode()
+        )
+
+        with metrics.collect() as run_metrics:
+            result = generate_images(VARIANT_MENU, max_workers=2)
+
+        assert result == [
+            b"Pizza Margherita (small)",
+            b"Wings 12 pcs",
+            b"Pizza Margherita (small)",
+            b"Wings 12 pcs",
+            b"Combo 1",
+            b"Combo 2",
+        ]
+        assert mock_generate.call_count == 4
+        assert run_metrics.snapshot()["counters"]["image.variants_collapsed"] == 2
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_grouping_can_be_switched_off(
+        self, mock_get_client, mock_generate, monkeypatch
+    ):
+        monkeypatch.setenv("IMAGE_VARIANT_GROUPING", "0")
+        mock_get_client.return_value = (Mock(), "dalle")
+        mock_generate.return_value = b"image"
+
+        assert len(generate_images(VARIANT_MENU)) == len(VARIANT_MENU)
+        assert mock_generate.call_count == len(VARIANT_MENU)
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_shared_image_reaches_every_destination(
+        self, mock_get_client, mock_generate
+    ):
+        mock_get_client.return_value = (Mock(), "dalle")
+        mock_generate.return_value = b"pizza"
+        menu = VARIANT_MENU[:1] + VARIANT_MENU[2:3]
+        dests = {0: io.BytesIO(), 1: io.BytesIO()}
+
+        results = list(iter_images(menu, dest_for=lambda index, item: dests[index]))
+
+        assert sorted(r.index for r in results) == [0, 1]
+        assert all(r.data is None and r.error is None for r in results)
+        assert [dest.getvalue() for dest in dests.values()] == [b"pizza", b"pizza"]
+        assert mock_generate.call_args.kwargs["dest"] is None
+
+    @patch("src.app.image_gen.generate_image_async")
+    @patch("src.app.image_gen.get_async_openai_client")
+    def test_async_shares_failures_with_members(self, mock_get_client, mock_generate):
+        mock_get_client.return_value = (AsyncMock(), "dalle")
+
+        async def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            if name.startswith("Wings"):
+                raise _content_policy_error()
+            return name.encode()
+
+        mock_generate.side_effect = fake_generate
+
+        result = asyncio.run(generate_images_async(VARIANT_MENU))
+
+        assert result == [
+            b"Pizza Margherita (small)",
+            b"Pizza Margherita (small)",
+            b"Combo 1",
+            b"Combo 2",
+        ]
+        assert mock_generate.call_count == 4
+
+
+def png_bytes(size=(1024, 1024)) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 60).convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TestThumbnails:
+    """Test cases for display thumbnails and per-request generation options."""
+
+    def test_make_thumbnail(self):
+        from PIL import Image
+
+        original = png_bytes((1792, 1024))
+
+        webp = make_thumbnail(original, max_dimension=256)
+        jpeg = make_thumbnail(original, max_dimension=256, format="jpeg")
+
+        assert Image.open(io.BytesIO(webp)).format == "WEBP"
+        assert Image.open(io.BytesIO(webp)).size == (256, 146)
+        assert Image.open(io.BytesIO(jpeg)).format == "JPEG"
+        assert len(webp) < len(original) / 10
+        assert make_thumbnail(b"not an image") is None
+
+    def test_thumbnail_settings(self, monkeypatch):
+        assert get_thumbnail_settings() == {
+            "max_dimension": 384,
+            "format": "webp",
+            "quality": 80,
+        }
+        monkeypatch.setenv("IMAGE_THUMBNAIL_FORMAT", "gif")
+        with pytest.raises(ValueError, match="IMAGE_THUMBNAIL_FORMAT"):
+            get_thumbnail_settings()
+        monkeypatch.setenv("IMAGE_THUMBNAIL_SIZE", "0")
+        assert get_thumbnail_settings() is None
+
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_results_carry_thumbnails_and_options(
+        self, mock_get_client, mock_generate, sample_structured_menu
+    ):
+        mock_get_client.return_value = (Mock(), "dalle")
+        original = png_bytes()
+        mock_generate.return_value = original
+
+        results = list(
+            iter_images(sample_structured_menu[:1], size="1792x1024", quality="hd")
+        )
+
+        assert results[0].data == original
+        assert results[0].thumbnail.startswith(b"RIFF")  # WebP container
+        kwargs = mock_generate.call_args.kwargs
+        assert (kwargs["size"], kwargs["quality"]) == ("1792x1024", "hd")
+
+    def test_generation_settings(self, monkeypatch):
+        assert get_generation_settings() == ("1024x1024", "standard")
+        monkeypatch.setenv("DALLE_3_QUALITY", "hd")
+        assert get_generation_settings("1024x1792") == ("1024x1792", "hd")
+        with pytest.raises(ValueError, match="Image size"):
+            get_generation_settings("512x512")
+
+
+class TestGenerateImagesAsync:
+    """Test cases for the async image generation API."""
+
+    @patch("src.app.image_gen.generate_image_async")
+    @patch("src.app.image_gen.get_async_openai_client")
+    def test_generate_images_async_order_and_skips(
+        self, mock_get_client, mock_generate, sample_structured_menu
+    ):
+        mock_get_client.return_value = (AsyncMock(), "dalle")
+        delays = {"Burger Deluxe": 0.03, "Chicken Salad": 0.0, "Steak House": 0.01}
+
+        async def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            await asyncio.sleep(delays[name])
+            if name == "Chicken Salad":
+                raise _content_policy_error()
+            return name.encode()
+
+        mock_generate.side_effect = fake_generate
+
+        result = asyncio.run(generate_images_async(sample_structured_menu))
+
+        assert result == [b"Burger Deluxe", b"Steak House"]
+
+    @patch("src.app.image_gen.generate_image_async")
+    @patch("src.app.image_gen.get_async_openai_client")
+    def test_generate_images_async_limits_concurrency(
+        self, mock_get_client, mock_generate, sample_structured_menu
+    ):
+        mock_get_client.return_value = (AsyncMock(), "dalle")
+        in_flight = []
+        peak = []
+
+        async def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            in_flight.append(name)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(name)
+            return name.encode()
+
+        mock_generate.side_effect = fake_generate
+
+        asyncio.run(generate_images_async(sample_structured_menu, max_concurrency=1))
+
+        assert max(peak) == 1
+
+    @patch("src.app.image_gen.generate_image_async")
+    @patch("src.app.image_gen.get_async_openai_client")
+    def test_closing_iterator_waits_for_cancelled_generations(
+        self, mock_get_client, mock_generate, sample_structured_menu
+    ):
+        mock_get_client.return_value = (AsyncMock(), "dalle")
+        cancelled = []
+
+        async def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            try:
+                await asyncio.sleep(0 if name == "Burger Deluxe" else 10)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            return name.encode()
+
+        mock_generate.side_effect = fake_generate
+
+        async def first_then_close():
+            results = iter_images_async(sample_structured_menu, thumbnails=False)
+            first = await anext(results)
+            await results.aclose()
+            return first, list(cancelled)
+
+        first, cancelled_at_close = asyncio.run(first_then_close())
+
+        assert first.name == "Burger Deluxe"
+        assert sorted(cancelled_at_close) == ["Chicken Salad", "Steak House"]
+
+    def test_generate_image_async_decodes_b64(self):
+        mock_client = AsyncMock()
+        mock_client.images.generate.return_value = Mock(
+            data=[Mock(b64_json=base64.b64encode(b"png-bytes").decode())]
+        )
+
+        result = asyncio.run(
+            generate_image_async(
+                mock_client, "dalle", "prompt", "Salad", response_format="b64_json"
+            )
+        )
+
+        assert result == b"png-bytes"
+
+
+class TestRateLimiter:
+    """Test cases for the RateLimiter."""
+
+    def test_rate_limiter_spaces_requests(self):
+        """Calls beyond the budget wait for the next slot."""
+        now = [0.0]
+        waits = []
+        limiter = RateLimiter(
+            120, clock=lambda: now[0], sleep=lambda seconds: waits.append(seconds)
+        )
+
+        for _ in range(3):
+            limiter.acquire()
+
+        assert waits == [0.5, 1.0]
+
+    def test_rate_limiter_rejects_non_positive_budget(self):
+        with pytest.raises(ValueError):
+            RateLimiter(0)
+
+    @patch("src.app.image_gen.generate_image_async")
+    @patch("src.app.image_gen.get_async_openai_client")
+    @patch("src.app.image_gen.generate_image")
+    @patch("src.app.image_gen.get_openai_client")
+    def test_menus_share_one_limiter_per_deployment(
+        self,
+        mock_get_client,
+        mock_generate,
+        mock_get_async_client,
+        mock_generate_async,
+        sample_structured_menu,
+    ):
+        """The budget covers every menu and both paths, not each call."""
+        limiters = []
+
+        def fake_generate(client, deployment_name, prompt, name, **kwargs):
+            limiters.append((deployment_name, kwargs["limiter"]))
+            return b"png"
+
+        async def fake_generate_async(*args, **kwargs):
+            return fake_generate(*args, **kwargs)
+
+        mock_generate.side_effect = fake_generate
+        mock_generate_async.side_effect = fake_generate_async
+        mock_get_client.return_value = (Mock(), "dalle")
+        mock_get_async_client.return_value = (Mock(), "dalle")
+        menu = sample_structured_menu[:1]
+
+        list(iter_images(menu, requests_per_minute=60))
+        list(iter_images(menu, requests_per_minute=60))
+        asyncio.run(generate_images_async(menu, requests_per_minute=60))
+        mock_get_client.return_value = (Mock(), "dalle-eu")
+        list(iter_images(menu, requests_per_minute=60))
+
+        shared = limiters[0][1]
+        assert [limiter is shared for _, limiter in limiters] == [
+            True,
+            True,
+            True,
+            False,
+        ]
+        assert shared.interval == 1.0
+
+
+class TestGenerateImage:
+    """Test cases for in-memory image retrieval in generate_image."""
+
+    def test_b64_json_is_decoded_in_memory(self):
+        mock_client = Mock()
+        mock_client.images.generate.return_value = Mock(
+            data=[Mock(b64_json=base64.b64encode(b"png-bytes").decode())]
+        )
+
+        result = generate_image(
+            mock_client, "dalle", "prompt", "Salad", response_format="b64_json"
+        )
+
+        assert result == b"png-bytes"
+        kwargs = mock_client.images.generate.call_args.kwargs
+        assert kwargs["response_format"] == "b64_json"
+
+    @patch("src.app.image_gen.get_http_session")
+    def test_url_download_is_streamed(self, mock_get_session):
+        mock_client = Mock()
+        mock_client.images.generate.return_value = Mock(
+            data=[Mock(url="https://images.example/1.png")]
+        )
+        download = mock_get_session.return_value.get.return_value
+        download.iter_content.return_value = iter([b"png-", b"bytes"])
+
+        result = generate_image(
+            mock_client, "dalle", "prompt", "Salad", response_format="url"
+        )
+
+        assert result == b"png-bytes"
+        assert mock_get_session.return_value.get.call_args.kwargs["stream"] is True
+
+    @patch("src.app.image_gen.get_http_session")
+    def test_streams_into_caller_destination(self, mock_get_session):
+        mock_client = Mock()
+        mock_client.images.generate.return_value = Mock(
+            data=[Mock(url="https://images.example/1.png")]
+        )
+        download = mock_get_session.return_value.get.return_value
+        download.iter_content.return_value = iter([b"png-", b"bytes"])
+        dest = io.BytesIO()
+
+        result = generate_image(
+            mock_client, "dalle", "prompt", "Salad", response_format="url", dest=dest
+        )
+
+        assert result is None
+        assert dest.getvalue() == b"png-bytes"
+
+
+class TestImageCache:
+    """Test cases for the ImageCache and its use in generate_image."""
+
+    def test_cache_key_depends_on_generation_parameters(self):
+        key = ImageCache.make_key("prompt", "dalle", "1024x1024", "standard")
+        assert key == ImageCache.make_key("prompt", "dalle", "1024x1024", "standard")
+        assert key != ImageCache.make_key("prompt", "dalle", "1024x1024", "hd")
+        assert key != ImageCache.make_key("prompt", "other", "1024x1024", "standard")
+
+    def test_cache_hit_and_miss_counters(self, tmp_path):
+        cache = ImageCache(tmp_path, max_bytes=1024)
+
+        assert cache.get("a") is None
+        cache.put("a", b"image-a")
+
+        assert cache.get("a") == b"image-a"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_cache_evicts_least_recently_used(self, tmp_path):
+        cache = ImageCache(tmp_path, max_bytes=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        cache.get("a")  # "b" is now the least recently used entry
+
+        cache.put("c", b"cccc")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"aaaa"
+        assert cache.get("c") == b"cccc"
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] == 8
+
+    def test_cache_persists_across_instances(self, tmp_path):
+        ImageCache(tmp_path, max_bytes=1024).put("a", b"image-a")
+
+        reopened = ImageCache(tmp_path, max_bytes=1024)
+
+        assert reopened.get("a") == b"image-a"
+        assert reopened.stats()["entries"] == 1
+
+    def test_generate_image_uses_cache(self, tmp_path):
+        """A second generation of the same prompt never reaches the API."""
+        cache = ImageCache(tmp_path, max_bytes=1024)
+        mock_client = Mock()
+        mock_client.images.generate.return_value = Mock(
+            data=[Mock(b64_json=base64.b64encode(b"png-bytes").decode())]
+        )
+
+        first = generate_image(mock_client, "dalle", "prompt", "Salad", cache=cache)
+        second = generate_image(mock_client, "dalle", "prompt", "Salad", cache=cache)
+
+        assert first == second == b"png-bytes"
+        mock_client.images.generate.assert_called_once()
+        assert cache.stats()["hits"] == 1
+
+    def test_get_image_cache_disabled(self, monkeypatch):
+        monkeypatch.setattr("src.app.image_cache._image_cache", None)
+        monkeypatch.setenv("IMAGE_CACHE_MAX_MB", "0")
+
+        assert get_image_cache() is None
@@ -0,0 +1,228 @@
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.app import metrics
+from src.app.ocr.group_with_gpt import (
+    build_block_prompt,
+    expand_block_items,
+    group_blocks_with_gpt,
+    split_blocks,
+)
+from src.app.ocr.layout import layout_blocks, page_blocks
+from src.app.ocr.ocr_pipeline import structure_lines
+
+
+def page(rows, width=8.5, page_number=1):
+    """Page geometry from (text, left, top, right) rows of 0.3in high lines."""
+    return {
+        "page_number": page_number,
+        "width": width,
+        "height": 11.0,
+        "unit": "inch",
+        "lines": [
+            {"content": text, "polygon": [x0, y, x1, y, x1, y + 0.3, x0, y + 0.3]}
+            for text, x0, y, x1 in rows
+        ],
+    }
+
+
+def texts(geometry):
+    return [line["content"] for line in geometry["lines"]]
+
+
+class TestLayoutBlocks:
+    """Test cases for pre-grouping OCR lines by their position."""
+
+    def test_single_column_split_at_gaps_and_headings(self):
+        geometry = page(
+            [
+                ("STARTERS", 1.0, 0.5, 2.5),
+                ("Tomato Soup", 1.0, 1.0, 3.0),
+                ("Roasted tomatoes, basil and a long list of herbs", 1.0, 1.4, 6.5),
+                ("$6", 1.0, 1.8, 1.4),
+                ("Garlic Bread", 1.0, 2.5, 3.0),
+                ("$4", 1.0, 2.9, 1.4),
+            ]
+        )
+
+        assert page_blocks(texts(geometry), geometry) == [
+            ["STARTERS"],
+            ["Tomato Soup", "Roasted tomatoes, basil and a long list of herbs", "$6"],
+            ["Garlic Bread", "$4"],
+        ]
+
+    def test_two_columns_with_aligned_prices(self):
+        geometry = page(
+            [
+                ("Trattoria Menu", 1.0, 0.3, 7.5),
+                ("Soup", 0.5, 1.0, 1.5),
+                ("$6", 3.5, 1.0, 3.9),
+                ("Pasta", 4.5, 1.0, 5.5),
+                ("$12", 7.6, 1.0, 8.0),
+                ("Creamy tomato", 0.5, 1.4, 2.5),
+                ("Fresh egg pasta", 4.5, 1.4, 6.5),
+                ("Salad", 0.5, 2.1, 1.5),
+                ("$5", 3.5, 2.1, 3.9),
+            ]
+        )
+
+        assert page_blocks(texts(geometry), geometry) == [
+            ["Trattoria Menu"],
+            ["Soup", "$6", "Creamy tomato"],
+            ["Salad", "$5"],
+            ["Pasta", "$12", "Fresh egg pasta"],
+        ]
+
+    def test_pages_in_order(self):
+        first = page([("Soup", 1.0, 1.0, 2.0), ("$6", 3.0, 1.0, 3.4)])
+        second = page([("Cake", 1.0, 1.0, 2.0)], page_number=2)
+
+        blocks = layout_blocks(["Soup", "$6", "Cake"], [first, second])
+
+        assert blocks == [["Soup", "$6"], ["Cake"]]
+
+    def test_unusable_geometry_falls_back(self):
+        geometry = page([("Soup", 1.0, 1.0, 2.0)])
+
+        assert layout_blocks(["Soup", "$6"], [geometry]) is None
+        geometry["lines"][0]["polygon"] = None
+        assert layout_blocks(["Soup"], [geometry]) is None
+        assert layout_blocks(["Soup"], [{}]) is None
+
+
+class TestBlockPrompt:
+    """Test cases for structuring layout blocks with GPT."""
+
+    def _response(self, content):
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = content
+        response.usage = None
+        return response
+
+    def test_block_prompt_is_compact(self):
+        prompt = build_block_prompt(
+            [
+                ["SOUPS"],
+                ["Soup", "Creamy tomato", "$6"],
+                ["Stew", "Slow-cooked beef with root vegetables and thyme"],
+            ]
+        )
+
+        assert (
+            "1: SOUPS\n2: Soup | Creamy tomato | $6\n"
+            "3: Stew | Slow-cooked beef with root vegetables and thyme\n" in prompt
+        )
+        assert '"b": block' in prompt
+
+    def test_expand_block_items_recovers_descriptions(self):
+        blocks = [["Soup", "Creamy tomato", "$6", "Bread", "Sourdough"]]
+        items = [
+            {"b": 1, "n": "Soup", "p": "$6"},
+            {"b": 1, "n": "Bread", "p": 4},
+            {"b": 7, "n": "Cake", "p": "$3"},
+            {"name": "Tea", "price": "$2", "description": ""},
+        ]
+
+        assert expand_block_items(items, blocks) == [
+            {"name": "Soup", "description": "Creamy tomato", "price": "$6"},
+            {"name": "Bread", "description": "Sourdough", "price": "4"},
+            {"name": "Cake", "description": "", "price": "$3"},
+            {"name": "Tea", "price": "$2", "description": ""},
+        ]
+
+    def test_split_blocks_keeps_blocks_whole(self):
+        blocks = [["a", "b"], ["c", "d"], ["e"], ["f", "g", "h", "i"]]
+
+        assert split_blocks(blocks, max_lines=3) == [
+            [["a", "b"]],
+            [["c", "d"], ["e"]],
+            [["f", "g", "h"]],
+            [["i"]],
+        ]
+
+    def test_oversized_block_is_split_between_items(self):
+        block = ["Soup", "$6", "Stew", "Beef", "$9", "Pie", "$4"]
+
+        chunks = split_blocks([block], max_lines=4)
+
+        assert chunks == [[["Soup", "$6"]], [["Stew", "Beef", "$9"]], [["Pie", "$4"]]]
+        assert [line for c in chunks for b in c for line in b] == block
+
+    @patch("src.app.ocr.group_with_gpt.get_openai_client")
+    def test_group_blocks_reports_prompt_tokens(self, mock_get_openai_client, capsys):
+        mock_client = Mock()
+        response = self._response(
+            json.dumps({"items": [{"b": 1, "n": "Soup", "p": "$6"}]})
+        )
+        response.usage = Mock(prompt_tokens=40, completion_tokens=12)
+        mock_client.chat.completions.create.return_value = response
+        mock_get_openai_client.return_value = (mock_client, "deployment_name")
+
+        with metrics.collect() as run_metrics:
+            result = group_blocks_with_gpt([["Soup", "Creamy tomato", "$6"]])
+
+        assert json.loads(result) == [
+            {"name": "Soup", "description": "Creamy tomato", "price": "$6"}
+        ]
+        kwargs = mock_client.chat.completions.create.call_args.kwargs
+        assert kwargs["response_format"] == {"type": "json_object"}
+        counters = run_metrics.snapshot()["counters"]
+        assert counters["gpt.prompt_tokens"] == 40
+        blocks = counters["gpt.prompt_tokens_estimate{prompt=blocks}"]
+        lines = counters["gpt.prompt_tokens_estimate{prompt=lines}"]
+        assert blocks > 0 and lines > 0
+        assert (
+            f"GPT prompt ~{blocks} tokens with layout blocks, 40 billed"
+            f" (~{lines} as flat lines)" in capsys.readouterr().out
+        )
+
+    @patch("src.app.ocr.group_with_gpt.get_openai_client")
+    def test_prompt_tokens_ignore_parse_retries(self, mock_get_openai_client, capsys):
+        mock_client = Mock()
+        retry = self._response("not json")
+        retry.usage = Mock(prompt_tokens=40, completion_tokens=3)
+        response = self._response(json.dumps({"items": [{"b": 1, "n": "Soup"}]}))
+        response.usage = Mock(prompt_tokens=40, completion_tokens=12)
+        mock_client.chat.completions.create.side_effect = [retry, response]
+        mock_get_openai_client.return_value = (mock_client, "deployment_name")
+
+        group_blocks_with_gpt([["Soup", "$6"]])
+
+        assert ", 40 billed" in capsys.readouterr().out  # not 80 with the retry
+
+    @pytest.mark.usefixtures("gpt_structuring")
+    @pytest.mark.parametrize("enabled", ["1", "0"])
+    @patch("src.app.ocr.ocr_pipeline.group_lines_with_gpt")
+    @patch("src.app.ocr.ocr_pipeline.group_blocks_with_gpt")
+    def test_structure_lines_uses_geometry(
+        self, mock_blocks, mock_lines, enabled, monkeypatch
+    ):
+        monkeypatch.setenv("GPT_LAYOUT_BLOCKS", enabled)
+        geometry = page([("Soup", 1.0, 1.0, 2.0), ("$6", 3.0, 1.0, 3.4)])
+
+        structure_lines(["Soup", "$6"], [geometry])
+
+        if enabled == "1":
+            mock_blocks.assert_called_once_with([["Soup", "$6"]])
+            mock_lines.assert_not_called()
+        else:
+            mock_lines.assert_called_once_with(["Soup", "$6"], None)
+            mock_blocks.assert_not_called()
+
+    @pytest.mark.usefixtures("gpt_structuring")
+    @patch("src.app.ocr.ocr_pipeline.group_lines_with_gpt")
+    def test_flat_requests_are_split_at_page_breaks(self, mock_lines, monkeypatch):
+        monkeypatch.setenv("GPT_LAYOUT_BLOCKS", "0")
+        pages = [
+            page([("Soup", 1.0, 1.0, 2.0), ("$6", 3.0, 1.0, 3.4)]),
+            page([("Cake", 1.0, 1.0, 2.0), ("$4", 3.0, 1.0, 3.4)], page_number=2),
+        ]
+
+        structure_lines(["Soup", "$6", "Cake", "$4"], pages)
+
+        mock_lines.assert_called_once_with(
+            ["Soup", "$6", "Cake", "$4"], [["Soup", "$6"], ["Cake", "$4"]]
+        )
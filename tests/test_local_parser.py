@@ -0,0 +1,115 @@
+import json
+from unittest.mock import patch
+
+from src.app.ocr.local_parser import classify_line, parse_menu_lines
+from src.app.ocr.ocr_pipeline import run_pipeline
+
+
+class TestLocalParser:
+    """Test cases for structuring menus without GPT."""
+
+    def test_name_price_description_layout(
+        self, sample_ocr_lines, sample_structured_menu
+    ):
+        parsed = parse_menu_lines(sample_ocr_lines)
+
+        assert parsed.items == sample_structured_menu
+        assert parsed.confidence == 1.0
+
+    def test_name_description_price_layout_with_headings(self):
+        parsed = parse_menu_lines(
+            [
+                "Starters",
+                "Tomato Soup",
+                "Roasted tomatoes, basil",
+                "$6",
+                "DESSERTS:",
+                "Tiramisu",
+                "espresso soaked sponge",
+                "€7,50",
+            ]
+        )
+
+        assert [region.lines[0] for region in parsed.regions] == [
+            "Starters",
+            "DESSERTS:",
+        ]
+        assert parsed.items == [
+            {
+                "name": "Tomato Soup",
+                "price": "$6",
+                "description": "Roasted tomatoes, basil",
+            },
+            {
+                "name": "Tiramisu",
+                "price": "€7,50",
+                "description": "espresso soaked sponge",
+            },
+        ]
+        assert parsed.confidence >= 0.9
+
+    def test_prices_on_the_name_line(self):
+        parsed = parse_menu_lines(
+            ["Bruschetta ..... 7.50", "Tomato, basil", "PIZZA $8 / $12", "Wine — 7€"]
+        )
+
+        assert [(item["name"], item["price"]) for item in parsed.items] == [
+            ("Bruschetta", "7.50"),
+            ("PIZZA", "$8 / $12"),
+            ("Wine", "7€"),
+        ]
+        assert parsed.items[0]["description"] == "Tomato, basil"
+
+    def test_classify_line(self):
+        assert classify_line("$12.99") == "price"
+        assert classify_line("Soup of the day $6") == "item"
+        assert classify_line("MAINS") == "heading"
+        assert classify_line("Fresh beef with fries") == "text"
+
+    def test_unclear_menus_have_low_confidence(self):
+        # No prices to anchor items on
+        assert parse_menu_lines(["Welcome", "Open daily", "Ask us"]).confidence == 0
+        # Two names then two prices: the grouping explains little
+        unclear = parse_menu_lines(["Tomato Soup", "Garlic Bread", "$6", "$4"])
+        assert unclear.confidence < 0.5
+
+
+class TestLocalStructuring:
+    """Test cases for skipping GPT in run_pipeline."""
+
+    @patch("src.app.ocr.ocr_pipeline.group_lines_with_gpt")
+    @patch("src.app.ocr.ocr_pipeline.analyze_menu")
+    def test_confident_menu_skips_gpt(
+        self, mock_extract, mock_group, sample_ocr_lines, sample_structured_menu
+    ):
+        mock_extract.return_value = {"lines": sample_ocr_lines, "pages": []}
+
+        result = run_pipeline("fake_image_path.jpg")
+
+        assert json.loads(result) == sample_structured_menu
+        mock_group.assert_not_called()
+
+    @patch("src.app.ocr.ocr_pipeline.group_regions_with_gpt")
+    @patch("src.app.ocr.ocr_pipeline.group_lines_with_gpt")
+    @patch("src.app.ocr.ocr_pipeline.analyze_menu")
+    def test_only_uncertain_regions_go_to_gpt(
+        self, mock_extract, mock_group, mock_regions
+    ):
+        unclear = ["DRINKS", "Lemonade", "Iced Tea", "$3", "$4"]
+        mock_extract.return_value = {
+            "lines": ["Burger Deluxe", "$12.99"] + unclear,
+            "pages": [],
+        }
+        mock_regions.return_value = [
+            [{"name": "Lemonade", "price": "$3"}, {"name": "Iced Tea", "price": "$4"}]
+        ]
+
+        result = json.loads(run_pipeline("fake_image_path.jpg"))
+
+        assert [item["name"] for item in result] == [
+            "Burger Deluxe",
+            "Lemonade",
+            "Iced Tea",
+        ]
+        mock_regions.assert_called_once_with([unclear])
+        mock_group.assert_not_called()
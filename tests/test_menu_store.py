@@ -0,0 +1,99 @@
+from src.app import metrics
+from src.app.events import ImageReady, ItemFailed, MenuStructured, OCRCompleted
+from src.app.menu_store import MenuStore, StoredImage, get_menu_store
+from src.app.result_cache import iter_cached_pipeline, result_key
+
+MENU = [{"name": "Soup", "price": "$5"}, {"name": "Wine", "price": "$7"}]
+
+
+def store_menu(store, key, image=b"soup-image"):
+    store.put(
+        key,
+        ["Soup", "$5"],
+        MENU,
+        [StoredImage(0, image, b"thumb"), StoredImage(1, None, error="policy")],
+        {"total": 1.5},
+    )
+
+
+class TestMenuStore:
+    """Test cases for the persistent SQLite + blob menu store."""
+
+    def test_round_trip_survives_reopening(self, tmp_path):
+        store_menu(MenuStore(tmp_path, max_bytes=1024), "menu-a")
+
+        stored = MenuStore(tmp_path, max_bytes=1024).get("menu-a")
+
+        assert stored.lines == ["Soup", "$5"]
+        assert stored.menu == MENU
+        assert stored.images == [
+            StoredImage(0, b"soup-image", b"thumb"),
+            StoredImage(1, None, None, "policy"),
+        ]
+        assert stored.timings == {"total": 1.5}
+
+    def test_blobs_are_content_addressed(self, tmp_path):
+        store = MenuStore(tmp_path, max_bytes=1024)
+
+        store_menu(store, "menu-a")
+        store_menu(store, "menu-b")
+
+        assert len(list((tmp_path / "blobs").rglob("*"))) == 4  # 2 dirs, 2 blobs
+        assert store.stats()["bytes"] == len(b"soup-image") + len(b"thumb")
+
+    def test_least_recently_used_menus_are_evicted(self, tmp_path):
+        store = MenuStore(tmp_path, max_bytes=30)
+        store_menu(store, "menu-a", b"a" * 10)
+        store_menu(store, "menu-b", b"b" * 10)
+        store.get("menu-a")  # "menu-b" is now the least recently used
+
+        store_menu(store, "menu-c", b"c" * 10)
+
+        assert store.get("menu-b") is None
+        assert store.get("menu-a") is not None
+        assert store.get("menu-c") is not None
+        assert store.stats()["evictions"] == 1
+        assert store.stats()["bytes"] == 25  # two images and the shared thumbnail
+        blobs = [path for path in (tmp_path / "blobs").rglob("*") if path.is_file()]
+        assert len(blobs) == 3
+
+    def test_missing_blob_is_a_miss(self, tmp_path):
+        store = MenuStore(tmp_path, max_bytes=1024)
+        store_menu(store, "menu-a")
+        for path in (tmp_path / "blobs").rglob("*"):
+            if path.is_file():
+                path.unlink()
+
+        assert store.get("menu-a") is None
+        assert store.stats()["menus"] == 0
+
+    def test_store_disabled(self, monkeypatch):
+        monkeypatch.setenv("MENU_STORE_MAX_MB", "0")
+
+        assert get_menu_store() is None
+
+
+class TestStoredPipelineRuns:
+    """Test cases for serving repeat menus from the store after a restart."""
+
+    def test_run_is_replayed_from_the_store(self, monkeypatch):
+        runs = []
+
+        def pipeline(image_path, **options):
+            runs.append(image_path)
+            yield OCRCompleted(["Soup", "$5", "Wine", "$7"])
+            yield MenuStructured(MENU)
+            yield ImageReady(0, MENU[0], b"soup-image", b"thumb")
+            yield ItemFailed(1, MENU[1], "content_policy_violation", skipped=True)
+
+        first = list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+        # A restart loses the in-memory results but not the store
+        monkeypatch.setattr("src.app.result_cache._result_cache", None)
+        with metrics.collect() as run_metrics:
+            second = list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+
+        assert second == first
+        assert len(runs) == 1
+        assert run_metrics.snapshot()["counters"]["cache.hits{cache=store}"] == 1
+        timings = get_menu_store().get(result_key(b"menu-bytes")).timings
+        assert set(timings) == {"ocr", "structure", "total"}
@@ -0,0 +1,113 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+
+from src.app import metrics
+from src.app.ocr.group_with_gpt import structure_section
+
+
+class TestMetrics:
+    """Test cases for spans, counters and their sinks."""
+
+    def test_collect_records_spans_and_counters(self):
+        with metrics.collect() as run:
+            with metrics.span("ocr.submit", bytes=10) as span:
+                span["pages"] = 1
+            metrics.incr("cache.hits", cache="ocr")
+            metrics.incr("cache.hits", cache="ocr")
+
+        snapshot = run.snapshot()
+        assert snapshot["counters"] == {"cache.hits{cache=ocr}": 2}
+        assert snapshot["spans"][0]["name"] == "ocr.submit"
+        assert snapshot["spans"][0]["bytes"] == 10
+        assert snapshot["spans"][0]["pages"] == 1
+        assert snapshot["totals"]["ocr.submit"]["count"] == 1
+
+    def test_failed_span_records_error(self):
+        with metrics.collect() as run:
+            with pytest.raises(RuntimeError):
+                with metrics.span("image.generate"):
+                    raise RuntimeError("boom")
+
+        assert run.spans[0]["error"] == "RuntimeError"
+
+    def test_bound_work_is_recorded_in_the_caller_collector(self):
+        with metrics.collect() as run, ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(metrics.bind(lambda i: metrics.incr("work")), range(8)))
+            # Unbound work only reaches the process registry
+            pool.submit(metrics.incr, "unbound").result()
+
+        assert run.snapshot()["counters"] == {"work": 8}
+
+    def test_runs_are_isolated_but_registry_is_cumulative(self):
+        before = metrics.registry.counters.get(("isolated", ()), 0)
+
+        with metrics.collect() as first:
+            metrics.incr("isolated")
+        with metrics.collect() as second:
+            metrics.incr("isolated", 2)
+
+        assert first.snapshot()["counters"] == {"isolated": 1}
+        assert second.snapshot()["counters"] == {"isolated": 2}
+        assert metrics.registry.counters[("isolated", ())] == before + 3
+        assert metrics.registry.spans == []
+
+    def test_json_log_sink(self, tmp_path):
+        sink = metrics.JSONLogSink(tmp_path / "metrics.jsonl")
+        metrics.add_sink(sink)
+        try:
+            metrics.incr("gpt.prompt_tokens", 42)
+            with metrics.span("gpt.request"):
+                pass
+        finally:
+            metrics.remove_sink(sink)
+
+        records = [
+            json.loads(line)
+            for line in (tmp_path / "metrics.jsonl").read_text().splitlines()
+        ]
+        assert records[0] == {
+            "type": "counter",
+            "name": "gpt.prompt_tokens",
+            "value": 42,
+            "labels": {},
+        }
+        assert records[1]["type"] == "span"
+        assert records[1]["name"] == "gpt.request"
+
+    def test_render_prometheus(self):
+        collected = metrics.Metrics()
+        collected.incr("http.responses", 3, (("service", "openai"), ("status", 429)))
+        collected.add_span({"name": "ocr.poll", "seconds": 1.5})
+
+        text = metrics.render_prometheus(collected)
+
+        assert "# TYPE menu_visualiser_http_responses_total counter" in text
+        assert (
+            'menu_visualiser_http_responses_total{service="openai",status="429"} 3'
+            in text
+        )
+        assert "menu_visualiser_ocr_poll_seconds_count 1" in text
+        assert "menu_visualiser_ocr_poll_seconds_sum 1.500000" in text
+
+    def test_token_usage_and_parse_retries_are_counted(self):
+        bad = Mock()
+        bad.choices = [Mock(message=Mock(content="not json"))]
+        bad.usage = Mock(prompt_tokens=100, completion_tokens=5)
+        good = Mock()
+        good.choices = [Mock(message=Mock(content='{"items": [{"name": "Soup"}]}'))]
+        good.usage = Mock(prompt_tokens=100, completion_tokens=20)
+        client = Mock()
+        client.chat.completions.create.side_effect = [bad, good]
+
+        with metrics.collect() as run:
+            items = structure_section(client, "gpt", ["SOUPS", "Soup $5"])
+
+        assert items == [{"name": "Soup"}]
+        counters = run.snapshot()["counters"]
+        assert counters["gpt.prompt_tokens"] == 200
+        assert counters["gpt.completion_tokens"] == 25
+        assert counters["gpt.parse_retries"] == 1
+        assert run.snapshot()["totals"]["gpt.request"]["count"] == 2
@@ -1,10 +1,26 @@
+import asyncio
+import json
 import pytest
 import os
 import importlib.util
-from unittest.mock import Mock, patch, mock_open
+from unittest.mock import AsyncMock, Mock, patch, mock_open
 from src.app.ocr.ocr import extract_menu_items  # noqa: F401
 from src.app.ocr.group_with_gpt import group_lines_with_gpt  # noqa: F401
 from src.app.ocr.ocr_pipeline import run_pipeline  # noqa: F401
+from src.app.ocr.ocr import (
+    analyze_menu,
+    analyze_menu_async,
+    count_pdf_pages,
+    iter_menu_pages,
+)
+from src.app.ocr.group_with_gpt import (
+    group_lines_with_gpt_async,
+    merge_items,
+    parse_menu_json,
+    split_into_sections,
+)
+from src.app.ocr.ocr_cache import OCRCache
+from src.app.ttl_cache import TTLCache
 
 
 class TestExtractMenuItems:
@@ -214,15 +230,217 @@ class TestGroupLinesWithGPT:
         assert sample_structured_menu[0]["price"] == "$12.99"
 
 
+class TestMultiPageOCR:
+    """Test cases for per-page parallel OCR of PDFs."""
+
+    @staticmethod
+    def _pdf(tmp_path, page_count):
+        body = b"".join(
+            b"%d 0 obj << /Type /Page /Parent 2 0 R >> endobj\n" % (n + 3)
+            for n in range(page_count)
+        )
+        path = tmp_path / "menu.pdf"
+        path.write_bytes(b"%PDF-1.4\n2 0 obj << /Type /Pages >> endobj\n" + body)
+        return path
+
+    def test_count_pdf_pages(self, tmp_path):
+        assert count_pdf_pages(self._pdf(tmp_path, 3).read_bytes()) == 3
+        assert count_pdf_pages(b"\xff\xd8 jpeg bytes") == 0
+
+    @patch("src.app.ocr.ocr.get_azure_client")
+    def test_pdf_pages_analysed_separately_in_order(self, mock_get_client, tmp_path):
+        """One job per page; pages stream back in page order."""
+        mock_client = Mock()
+
+        def fake_begin(**kwargs):
+            page_number = int(kwargs["pages"])
+            page = Mock(page_number=page_number, width=1.0, height=1.0, unit="inch")
+            page.lines = [Mock(content=f"Dish {page_number}", polygon=None)]
+            poller = Mock()
+            poller.result.return_value = Mock(pages=[page])
+            return poller
+
+        mock_client.begin_analyze_document.side_effect = fake_begin
+        mock_get_client.return_value = mock_client
+
+        pages = list(iter_menu_pages(str(self._pdf(tmp_path, 3)), max_workers=3))
+
+        assert [page.page_number for page in pages] == [1, 2, 3]
+        assert [page.lines for page in pages] == [["Dish 1"], ["Dish 2"], ["Dish 3"]]
+        requested = sorted(
+            call.kwargs["pages"]
+            for call in mock_client.begin_analyze_document.call_args_list
+        )
+        assert requested == ["1", "2", "3"]
+
+        # The combined result is cached for the next upload of the same file
+        assert analyze_menu(str(self._pdf(tmp_path, 3)))["lines"] == [
+            "Dish 1",
+            "Dish 2",
+            "Dish 3",
+        ]
+        assert mock_client.begin_analyze_document.call_count == 3
+
+    @patch("src.app.ocr.ocr.get_ocr_backend")
+    def test_failed_page_cancels_the_other_pages_async(self, mock_backend, tmp_path):
+        cancelled = []
+
+        async def fake_analyze(data, pages=None):
+            if pages == "1":
+                await asyncio.sleep(0)
+                raise RuntimeError("page 1 failed")
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(pages)
+                raise
+
+        mock_backend.return_value.analyze_async = fake_analyze
+
+        async def analyze():
+            with pytest.raises(RuntimeError, match="page 1 failed"):
+                await analyze_menu_async(str(self._pdf(tmp_path, 3)))
+            return sorted(cancelled)  # before asyncio.run cancels leftovers
+
+        assert asyncio.run(analyze()) == ["2", "3"]
+
+
+class TestSectionedGrouping:
+    """Test cases for splitting long menus into parallel GPT requests."""
+
+    @staticmethod
+    def _response(content):
+        mock_choice = Mock()
+        mock_choice.message.content = content
+        return Mock(choices=[mock_choice])
+
+    def test_split_into_sections_at_headings(self):
+        lines = ["STARTERS", "Soup", "$5.00", "MAINS", "Steak", "$20.00"]
+
+        sections = split_into_sections(lines, max_lines=3)
+
+        assert sections == [["STARTERS", "Soup", "$5.00"], ["MAINS", "Steak", "$20.00"]]
+
+    def test_long_sections_are_cut_between_items(self):
+        lines = ["STARTERS", "Soup", "Creamy tomato", "$5.00", "Bread", "$3.00"]
+        lines += ["Salad", "Greens", "$4.00"]
+        inline = ["Soup $5", "Creamy tomato", "Bread $4", "Sourdough", "Cake $3"]
+
+        assert split_into_sections(lines, max_lines=5) == [
+            ["STARTERS", "Soup", "Creamy tomato", "$5.00"],
+            ["Bread", "$3.00", "Salad", "Greens", "$4.00"],
+        ]
+        assert split_into_sections(inline, max_lines=3) == [
+            ["Soup $5", "Creamy tomato"],
+            ["Bread $4", "Sourdough", "Cake $3"],
+        ]
+        # Without item boundaries the section is cut at max_lines
+        assert split_into_sections(["a", "b", "c", "d"], max_lines=2) == [
+            ["a", "b"],
+            ["c", "d"],
+        ]
+
+    def test_split_into_sections_packs_small_sections(self):
+        lines = ["STARTERS", "Soup", "$5.00", "MAINS", "Steak", "$20.00"]
+
+        assert split_into_sections(lines, max_lines=10) == [lines]
+
+    def test_split_into_sections_respects_page_breaks(self):
+        pages = [["Soup", "$5.00"], ["Steak", "$20.00"]]
+
+        assert split_into_sections([], pages=pages, max_lines=2) == pages
+
+    def test_parse_menu_json_formats(self):
+        item = {"name": "Soup", "price": "$5.00", "description": ""}
+
+        assert parse_menu_json(
+            '[{"name": "Soup", "price": "$5.00", "description": ""}]'
+        ) == [item]
+        assert parse_menu_json(
+            '{"items": [{"name": "Soup", "price": "$5.00", "description": ""}]}'
+        ) == [item]
+        assert parse_menu_json(
+            '```json\n[{"name": "Soup", "price": "$5.00", "description": ""}]\n```'
+        ) == [item]
+        with pytest.raises(ValueError):
+            parse_menu_json('{"error": "nope"}')
+
+    def test_merge_items_drops_duplicates(self):
+        soup = {"name": "Soup", "price": "$5.00"}
+
+        merged = merge_items(
+            [
+                [soup],
+                [{"name": "soup ", "price": "$5.00"}],
+                [{"name": "Soup", "price": "$7.00"}],
+            ]
+        )
+
+        assert merged == [soup, {"name": "Soup", "price": "$7.00"}]
+
+    @patch("src.app.ocr.group_with_gpt.get_openai_client")
+    def test_long_menu_structured_per_section(
+        self, mock_get_openai_client, monkeypatch
+    ):
+        """Sections are requested separately in JSON mode and merged in order."""
+        monkeypatch.setenv("GPT_SECTION_MAX_LINES", "3")
+        mock_client = Mock()
+        attempts = {}
+
+        def fake_create(**kwargs):
+            prompt = kwargs["messages"][1]["content"]
+            section = "STARTERS" if "STARTERS" in prompt else "MAINS"
+            attempts[section] = attempts.get(section, 0) + 1
+            if section == "MAINS" and attempts[section] == 1:
+                return self._response("not json")  # first attempt fails to parse
+            name = "Soup" if section == "STARTERS" else "Steak"
+            return self._response(
+                json.dumps({"items": [{"name": name, "price": "$1"}]})
+            )
+
+        mock_client.chat.completions.create.side_effect = fake_create
+        mock_get_openai_client.return_value = (mock_client, "deployment_name")
+
+        result = group_lines_with_gpt(
+            ["STARTERS", "Soup", "$1", "MAINS", "Steak", "$1"]
+        )
+
+        assert json.loads(result) == [
+            {"name": "Soup", "price": "$1"},
+            {"name": "Steak", "price": "$1"},
+        ]
+        assert attempts == {"STARTERS": 1, "MAINS": 2}
+        kwargs = mock_client.chat.completions.create.call_args.kwargs
+        assert kwargs["response_format"] == {"type": "json_object"}
+
+    @patch("src.app.ocr.group_with_gpt.get_async_openai_client")
+    def test_group_lines_with_gpt_async(self, mock_get_client):
+        mock_client = AsyncMock()
+        mock_client.chat.completions.create.return_value = self._response("[]")
+        mock_get_client.return_value = (mock_client, "deployment_name")
+
+        result = asyncio.run(group_lines_with_gpt_async(["Line 1", "Line 2"]))
+
+        assert result == "[]"
+        user_message = mock_client.chat.completions.create.call_args.kwargs["messages"][
+            1
+        ]["content"]
+        assert "Line 1" in user_message
+
+
+@pytest.mark.usefixtures("gpt_structuring")
 class TestOCRPipeline:
     """Test cases for the run_pipeline function."""
 
     @patch("src.app.ocr.ocr_pipeline.group_lines_with_gpt")
-    @patch("src.app.ocr.ocr_pipeline.extract_menu_items")
+    @patch("src.app.ocr.ocr_pipeline.analyze_menu")
     def test_run_pipeline_success(self, mock_extract, mock_group):
         """Test successful pipeline execution."""
         # Mock the OCR extraction
-        mock_extract.return_value = ["Burger", "$12.99", "Delicious burger"]
+        mock_extract.return_value = {
+            "lines": ["Burger", "$12.99", "Delicious burger"],
+            "pages": [],
+        }
 
         # Mock the GPT grouping
         mock_group.return_value = (
@@ -237,10 +455,12 @@ class TestOCRPipeline:
             == '[{"name": "Burger", "price": "$12.99", "description": "Delicious burger"}]'
         )
         mock_extract.assert_called_once_with("fake_image_path.jpg")
-        mock_group.assert_called_once_with(["Burger", "$12.99", "Delicious burger"])
+        mock_group.assert_called_once_with(
+            ["Burger", "$12.99", "Delicious burger"], None
+        )
 
     @patch("src.app.ocr.ocr_pipeline.group_lines_with_gpt")
-    @patch("src.app.ocr.ocr_pipeline.extract_menu_items")
+    @patch("src.app.ocr.ocr_pipeline.analyze_menu")
     def test_run_pipeline_ocr_failure(self, mock_extract, mock_group):
         """Test pipeline when OCR extraction fails."""
         mock_extract.side_effect = Exception("OCR Error")
@@ -252,10 +472,10 @@ class TestOCRPipeline:
         mock_group.assert_not_called()
 
     @patch("src.app.ocr.ocr_pipeline.group_lines_with_gpt")
-    @patch("src.app.ocr.ocr_pipeline.extract_menu_items")
+    @patch("src.app.ocr.ocr_pipeline.analyze_menu")
     def test_run_pipeline_gpt_failure(self, mock_extract, mock_group):
         """Test pipeline when GPT grouping fails."""
-        mock_extract.return_value = ["Burger", "$12.99"]
+        mock_extract.return_value = {"lines": ["Burger", "$12.99"], "pages": []}
         mock_group.side_effect = Exception("GPT Error")
 
         with pytest.raises(Exception, match="GPT Error"):
@@ -274,6 +494,79 @@ class TestOCRPipeline:
         assert len(sample_structured_menu) > 0
 
 
+class TestOCRCache:
+    """Test cases for caching OCR results by upload hash."""
+
+    @staticmethod
+    def _mock_client(lines):
+        mock_client = Mock()
+        mock_page = Mock(page_number=1, width=8.5, height=11.0, unit="inch")
+        mock_page.lines = [
+            Mock(content=content, polygon=[0, i, 1, i, 1, i + 1, 0, i + 1])
+            for i, content in enumerate(lines)
+        ]
+        mock_client.begin_analyze_document.return_value.result.return_value = Mock(
+            pages=[mock_page]
+        )
+        return mock_client
+
+    @patch("src.app.ocr.ocr.get_azure_client")
+    def test_repeat_upload_skips_azure(self, mock_get_client, temp_image_file):
+        """Identical bytes are only sent to Azure once."""
+        mock_client = self._mock_client(["Burger Deluxe", "$12.99"])
+        mock_get_client.return_value = mock_client
+
+        first = extract_menu_items(temp_image_file)
+        second = extract_menu_items(temp_image_file)
+
+        assert first == second == ["Burger Deluxe", "$12.99"]
+        mock_client.begin_analyze_document.assert_called_once()
+
+    @patch("src.app.ocr.ocr.get_azure_client")
+    def test_analyze_menu_keeps_geometry(self, mock_get_client, temp_image_file):
+        mock_get_client.return_value = self._mock_client(["• Burger Deluxe"])
+
+        result = analyze_menu(temp_image_file)
+
+        assert result["lines"] == ["Burger Deluxe"]
+        page = result["pages"][0]
+        assert page["page_number"] == 1
+        assert page["width"] == 8.5
+        assert page["lines"][0]["content"] == "• Burger Deluxe"
+        assert page["lines"][0]["polygon"] == [0, 0, 1, 0, 1, 1, 0, 1]
+
+    def test_disk_tier_survives_new_instance(self, tmp_path):
+        key = OCRCache.make_key(b"menu-bytes")
+        OCRCache(tmp_path).put(key, {"lines": ["Soup"], "pages": []})
+
+        reopened = OCRCache(tmp_path)
+
+        assert reopened.get(key) == {"lines": ["Soup"], "pages": []}
+        assert reopened.stats()["hits"] == 1
+
+    def test_disk_tier_expires_entries(self, tmp_path):
+        key = OCRCache.make_key(b"menu-bytes")
+        OCRCache(tmp_path).put(key, {"lines": ["Soup"], "pages": []})
+
+        assert OCRCache(tmp_path, ttl_seconds=-1).get(key) is None
+        assert not (tmp_path / f"{key}.json").exists()
+
+    def test_ttl_cache_expiry_and_lru_bound(self):
+        now = [0.0]
+        cache = TTLCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)  # evicts "b", the least recently used entry
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+
+        now[0] = 11.0
+        assert cache.get("a") is None
+        assert len(cache) == 1
+
+
 class TestOCRIntegration:
     """Integration tests for OCR functionality."""
 
@@ -0,0 +1,193 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+import httpx
+import openai
+import pytest
+
+from src.app.ocr import backends
+from src.app.ocr.backends import EasyOCRBackend, FallbackBackend, OCRBackend
+from src.app.ocr.ocr import (
+    AzureBackend,
+    _cache_key,
+    extract_menu_items,
+    get_ocr_backend,
+)
+from src.app.resilience import CircuitOpenError, get_breaker
+
+
+def throttled():
+    request = httpx.Request(
+        "POST", "https://fake-endpoint.cognitiveservices.azure.com/"
+    )
+    response = httpx.Response(429, request=request)
+    return openai.RateLimitError("Error code: 429", response=response, body=None)
+
+
+def page(*lines):
+    return {
+        "page_number": 1,
+        "width": None,
+        "height": None,
+        "unit": None,
+        "lines": [{"content": line, "polygon": None} for line in lines],
+    }
+
+
+def fake_reader(*detections):
+    reader = Mock()
+    reader.readtext.return_value = list(detections)
+    return reader
+
+
+class TestBackendSelection:
+    """Test cases for choosing the OCR backend from the environment."""
+
+    def test_azure_is_the_default(self):
+        assert isinstance(get_ocr_backend(), AzureBackend)
+
+    def test_easyocr_backend(self, monkeypatch):
+        monkeypatch.setenv("OCR_BACKEND", "easyocr")
+        monkeypatch.setenv("EASYOCR_LANGUAGES", "en, fr")
+
+        backend = get_ocr_backend()
+
+        assert isinstance(backend, EasyOCRBackend)
+        assert backend.languages == ["en", "fr"]
+        assert get_ocr_backend() is backend  # one engine per process
+
+    def test_fallback_backend(self, monkeypatch):
+        monkeypatch.setenv("OCR_FALLBACK_BACKEND", "easyocr")
+
+        backend = get_ocr_backend()
+
+        assert isinstance(backend, FallbackBackend)
+        assert backend.name == "azure+easyocr"
+
+    def test_unknown_backend(self, monkeypatch):
+        monkeypatch.setenv("OCR_BACKEND", "tesseract")
+
+        with pytest.raises(ValueError, match="Unknown OCR backend"):
+            get_ocr_backend()
+
+
+class TestFallbackBackend:
+    """Test cases for moving throttled OCR traffic to the local engine."""
+
+    def make(self):
+        primary = Mock(spec=OCRBackend)
+        primary.name = "azure"
+        fallback = Mock(spec=OCRBackend)
+        fallback.name = "easyocr"
+        fallback.analyze.return_value = [{"page_number": 1, "lines": []}]
+        return primary, fallback, FallbackBackend(primary, fallback, "ocr-test")
+
+    def test_throttled_call_is_read_locally(self):
+        primary, fallback, backend = self.make()
+        primary.analyze.side_effect = throttled()
+
+        # Marked, so the degraded result is not cached as Azure's
+        assert backend.analyze(b"image") == [
+            {"page_number": 1, "lines": [], "fallback": "easyocr"}
+        ]
+        fallback.analyze.assert_called_once_with(b"image", None)
+
+    def test_shed_call_is_read_locally(self):
+        primary, fallback, backend = self.make()
+        primary.analyze.side_effect = CircuitOpenError("open")
+
+        backend.analyze(b"image")
+
+        fallback.analyze.assert_called_once()
+
+    def test_open_circuit_skips_the_primary(self, monkeypatch):
+        monkeypatch.setenv("BREAKER_FAILURE_THRESHOLD", "1")
+        primary, fallback, backend = self.make()
+        get_breaker("ocr-test").record_failure(retry_after=60)
+
+        backend.analyze(b"image")
+
+        primary.analyze.assert_not_called()
+        fallback.analyze.assert_called_once()
+
+    def test_other_errors_and_pdfs_stay_on_the_primary(self):
+        primary, fallback, backend = self.make()
+        primary.analyze.side_effect = ValueError("bad document")
+        with pytest.raises(ValueError):
+            backend.analyze(b"image")
+
+        primary.analyze.side_effect = throttled()
+        with pytest.raises(openai.RateLimitError):
+            backend.analyze(b"%PDF-1.4", "2")
+        fallback.analyze.assert_not_called()
+
+    def test_fallback_results_are_not_cached(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("OCR_FALLBACK_BACKEND", "easyocr")
+        menu = tmp_path / "menu.jpg"
+        menu.write_bytes(b"menu-bytes")
+        azure = Mock(side_effect=[throttled(), [page("Soup")]])
+        monkeypatch.setattr(AzureBackend, "analyze", lambda self, *args: azure(*args))
+        monkeypatch.setattr(
+            EasyOCRBackend, "analyze", lambda self, *args: [page("S0up")]
+        )
+
+        assert extract_menu_items(str(menu)) == ["S0up"]
+        # Azure reads it again once it recovers, and that result is cached
+        assert extract_menu_items(str(menu)) == ["Soup"]
+        assert extract_menu_items(str(menu)) == ["Soup"]
+        assert azure.call_count == 2
+
+    def test_cache_key_names_non_azure_backends(self):
+        key = _cache_key(b"menu", AzureBackend())
+
+        assert _cache_key(b"menu", EasyOCRBackend()) == f"{key}-easyocr"
+        assert _cache_key(b"menu", get_ocr_backend()) == key
+
+
+class TestEasyOCRBackend:
+    """Test cases for the local EasyOCR engine (with a stand-in model)."""
+
+    def test_detections_become_page_geometry(self, monkeypatch, tmp_path):
+        from PIL import Image
+
+        image = tmp_path / "menu.png"
+        Image.new("RGB", (200, 100), "white").save(image)
+        box = [[10, 20], [90, 20], [90, 40], [10, 40]]
+        monkeypatch.setattr(
+            backends, "_reader", fake_reader((box, " Soup ", 0.9), (box, " ", 0.1))
+        )
+
+        geometry = backends._read_image(image.read_bytes())
+
+        assert geometry == {
+            "page_number": 1,
+            "width": 200.0,
+            "height": 100.0,
+            "unit": "pixel",
+            "lines": [{"content": "Soup", "polygon": [10, 20, 90, 20, 90, 40, 10, 40]}],
+        }
+
+    def test_extract_menu_items_with_local_backend(self, monkeypatch, tmp_path):
+        from PIL import Image
+
+        monkeypatch.setenv("OCR_BACKEND", "easyocr")
+        menu = tmp_path / "menu.jpg"
+        Image.new("RGB", (200, 100), "white").save(menu)
+        box = [[0, 0], [1, 0], [1, 1], [0, 1]]
+        monkeypatch.setattr(
+            backends,
+            "_reader",
+            fake_reader((box, "• Burger Deluxe", 0.9), (box, "$12.99", 0.8)),
+        )
+        # The worker function runs in-process instead of in a spawned worker
+        pool = ThreadPoolExecutor(max_workers=1)
+        monkeypatch.setattr(EasyOCRBackend, "_get_pool", lambda self: pool)
+
+        with patch("src.app.ocr.ocr.get_azure_client") as mock_get_client:
+            assert extract_menu_items(str(menu)) == ["Burger Deluxe", "$12.99"]
+        mock_get_client.assert_not_called()
+        pool.shutdown()
+
+    def test_pdfs_are_rejected(self):
+        with pytest.raises(ValueError, match="images only"):
+            EasyOCRBackend().analyze(b"%PDF-1.4")
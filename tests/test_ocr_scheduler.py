@@ -0,0 +1,151 @@
+import json
+import threading
+from unittest.mock import Mock
+
+import pytest
+from azure.core.exceptions import ServiceResponseError
+
+from benchmarks.fake_services import MENU_LINES, FakeAzureServer, FakeServiceConfig
+from src.app.clients import get_document_intelligence_client, registry
+from src.app.ocr.ocr import extract_menu_items
+from src.app.ocr.scheduler import OCRScheduler
+
+
+@pytest.fixture
+def fake_azure():
+    config = FakeServiceConfig(latency=0, poll_latency=0, polls_until_done=2)
+    with FakeAzureServer(config) as server:
+        yield server
+    registry.close_all()
+
+
+def make_scheduler(server, state_path=None):
+    client = get_document_intelligence_client(server.url, "key")
+    return OCRScheduler(client, state_path=state_path, min_interval=0.01)
+
+
+class TestOCRScheduler:
+    """Test cases for scheduled Document Intelligence polling."""
+
+    def test_submits_up_front_and_polls_from_one_loop(self, fake_azure):
+        scheduler = make_scheduler(fake_azure)
+
+        futures = [scheduler.submit(b"menu-%d" % i) for i in range(5)]
+        loop_threads = [t for t in threading.enumerate() if t.name == "ocr-scheduler"]
+        results = [future.result(timeout=10) for future in futures]
+
+        assert len(loop_threads) == 1
+        assert all(
+            result.pages[0].lines[0].content == MENU_LINES[0] for result in results
+        )
+        assert fake_azure.requests["analyze"] == 5
+        assert scheduler.pending() == 0
+
+    def test_identical_documents_share_one_job(self, fake_azure):
+        scheduler = make_scheduler(fake_azure)
+
+        first = scheduler.submit(b"menu", pages="2")
+        second = scheduler.submit(b"menu", pages="2")
+        first.result(timeout=10)
+
+        assert first is second
+        assert fake_azure.requests["analyze"] == 1
+
+    def test_finished_prefetch_is_claimed_without_resubmitting(self, fake_azure):
+        scheduler = make_scheduler(fake_azure)
+
+        scheduler.prefetch(b"menu").result(timeout=10)
+        assert scheduler.unclaimed() == 1
+        result = scheduler.analyze(b"menu")
+
+        assert result.pages[0].lines[0].content == MENU_LINES[0]
+        assert fake_azure.requests["analyze"] == 1
+        assert scheduler.unclaimed() == 0
+
+    def test_first_poll_waits_for_observed_completion_time(self, fake_azure):
+        scheduler = make_scheduler(fake_azure)
+        assert scheduler._first_wait() == scheduler.min_interval
+
+        scheduler._durations.extend([0.4, 0.5, 3.0])
+
+        assert scheduler._first_wait() == 0.5
+
+    def test_restarted_scheduler_resumes_saved_operations(self, fake_azure, tmp_path):
+        state_path = tmp_path / "operations.json"
+        first = make_scheduler(fake_azure, state_path)
+        location = first._submit_request(b"menu")
+        first._store.put(OCRScheduler.make_key(b"menu"), location, 1e12)
+
+        # A new process finds the saved operation and polls it instead
+        resumed = make_scheduler(fake_azure, state_path)
+        result = resumed.analyze(b"menu")
+
+        assert result.pages[0].page_number == 1
+        assert fake_azure.requests["analyze"] == 1
+        assert json.loads(state_path.read_text()) == {}
+
+    def test_extract_menu_items_through_scheduler(
+        self, fake_azure, tmp_path, monkeypatch
+    ):
+        monkeypatch.setenv("AZURE_ENDPOINT", fake_azure.url)
+        monkeypatch.setenv("AZURE_KEY", "key")
+        monkeypatch.setenv("OCR_SCHEDULER", "1")
+        monkeypatch.setenv("OCR_SCHEDULER_STATE", str(tmp_path / "operations.json"))
+        menu = tmp_path / "menu.jpg"
+        menu.write_bytes(b"menu-bytes")
+
+        assert extract_menu_items(str(menu)) == MENU_LINES
+        assert fake_azure.requests["poll"] >= 1
+
+
+def fake_client(poll_body=None, poll_error=None):
+    """Document Intelligence client whose polls return `poll_body` or raise."""
+
+    def send_request(request):
+        response = Mock(status_code=200)
+        if request.method == "POST":
+            response.headers = {"Operation-Location": f"https://di/{request.content}"}
+        elif poll_error is not None:
+            raise poll_error
+        else:
+            response.json.return_value = poll_body(request.url)
+        return response
+
+    return Mock(send_request=Mock(side_effect=send_request))
+
+
+class TestOCRSchedulerFailures:
+    """Test cases for jobs that never produce a usable result."""
+
+    def test_job_fails_when_polls_keep_failing_past_the_timeout(self):
+        error = ServiceResponseError("connection reset")
+        scheduler = OCRScheduler(
+            fake_client(poll_error=error), min_interval=0.01, timeout=0.2
+        )
+
+        with pytest.raises(TimeoutError, match="not finished after 0.2s"):
+            scheduler.analyze(b"menu")
+        assert scheduler.pending() == 0
+
+    def test_job_fails_when_it_is_still_running_at_the_timeout(self):
+        client = fake_client(poll_body=lambda url: {"status": "running"})
+        scheduler = OCRScheduler(client, min_interval=0.01, timeout=0.2)
+
+        with pytest.raises(TimeoutError):
+            scheduler.submit(b"menu").result(timeout=10)
+
+    def test_malformed_result_fails_only_its_own_job(self):
+        def poll_body(url):
+            if "bad" in url:
+                return {"status": "succeeded"}  # no analyzeResult
+            return {"status": "succeeded", "analyzeResult": {"pages": []}}
+
+        scheduler = OCRScheduler(fake_client(poll_body), min_interval=0.01)
+
+        bad = scheduler.submit(b"bad menu")
+        good = scheduler.submit(b"good menu")
+
+        with pytest.raises(KeyError):
+            bad.result(timeout=10)
+        assert good.result(timeout=10).pages == []
+        assert scheduler.pending() == 0
@@ -0,0 +1,184 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.app.events import (
+    ImageReady,
+    ItemFailed,
+    MenuStructured,
+    OCRCompleted,
+    PageRead,
+)
+from src.app.image_gen import ImageResult
+from src.app.ocr.ocr import MenuPage
+from src.app.pipeline import (
+    full_menu_pipeline,
+    full_menu_pipeline_async,
+    iter_menu_pipeline,
+)
+
+
+class TestIterMenuPipeline:
+    """Test cases for the streaming iter_menu_pipeline."""
+
+    @patch("src.app.pipeline.iter_images")
+    @patch("src.app.pipeline.structure_lines")
+    @patch("src.app.pipeline.iter_menu_pages")
+    def test_events_in_stage_order(
+        self,
+        mock_pages,
+        mock_structure,
+        mock_iter_images,
+        sample_ocr_lines,
+        sample_structured_menu,
+    ):
+        """OCR and structuring events come first, then one event per item."""
+        mock_pages.return_value = iter([MenuPage(1, sample_ocr_lines, {})])
+        mock_structure.return_value = sample_structured_menu
+        mock_iter_images.return_value = iter(
+            [
+                ImageResult(2, "Steak House", data=b"steak"),
+                ImageResult(0, "Burger Deluxe", error=RuntimeError("timeout")),
+                ImageResult(1, "Chicken Salad", data=b"salad"),
+            ]
+        )
+
+        events = list(iter_menu_pipeline("menu.jpg"))
+
+        assert events[0] == PageRead(1, sample_ocr_lines)
+        assert events[1] == OCRCompleted(sample_ocr_lines)
+        assert events[2] == MenuStructured(sample_structured_menu)
+        assert events[3] == ImageReady(2, sample_structured_menu[2], b"steak")
+        assert events[4] == ItemFailed(0, sample_structured_menu[0], "timeout")
+        assert events[5] == ImageReady(1, sample_structured_menu[1], b"salad")
+
+    @patch("src.app.pipeline.iter_images")
+    @patch("src.app.pipeline.structure_lines")
+    @patch("src.app.pipeline.iter_menu_pages")
+    def test_pages_structured_separately_and_merged(
+        self, mock_pages, mock_structure, mock_iter_images, sample_structured_menu
+    ):
+        """Each page is structured on its own; repeats across pages are merged."""
+        burger, salad, steak = sample_structured_menu
+        mock_pages.return_value = iter(
+            [
+                MenuPage(1, ["Burger Deluxe", "Chicken Salad"], {}),
+                MenuPage(2, [], {}),
+                MenuPage(3, ["Burger Deluxe", "Steak House"], {}),
+            ]
+        )
+        by_last_line = {
+            "Chicken Salad": [burger, salad],
+            "Steak House": [burger, steak],
+        }
+        mock_structure.side_effect = lambda lines, pages: by_last_line[lines[-1]]
+        mock_iter_images.return_value = iter([])
+
+        events = list(iter_menu_pipeline("menu.pdf"))
+
+        assert [type(event) for event in events[:3]] == [PageRead] * 3
+        assert events[4] == MenuStructured([burger, salad, steak])
+        assert mock_structure.call_count == 2  # the empty page is not sent to GPT
+
+    @patch("src.app.pipeline.iter_images")
+    @patch("src.app.pipeline.structure_lines")
+    @patch("src.app.pipeline.iter_menu_pages")
+    def test_unparseable_menu_yields_empty_menu(
+        self, mock_pages, mock_structure, mock_iter_images
+    ):
+        mock_pages.return_value = iter([MenuPage(1, ["???"], {})])
+        mock_structure.return_value = "not json"
+        mock_iter_images.return_value = iter([])
+
+        events = list(iter_menu_pipeline("menu.jpg"))
+
+        assert events[1:] == [OCRCompleted(["???"]), MenuStructured([])]
+
+
+class TestFullMenuPipeline:
+    """Test cases for the blocking full_menu_pipeline."""
+
+    @patch("src.app.pipeline.generate_images")
+    @patch("src.app.pipeline.run_ocr_pipeline")
+    def test_full_menu_pipeline_parses_json(
+        self, mock_run_ocr, mock_generate, sample_structured_menu
+    ):
+        mock_run_ocr.return_value = (
+            '[{"name": "Burger Deluxe", "price": "$12.99", '
+            '"description": "Fresh beef with fries"}]'
+        )
+        mock_generate.return_value = [b"burger"]
+
+        result = full_menu_pipeline("menu.jpg")
+
+        assert result["menu"] == sample_structured_menu[:1]
+        assert result["images"] == [b"burger"]
+        assert set(result["metrics"]["totals"]) == {"pipeline.total", "pipeline.images"}
+
+
+@pytest.mark.usefixtures("gpt_structuring")
+class TestFullMenuPipelineAsync:
+    """Test cases for full_menu_pipeline_async."""
+
+    @patch("src.app.pipeline.generate_images_async", new_callable=AsyncMock)
+    @patch(
+        "src.app.ocr.ocr_pipeline.group_lines_with_gpt_async", new_callable=AsyncMock
+    )
+    @patch("src.app.pipeline.analyze_menu_async", new_callable=AsyncMock)
+    def test_runs_stages_in_order(
+        self, mock_extract, mock_group, mock_generate, sample_structured_menu
+    ):
+        mock_extract.return_value = {"lines": ["Burger Deluxe", "$12.99"], "pages": []}
+        mock_group.return_value = sample_structured_menu
+        mock_generate.return_value = [b"a", b"b", b"c"]
+
+        result = asyncio.run(full_menu_pipeline_async("menu.jpg"))
+
+        assert result["menu"] == sample_structured_menu
+        assert result["images"] == [b"a", b"b", b"c"]
+        assert [span["name"] for span in result["metrics"]["spans"]] == [
+            "pipeline.ocr",
+            "parse.local",
+            "pipeline.gpt",
+            "pipeline.images",
+            "pipeline.total",
+        ]
+        mock_group.assert_awaited_once_with(["Burger Deluxe", "$12.99"], None)
+        mock_generate.assert_awaited_once_with(sample_structured_menu)
+
+    @patch(
+        "src.app.ocr.ocr_pipeline.group_lines_with_gpt_async", new_callable=AsyncMock
+    )
+    @patch("src.app.pipeline.analyze_menu_async")
+    def test_stage_timeout(self, mock_extract, mock_group):
+        """A slow stage raises TimeoutError and later stages never start."""
+
+        async def slow_ocr(image_path):
+            await asyncio.sleep(10)
+
+        mock_extract.side_effect = slow_ocr
+
+        with pytest.raises(TimeoutError):
+            asyncio.run(full_menu_pipeline_async("menu.jpg", ocr_timeout=0.01))
+        mock_group.assert_not_awaited()
+
+    @patch("src.app.pipeline.analyze_menu_async")
+    def test_cancellation_propagates(self, mock_extract):
+        started = []
+
+        async def slow_ocr(image_path):
+            started.append(image_path)
+            await asyncio.sleep(10)
+
+        mock_extract.side_effect = slow_ocr
+
+        async def run_and_cancel():
+            task = asyncio.create_task(full_menu_pipeline_async("menu.jpg"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await task
+
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(run_and_cancel())
+        assert started == ["menu.jpg"]
@@ -0,0 +1,108 @@
+import io
+from unittest.mock import Mock, patch
+
+from PIL import ExifTags, Image, ImageDraw
+
+from src.app.ocr.ocr import extract_menu_items
+from src.app.ocr.ocr_cache import OCRCache, get_ocr_cache
+from src.app.ocr.preprocess import find_document_box, preprocess_image
+
+
+def photo_bytes(size=(3000, 2000), orientation=None, paper=None) -> bytes:
+    """
+    A noisy colour JPEG, optionally with a bright paper rectangle and EXIF
+    rotation.
+    """
+    image = Image.effect_noise(size, 40).convert("RGB")
+    if paper is not None:
+        draw = ImageDraw.Draw(image)
+        draw.rectangle(paper, fill=(245, 245, 240))
+        for y in range(paper[1] + 40, paper[3] - 40, 60):
+            draw.line((paper[0] + 40, y, paper[2] - 40, y), fill=(20, 20, 20), width=8)
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[ExifTags.Base.Orientation] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+class TestPreprocess:
+    """Test cases for shrinking uploads before OCR."""
+
+    def test_downscales_grayscales_and_recompresses(self):
+        data = photo_bytes()
+
+        result = preprocess_image(data, max_dimension=1000)
+
+        image = Image.open(io.BytesIO(result.data))
+        assert max(image.size) == 1000
+        assert image.mode == "L"
+        assert result.steps == ("downscale", "grayscale")
+        assert result.processed_bytes < result.original_bytes / 4
+        assert result.bytes_saved == len(data) - len(result.data)
+
+    def test_applies_exif_orientation(self):
+        # Orientation 6: stored landscape, displayed rotated to portrait
+        result = preprocess_image(photo_bytes(orientation=6), max_dimension=1000)
+
+        image = Image.open(io.BytesIO(result.data))
+        assert image.size == (667, 1000)
+        assert "orient" in result.steps
+
+    def test_crops_to_paper_region(self):
+        data = photo_bytes(size=(2000, 1500), paper=(500, 300, 1500, 1200))
+
+        box = find_document_box(Image.open(io.BytesIO(data)))
+        result = preprocess_image(data, max_dimension=4000, crop=True)
+
+        assert box is not None
+        left, top, right, bottom = box
+        assert 400 <= left <= 500 and 200 <= top <= 300
+        assert 1500 <= right <= 1600 and 1200 <= bottom <= 1300
+        assert "crop" in result.steps
+
+    def test_pdfs_and_unreadable_data_are_passed_through(self):
+        for data in (b"%PDF-1.4 fake", b"fake_image_data"):
+            result = preprocess_image(data)
+
+            assert result.data is data
+            assert result.bytes_saved == 0
+
+    @patch("src.app.ocr.ocr.get_azure_client")
+    def test_azure_gets_processed_bytes_and_cache_keeps_original_key(
+        self, mock_get_client, tmp_path
+    ):
+        data = photo_bytes()
+        menu = tmp_path / "menu.jpg"
+        menu.write_bytes(data)
+        mock_client = Mock()
+        mock_client.begin_analyze_document.return_value.result.return_value = Mock(
+            pages=[Mock(page_number=1, lines=[Mock(content="Soup", polygon=None)])]
+        )
+        mock_get_client.return_value = mock_client
+
+        assert extract_menu_items(str(menu)) == ["Soup"]
+
+        uploaded = mock_client.begin_analyze_document.call_args.kwargs["body"]
+        assert len(uploaded) < len(data)
+        assert get_ocr_cache().get(OCRCache.make_key(data))["lines"] == ["Soup"]
+
+    @patch("src.app.ocr.ocr.get_azure_client")
+    def test_preprocessing_can_be_disabled(
+        self, mock_get_client, tmp_path, monkeypatch
+    ):
+        monkeypatch.setenv("OCR_PREPROCESS", "0")
+        data = photo_bytes(size=(800, 600))
+        menu = tmp_path / "menu.jpg"
+        menu.write_bytes(data)
+        mock_client = Mock()
+        mock_client.begin_analyze_document.return_value.result.return_value = Mock(
+            pages=[]
+        )
+        mock_get_client.return_value = mock_client
+
+        extract_menu_items(str(menu))
+
+        uploaded = mock_client.begin_analyze_document.call_args.kwargs["body"]
+        assert uploaded == data
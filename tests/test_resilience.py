@@ -0,0 +1,243 @@
+import asyncio
+import base64
+import random
+from unittest.mock import AsyncMock, Mock, patch
+
+import httpx
+import openai
+import pytest
+import requests
+
+from src.app.image_gen import generate_image, generate_images
+from src.app.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    get_retry_after,
+    is_retryable,
+)
+
+
+def api_error(status, headers=None, cls=openai.APIStatusError):
+    request = httpx.Request("POST", "https://fake.openai.azure.com/")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return cls(f"Error code: {status}", response=response, body=None)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRetryPolicy:
+    """Test cases for retry classification and backoff."""
+
+    def test_retry_after_headers(self):
+        assert get_retry_after(api_error(429, {"retry-after-ms": "250"})) == 0.25
+        assert get_retry_after(api_error(429, {"Retry-After": "3"})) == 3.0
+        assert get_retry_after(api_error(429)) is None
+        assert get_retry_after(Exception("no response")) is None
+
+    def test_retryable_errors(self):
+        assert is_retryable(api_error(429, cls=openai.RateLimitError))
+        assert is_retryable(api_error(503))
+        assert is_retryable(requests.ConnectionError("reset"))
+        assert not is_retryable(api_error(400, cls=openai.BadRequestError))
+        assert not is_retryable(Exception("API Error"))
+        assert not is_retryable(CircuitOpenError("open"))
+
+    def test_honours_retry_after_then_succeeds(self):
+        sleeps = []
+        policy = RetryPolicy(max_attempts=3, sleep=sleeps.append)
+        fn = Mock(side_effect=[api_error(429, {"retry-after-ms": "1500"}), "ok"])
+
+        assert policy.call("chat:gpt", fn, "a", key="b") == "ok"
+        assert sleeps == [1.5]
+        assert fn.call_count == 2
+        fn.assert_called_with("a", key="b")
+
+    def test_jittered_backoff_is_bounded_and_exponential(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0, rng=random.Random(0))
+        error = api_error(503)
+
+        for attempt, ceiling in [(1, 1.0), (2, 2.0), (3, 4.0), (6, 5.0)]:
+            delays = [policy.delay_for(attempt, error) for _ in range(50)]
+            assert all(0 <= delay <= ceiling for delay in delays)
+            assert max(delays) > ceiling / 2
+
+    def test_gives_up_after_max_attempts(self):
+        policy = RetryPolicy(max_attempts=3, base_delay=0, sleep=lambda s: None)
+        fn = Mock(side_effect=api_error(500))
+
+        with pytest.raises(openai.APIStatusError):
+            policy.call("chat:gpt", fn)
+        assert fn.call_count == 3
+
+    def test_non_retryable_errors_are_raised_immediately(self):
+        policy = RetryPolicy(max_attempts=3, sleep=lambda s: None)
+        fn = Mock(side_effect=api_error(400, cls=openai.BadRequestError))
+
+        with pytest.raises(openai.BadRequestError):
+            policy.call("images:dalle", fn)
+        fn.assert_called_once()
+
+    def test_async_call_retries(self):
+        policy = RetryPolicy(max_attempts=2, base_delay=0)
+        fn = AsyncMock(side_effect=[api_error(502), "ok"])
+
+        assert asyncio.run(policy.call_async("chat:gpt", fn)) == "ok"
+        assert fn.await_count == 2
+
+
+class TestCircuitBreaker:
+    """Test cases for the per-deployment circuit breaker."""
+
+    def test_opens_after_consecutive_failures_and_sheds_load(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("images:dalle", failure_threshold=2, clock=clock)
+        policy = RetryPolicy(max_attempts=1)
+        fn = Mock(side_effect=api_error(429))
+
+        for _ in range(2):
+            with pytest.raises(openai.APIStatusError):
+                policy.call("images:dalle", fn, breaker=breaker)
+        with pytest.raises(CircuitOpenError):
+            policy.call("images:dalle", fn, breaker=breaker)
+
+        assert breaker.state == "open"
+        assert fn.call_count == 2
+
+    def test_retries_are_not_shed_by_the_breaker_they_opened(self):
+        breaker = CircuitBreaker("images:dalle", failure_threshold=1)
+        policy = RetryPolicy(max_attempts=3, sleep=lambda seconds: None)
+        fn = Mock(side_effect=[api_error(429), api_error(429), "ok"])
+
+        assert policy.call("images:dalle", fn, breaker=breaker) == "ok"
+        assert breaker.state == "closed"
+
+    def test_only_a_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker("images:dalle", failure_threshold=2)
+        policy = RetryPolicy(max_attempts=1)
+
+        for error in (api_error(429), api_error(400, cls=openai.BadRequestError)):
+            with pytest.raises(openai.APIStatusError):
+                policy.call("images:dalle", Mock(side_effect=error), breaker=breaker)
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+
+    def test_half_open_trial_closes_on_success(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            "chat:gpt", failure_threshold=1, reset_timeout=10, clock=clock
+        )
+        breaker.record_failure(retry_after=20)
+
+        clock.now = 15  # Retry-After outlasts the reset timeout
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        clock.now = 21
+        breaker.before_call()  # the single trial call
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+
+        assert breaker.state == "closed"
+        breaker.before_call()
+
+    def test_failed_trial_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            "chat:gpt", failure_threshold=3, reset_timeout=10, clock=clock
+        )
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now = 11
+        breaker.before_call()
+
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+
+    def test_cancelled_trial_releases_the_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            "chat:gpt", failure_threshold=1, reset_timeout=10, clock=clock
+        )
+        policy = RetryPolicy(max_attempts=1)
+        breaker.record_failure()
+        clock.now = 11
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        async def cancelled_trial():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    policy.call_async("chat:gpt", hang, breaker=breaker), 0.01
+                )
+
+        asyncio.run(cancelled_trial())
+        with pytest.raises(KeyboardInterrupt):
+            policy.call(
+                "chat:gpt", Mock(side_effect=KeyboardInterrupt), breaker=breaker
+            )
+
+        assert breaker.state == "half_open"
+        assert policy.call("chat:gpt", Mock(return_value="ok"), breaker=breaker) == "ok"
+        assert breaker.state == "closed"
+
+
+class TestImageRetry:
+    """A throttled image is retried on its own instead of failing the menu."""
+
+    def test_generate_image_retries_throttled_request(self, monkeypatch):
+        monkeypatch.setenv("RETRY_BASE_DELAY", "0")
+        response = Mock()
+        response.data = [Mock(b64_json=base64.b64encode(b"image").decode())]
+        client = Mock()
+        client.images.generate.side_effect = [
+            api_error(429, {"retry-after-ms": "0"}, cls=openai.RateLimitError),
+            response,
+        ]
+
+        data = generate_image(client, "dalle", "A photo of soup", "Soup")
+
+        assert data == b"image"
+        assert client.images.generate.call_count == 2
+
+    @pytest.mark.parametrize("retry_after, calls", [("0", 5), ("30", 3)])
+    @patch("src.app.image_gen.get_openai_client")
+    def test_throttled_items_do_not_fail_the_menu(
+        self, mock_get_client, retry_after, calls, sample_structured_menu, monkeypatch
+    ):
+        """Items that stay throttled, or are shed by the breaker, are skipped."""
+        monkeypatch.setenv("BREAKER_FAILURE_THRESHOLD", "2")
+        monkeypatch.setattr(
+            "src.app.resilience.get_retry_policy",
+            lambda: RetryPolicy(max_attempts=2, sleep=lambda seconds: None),
+        )
+        response = Mock()
+        response.data = [Mock(b64_json=base64.b64encode(b"image").decode())]
+
+        def images_generate(prompt, **kwargs):
+            if "Burger" in prompt:
+                return response
+            headers = {"Retry-After": retry_after}
+            raise api_error(429, headers, cls=openai.RateLimitError)
+
+        client = Mock()
+        client.images.generate.side_effect = images_generate
+        mock_get_client.return_value = (client, "dalle")
+
+        images = generate_images(sample_structured_menu, max_workers=1)
+
+        assert images.indices == [0]
+        assert list(images) == [b"image"]
+        # Steak House is retried as the half-open trial after a short
+        # Retry-After, and shed while a long one keeps the circuit open
+        assert client.images.generate.call_count == calls
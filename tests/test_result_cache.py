@@ -0,0 +1,137 @@
+from pathlib import Path
+
+from src.app import metrics
+from src.app.events import ImageReady, ItemFailed, MenuStructured, OCRCompleted
+from src.app.result_cache import (
+    ImageOnDisk,
+    get_result_cache,
+    iter_cached_pipeline,
+    result_key,
+)
+
+MENU = [{"name": "Soup", "description": "Tomato", "price": "$5"}]
+
+
+class FakePipeline:
+    """Records its runs and the temporary files it was given."""
+
+    def __init__(self, *extra_events):
+        self.runs = []
+        self.extra_events = extra_events
+
+    def __call__(self, image_path, **options):
+        self.runs.append((Path(image_path), options))
+        assert Path(image_path).read_bytes() == b"menu-bytes"
+        yield OCRCompleted(["Soup", "$5"])
+        yield MenuStructured(MENU)
+        yield ImageReady(0, MENU[0], b"soup-image")
+        yield from self.extra_events
+
+
+class TestResultCache:
+    """Test cases for replaying pipeline runs across Streamlit reruns."""
+
+    def test_repeat_upload_replays_without_running(self):
+        pipeline = FakePipeline()
+
+        with metrics.collect() as run_metrics:
+            first = list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+            second = list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+
+        assert second == first
+        assert len(pipeline.runs) == 1
+        assert not pipeline.runs[0][0].exists()  # temp file cleaned up
+        assert run_metrics.snapshot()["counters"] == {
+            "cache.hits{cache=result}": 1,
+            "cache.misses{cache=result}": 1,
+            "cache.misses{cache=store}": 1,
+            "image.spooled_bytes": len(b"soup-image"),  # recorded to disk
+        }
+
+    def test_cached_run_refers_to_images_on_disk(self):
+        pipeline = FakePipeline()
+
+        first = list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+        cached = get_result_cache().get(result_key(b"menu-bytes"))
+
+        assert not any(isinstance(event, ImageReady) for event in cached)
+        assert isinstance(cached[-1], ImageOnDisk)
+        assert cached[-1].source.read_bytes() == b"soup-image"  # a store blob
+        assert list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline)) == first
+
+    def test_cached_run_without_the_store_replays_its_spool(self, monkeypatch):
+        monkeypatch.setenv("MENU_STORE_MAX_MB", "0")
+        pipeline = FakePipeline()
+
+        first = list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+        cached = get_result_cache().get(result_key(b"menu-bytes"))
+
+        assert cached[-1].source.memory_bytes == 0
+        assert list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline)) == first
+        assert len(pipeline.runs) == 1
+
+    def test_run_is_rerun_once_the_store_evicted_its_images(self):
+        pipeline = FakePipeline()
+
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+        cached = get_result_cache().get(result_key(b"menu-bytes"))
+        cached[-1].source.unlink()
+        replayed = list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+
+        assert len(pipeline.runs) == 2
+        assert replayed[-1] == ImageReady(0, MENU[0], b"soup-image")
+
+    def test_options_are_part_of_the_key(self):
+        pipeline = FakePipeline()
+
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline, quality="hd"))
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline, quality=None))
+
+        assert [options for _, options in pipeline.runs] == [
+            {"quality": "hd"},
+            {"quality": None},
+        ]
+        assert result_key(b"menu-bytes", {"quality": None}) == result_key(b"menu-bytes")
+
+    def test_runs_with_transient_failures_are_not_cached(self):
+        pipeline = FakePipeline(ItemFailed(1, {"name": "Wine"}, "timeout"))
+
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+
+        assert len(pipeline.runs) == 2
+
+    def test_runs_read_by_the_fallback_ocr_are_not_cached(self):
+        pipeline = FakePipeline()
+
+        def degraded_pipeline(image_path, **options):
+            for event in pipeline(image_path, **options):
+                if isinstance(event, OCRCompleted):
+                    event = OCRCompleted(event.lines, degraded=True)
+                yield event
+
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", degraded_pipeline))
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+
+        assert len(pipeline.runs) == 2
+
+    def test_abandoned_run_is_cleaned_up_and_not_cached(self):
+        pipeline = FakePipeline()
+
+        events = iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline)
+        next(events)
+        events.close()  # e.g. a Streamlit rerun interrupting the script
+
+        assert not pipeline.runs[0][0].exists()
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+        assert len(pipeline.runs) == 2
+
+    def test_cache_disabled(self, monkeypatch):
+        monkeypatch.setenv("RESULT_CACHE_MAX_ENTRIES", "0")
+        monkeypatch.setenv("MENU_STORE_MAX_MB", "0")
+        pipeline = FakePipeline()
+
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+        list(iter_cached_pipeline(b"menu-bytes", ".jpg", pipeline))
+
+        assert len(pipeline.runs) == 2